@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Ride, Booking
+from .models import ArchivedBooking, ArchivedRide, User, Ride, Booking
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -15,3 +15,11 @@ class RideAdmin(admin.ModelAdmin):
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('passenger', 'ride')  # 'created_at' убран
     search_fields = ('passenger__username',)
+
+@admin.register(ArchivedRide)
+class ArchivedRideAdmin(admin.ModelAdmin):
+    list_display = ('origin', 'destination', 'driver', 'datetime', 'seats_taken', 'archived_at')
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    list_display = ('passenger', 'ride', 'status', 'archived_at')
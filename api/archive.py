@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ArchivedBooking, ArchivedRide, Booking, Ride
+
+DEFAULTS = {
+    'GRACE_MINUTES': 30,
+    'BATCH_SIZE': 500,
+}
+
+RIDE_FIELDS = [field.attname for field in Ride._meta.concrete_fields]
+BOOKING_FIELDS = [field.attname for field in Booking._meta.concrete_fields]
+
+
+def archive_options():
+    return {**DEFAULTS, **getattr(settings, 'RIDE_ARCHIVE', {})}
+
+
+# ⏳ Граница живых поездок: всё, что отправилось раньше, — прошлое и подлежит архиву.
+# Лента, поиск и nearby отдают только datetime >= границы (лента — диапазоном по ride_feed_idx),
+# поэтому архивация — уборка, а не условие корректности: manage.py archive_rides запускается
+# по расписанию на хосте с файлом БД (например, cron: */15 * * * * python manage.py archive_rides).
+def live_rides_cutoff(now=None, options=None):
+    options = options or archive_options()
+    return (now or timezone.now()) - timedelta(minutes=options['GRACE_MINUTES'])
+
+
+# 🔢 Следующий archive_seq: считается внутри транзакции пачки, под блокировкой записи (BEGIN IMMEDIATE),
+# поэтому номера растут в порядке коммита — выгрузка по since=archive_seq ничего не пропустит
+def next_seq(model):
+    return (model.objects.aggregate(seq=Max('archive_seq'))['seq'] or 0) + 1
+
+
+# 🗄 Перенос прошедших поездок с бронями в архив пачками: каждая пачка — своя короткая транзакция,
+# чтобы не держать блокировку записи SQLite дольше одной пачки. Удаление идёт через ORM —
+# сигналы Ride сбрасывают кеш строк и индексы мест/координат.
+def archive_expired_rides(cutoff=None, batch_size=None, pause=0.0, max_batches=None):
+    options = archive_options()
+    cutoff = cutoff or live_rides_cutoff(options=options)
+    batch_size = batch_size or options['BATCH_SIZE']
+    totals = {'rides': 0, 'bookings': 0, 'batches': 0}
+
+    while max_batches is None or totals['batches'] < max_batches:
+        with transaction.atomic():
+            ids = list(
+                Ride.objects.filter(datetime__lt=cutoff).order_by('datetime', 'id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            ArchivedRide.objects.bulk_create([
+                ArchivedRide(archive_seq=seq, **row)
+                for seq, row in enumerate(Ride.objects.filter(pk__in=ids).values(*RIDE_FIELDS), next_seq(ArchivedRide))
+            ])
+            bookings = [
+                ArchivedBooking(archive_seq=seq, **row)
+                for seq, row in enumerate(
+                    Booking.objects.filter(ride_id__in=ids).values(*BOOKING_FIELDS), next_seq(ArchivedBooking)
+                )
+            ]
+            ArchivedBooking.objects.bulk_create(bookings)
+            Booking.objects.filter(ride_id__in=ids).delete()
+            Ride.objects.filter(pk__in=ids).delete()
+
+        totals['rides'] += len(ids)
+        totals['bookings'] += len(bookings)
+        totals['batches'] += 1
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return totals
@@ -0,0 +1,146 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    # Имя кеша из settings.CACHES для общего уровня (Redis/Memcached), None — только память процесса
+    'CACHE_ALIAS': None,
+    # С общим уровнем память процесса держит запись не дольше LOCAL_TTL секунд
+    'LOCAL_TTL': 1,
+}
+
+
+# 🗝 Кеш токенов: LRU с TTL в памяти процесса + необязательный общий уровень в кеше Django.
+# Записи сбрасываются сигналами (удаление токена, изменение пользователя) — см. api/signals.py.
+# Сигнал сбрасывает память только своего процесса, поэтому с общим уровнем локальная запись живёт
+# LOCAL_TTL: выход или удаление токена на одном воркере другие увидят через общий кеш за ~секунду.
+class TokenCache:
+    key_prefix = 'tokenauth'
+
+    def __init__(self, max_size=None, ttl=None, cache_alias=None, local_ttl=None):
+        options = {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+        self.max_size = max_size if max_size is not None else options['MAX_SIZE']
+        self.ttl = ttl if ttl is not None else options['TTL']
+        self.cache_alias = cache_alias if cache_alias is not None else options['CACHE_ALIAS']
+        self.local_ttl = local_ttl if local_ttl is not None else options['LOCAL_TTL']
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self.hits = self.shared_hits = self.misses = self.invalidations = 0
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    # срок записи в памяти процесса: без общего уровня — TTL, с ним — не дольше LOCAL_TTL
+    @property
+    def memory_ttl(self):
+        return min(self.ttl, self.local_ttl) if self.cache_alias else self.ttl
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, user = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.copy(user)
+                self._forget(key)
+
+        user = self.shared.get(f'{self.key_prefix}:{key}') if self.shared else None
+        with self._lock:
+            if user is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._remember(key, user, now)
+        return copy.copy(user)
+
+    def set(self, key, user):
+        with self._lock:
+            self._remember(key, copy.copy(user), time.monotonic())
+        if self.shared:
+            self.shared.set(f'{self.key_prefix}:{key}', user, self.ttl)
+            user_key = f'{self.key_prefix}:user:{user.pk}'
+            keys = set(self.shared.get(user_key) or ())
+            keys.add(key)
+            self.shared.set(user_key, keys, self.ttl)
+
+    def invalidate_key(self, key):
+        with self._lock:
+            self.invalidations += 1
+            self._forget(key)
+        if self.shared:
+            self.shared.delete(f'{self.key_prefix}:{key}')
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self.invalidations += 1
+            keys = set(self._keys_by_user.get(user_id, ()))
+            for key in keys:
+                self._forget(key)
+        if self.shared:
+            user_key = f'{self.key_prefix}:user:{user_id}'
+            keys |= set(self.shared.get(user_key) or ())
+            self.shared.delete_many([f'{self.key_prefix}:{key}' for key in keys] + [user_key])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.shared_hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+    # вызывается под self._lock
+    def _remember(self, key, user, now):
+        self._forget(key)
+        self._entries[key] = (now + self.memory_ttl, user)
+        self._keys_by_user.setdefault(user.pk, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._forget(oldest)
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1].pk
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+token_cache = TokenCache()
+
+
+# 🔐 TokenAuthentication без запроса token+user на каждый вызов
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
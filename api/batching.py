@@ -0,0 +1,81 @@
+import threading
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Сколько лидер ждёт соседей перед записью: верхняя граница добавочной задержки
+    'WINDOW_MS': 5,
+    # Пачка такого размера пишется сразу, не дожидаясь конца окна
+    'MAX_BATCH': 64,
+}
+
+
+# 📦 Групповой коммит: одновременные записи складываются в одну транзакцию (один fsync на пачку).
+# Как SingleFlight: первый пришедший — лидер, ждёт окно, пишет пачку своим соединением
+# и раздаёт результаты; остальные ждут. Лидер не должен быть внутри внешней транзакции,
+# иначе соседи получат результат до настоящего коммита.
+class GroupCommit:
+    class _Entry:
+        def __init__(self, item):
+            self.item = item
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    # write(items) -> [результат на каждый item] в том же порядке, одной транзакцией
+    def __init__(self, write, window_ms=None, max_batch=None, enabled=None, settings_name='CHAT_WRITE_BATCH'):
+        options = {**DEFAULTS, **getattr(settings, settings_name, {})}
+        self.write = write
+        self.window = (window_ms if window_ms is not None else options['WINDOW_MS']) / 1000
+        self.max_batch = max_batch or options['MAX_BATCH']
+        self.enabled = enabled if enabled is not None else options['ENABLED']
+        self._cond = threading.Condition()
+        self._pending = []
+        self._collecting = False
+        self.batches = self.items = 0
+
+    def submit(self, item):
+        if not self.enabled:
+            return self.write([item])[0]
+
+        entry = self._Entry(item)
+        with self._cond:
+            self._pending.append(entry)
+            leader = not self._collecting
+            if leader:
+                self._collecting = True
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+        if leader:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_batch, timeout=self.window)
+                batch, self._pending = self._pending, []
+                self._collecting = False
+            self._flush(batch)
+        else:
+            entry.event.wait()
+
+        if entry.error is not None:
+            raise entry.error
+        return entry.result
+
+    def _flush(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            for entry, result in zip(batch, self.write([entry.item for entry in batch])):
+                entry.result = result
+        except Exception:
+            # пачка откатилась целиком — пишем по одной, чтобы ошибка досталась только своему запросу
+            for entry in batch:
+                try:
+                    entry.result = self.write([entry.item])[0]
+                except Exception as error:
+                    entry.error = error
+        finally:
+            for entry in batch:
+                if entry.result is None and entry.error is None:
+                    entry.error = RuntimeError('Batch write was interrupted')
+                entry.event.set()
@@ -0,0 +1,181 @@
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.utils import timezone
+
+from .models import Booking, Chat, ChatMessage, ChatReadState, Ride, UnreadCounter, User
+
+# Города для синтетических поездок и их центры (широта, долгота)
+CITY_COORDINATES = {
+    'Toshkent': (41.31, 69.28),
+    'Samarqand': (39.65, 66.96),
+    'Buxoro': (39.77, 64.42),
+    'Andijon': (40.78, 72.34),
+    'Namangan': (41.00, 71.67),
+    "Farg'ona": (40.38, 71.78),
+    'Qarshi': (38.86, 65.79),
+    'Nukus': (42.46, 59.60),
+    'Xiva': (41.38, 60.36),
+    'Termiz': (37.22, 67.28),
+}
+CITIES = list(CITY_COORDINATES)
+SEED_PASSWORD = 'pass12345'
+
+
+# 🧪 Временная БД для бенчмарков: файл, а не :memory:, чтобы её видели и другие потоки.
+# Строки лога api.requests на время замеров глушим — это вывод в консоль на каждый запрос.
+@contextmanager
+def benchmark_database(keep=False):
+    request_log = logging.getLogger('api.requests')
+    old_level = request_log.level
+    request_log.setLevel(logging.WARNING)
+    fd, path = tempfile.mkstemp(prefix='taksoapp-bench-', suffix='.sqlite3')
+    os.close(fd)
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    test_settings['NAME'] = path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield path
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+        test_settings['NAME'] = old_test_name
+        if not keep and os.path.exists(path):
+            os.remove(path)
+        request_log.setLevel(old_level)
+
+
+# ⏱ Замер одной функции: список длительностей в миллисекундах
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(q / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+# 📊 p50/p95/p99 в формате, который удобно сравнивать между коммитами
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+    }
+
+
+# 🌱 Синтетический набор данных через bulk_create: согласованные места, сводки чатов и счётчики.
+# Все пользователи получают пароль SEED_PASSWORD (хеш считается один раз).
+def seed_dataset(users=500, rides=2000, bookings=3000, chats=1000, messages=10000, seed=42, batch_size=2000):
+    rng = random.Random(seed)
+    now = timezone.now()
+    encoded = make_password(SEED_PASSWORD)
+    start = User.objects.count()
+
+    drivers_count = max(1, users // 4)
+    people = User.objects.bulk_create([
+        User(
+            username=f'seed_{start + i}', password=encoded, phone=f'+99890{start + i:07d}',
+            is_driver=i < drivers_count, car_model='Cobalt' if i < drivers_count else '',
+            has_ac=rng.random() < 0.5, gender=None if i < drivers_count else rng.choice(['male', 'female']),
+        )
+        for i in range(users)
+    ], batch_size=batch_size)
+    drivers, passengers = people[:drivers_count], people[drivers_count:] or people
+
+    ride_objects = []
+    for _ in range(rides):
+        origin, destination = rng.sample(CITIES, 2)
+        lat, lng = CITY_COORDINATES[origin]
+        ride_objects.append(Ride(
+            origin=origin, destination=destination, driver=rng.choice(drivers),
+            datetime=now + timedelta(minutes=rng.randint(-60 * 24 * 30, 60 * 24 * 30)),
+            phone='+998900000000', seats=rng.randint(1, 4), price=rng.randint(20, 300) * 1000,
+            pickup_lat=lat + rng.gauss(0, 0.05), pickup_lng=lng + rng.gauss(0, 0.05),
+        ))
+    ride_objects = Ride.objects.bulk_create(ride_objects, batch_size=batch_size)
+
+    # брони не превышают места поездки — как после reserve_seats
+    taken = Counter()
+    booking_objects = []
+    for _ in range(bookings * 3):
+        if len(booking_objects) >= bookings:
+            break
+        ride = rng.choice(ride_objects)
+        if taken[ride.pk] < ride.seats:
+            taken[ride.pk] += 1
+            booking_objects.append(Booking(
+                ride=ride, passenger=rng.choice(passengers), status=rng.choice(Booking.HOLDING_STATUSES),
+            ))
+    Booking.objects.bulk_create(booking_objects, batch_size=batch_size)
+    for ride in ride_objects:
+        ride.seats_taken = taken[ride.pk]
+    Ride.objects.bulk_update(ride_objects, ['seats_taken'], batch_size=batch_size)
+
+    pairs = set()
+    for _ in range(chats * 3):
+        if len(pairs) >= chats:
+            break
+        pairs.add(Chat.pair_key(rng.choice(passengers), rng.choice(drivers)))
+    chat_objects = Chat.objects.bulk_create(
+        [Chat(user_low_id=low, user_high_id=high) for low, high in pairs], batch_size=batch_size
+    )
+    Chat.participants.through.objects.bulk_create([
+        Chat.participants.through(chat_id=chat.pk, user_id=user_id)
+        for chat in chat_objects for user_id in (chat.user_low_id, chat.user_high_id)
+    ], batch_size=batch_size)
+
+    message_objects = []
+    for _ in range(messages if chat_objects else 0):
+        chat = rng.choice(chat_objects)
+        message_objects.append(ChatMessage(
+            chat=chat, sender_id=rng.choice((chat.user_low_id, chat.user_high_id)), message='salom, qachon yo‘lga chiqamiz?',
+        ))
+    message_objects = ChatMessage.objects.bulk_create(message_objects, batch_size=batch_size)
+
+    # сводка последнего сообщения и непрочитанные: половина чатов дочитана до конца
+    by_chat = defaultdict(list)
+    for message in message_objects:
+        by_chat[message.chat_id].append(message)
+    read_states, unread_totals = [], Counter()
+    for chat in chat_objects:
+        thread = by_chat.get(chat.pk, [])
+        if thread:
+            chat.last_message, chat.last_message_at = thread[-1], thread[-1].timestamp
+        for user_id in (chat.user_low_id, chat.user_high_id):
+            incoming = [m for m in thread if m.sender_id != user_id]
+            watermark = incoming[-1].pk if incoming and rng.random() < 0.5 else 0
+            unread = sum(1 for m in incoming if m.pk > watermark)
+            unread_totals[user_id] += unread
+            read_states.append(ChatReadState(
+                chat=chat, user_id=user_id, last_read_message_id=watermark, unread_count=unread,
+            ))
+    Chat.objects.bulk_update(chat_objects, ['last_message', 'last_message_at'], batch_size=batch_size)
+    ChatReadState.objects.bulk_create(read_states, batch_size=batch_size)
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user=user, count=unread_totals[user.pk]) for user in people], batch_size=batch_size
+    )
+
+    return {
+        'users': len(people), 'drivers': len(drivers), 'rides': len(ride_objects), 'bookings': len(booking_objects),
+        'chats': len(chat_objects), 'messages': len(message_objects),
+    }
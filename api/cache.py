@@ -0,0 +1,140 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60,
+}
+
+# Поля водителя, которые попадают в строку поездки (RideSerializer)
+RIDE_DRIVER_FIELDS = {'username', 'is_driver', 'has_ac', 'car_model', 'show_phone', 'gender'}
+
+
+# 🚦 Single-flight: одновременные одинаковые промахи ждут одну перестройку вместо N своих
+class SingleFlight:
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+# 🗃 Кеш сериализованных строк ленты: одна строка на поездку для всех зрителей.
+# Телефон хранится как есть и маскируется при ответе (mask_phone), поэтому кеш не зависит от зрителя.
+# С LocMemCache сигналы сбрасывают кеш только в своём процессе — для нескольких воркеров
+# TIMEOUT ограничивает устаревание, либо нужен общий кеш (RIDE_CACHE['ALIAS']).
+class RideRowCache:
+    key_prefix = 'ride-row'
+
+    def __init__(self, alias=None, timeout=None):
+        options = {**DEFAULTS, **getattr(settings, 'RIDE_CACHE', {})}
+        self.alias = alias or options['ALIAS']
+        self.timeout = timeout if timeout is not None else options['TIMEOUT']
+        self.flight = SingleFlight()
+        self.rebuilds = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, ride_id):
+        return f'{self.key_prefix}:{ride_id}'
+
+    # build(ids) -> {id: строка}; вызывается только для промахов
+    def get_rows(self, ids, build):
+        found = self.cache.get_many([self.key(ride_id) for ride_id in ids])
+        rows = {ride_id: found[self.key(ride_id)] for ride_id in ids if self.key(ride_id) in found}
+        missing = tuple(ride_id for ride_id in ids if ride_id not in rows)
+        if missing:
+            rows.update(self.flight.do(missing, lambda: self._rebuild(missing, build)))
+        return [rows[ride_id] for ride_id in ids if ride_id in rows]
+
+    def _rebuild(self, ids, build):
+        self.rebuilds += 1
+        built = build(ids)
+        self.cache.set_many({self.key(ride_id): row for ride_id, row in built.items()}, self.timeout)
+        return built
+
+    # Сброс сразу и ещё раз после коммита: между ними параллельный читатель мог положить в кеш строку
+    # из ещё не закоммиченного состояния. Версия ленты для ETag меняется только после коммита.
+    def invalidate(self, ride_ids):
+        keys = [self.key(ride_id) for ride_id in ride_ids]
+        self.cache.delete_many(keys)
+
+        def after_commit():
+            self.cache.delete_many(keys)
+            resource_versions.bump('rides')
+        transaction.on_commit(after_commit)
+
+
+# 🔖 Версии ресурсов для ETag/Last-Modified: время последнего изменения в наносекундах.
+# Ключ живёт TIMEOUT, как и строки ленты: с LocMemCache версия в другом воркере
+# устаревает не дольше TIMEOUT — потом ключ пропадает и появляется новая версия.
+class VersionCounter:
+    key_prefix = 'version'
+
+    def __init__(self, alias=None, timeout=None):
+        options = {**DEFAULTS, **getattr(settings, 'RIDE_CACHE', {})}
+        self.alias = alias or options['ALIAS']
+        self.timeout = timeout if timeout is not None else options['TIMEOUT']
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, name):
+        return f'{self.key_prefix}:{name}'
+
+    def get(self, name):
+        version = self.cache.get(self.key(name))
+        if version is None:
+            version = time.time_ns()
+            if not self.cache.add(self.key(name), version, self.timeout):
+                version = self.cache.get(self.key(name), version)
+        return version
+
+    def bump(self, name):
+        self.cache.set(self.key(name), time.time_ns(), self.timeout)
+
+
+ride_row_cache = RideRowCache()
+resource_versions = VersionCounter()
+
+
+# 📞 Та же логика, что RideSerializer.get_phone: телефон видит сам водитель или все, если show_phone
+def mask_phone(row, viewer_id):
+    if row['driver'] == viewer_id or row['show_phone']:
+        return row
+    return {**row, 'phone': None}
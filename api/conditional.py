@@ -0,0 +1,39 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+# 🔖 ETag — хеш версии данных и всего, что меняет тело ответа: зритель, строка запроса, формат рендерера
+def make_etag(request, *parts):
+    renderer = getattr(request, 'accepted_media_type', '')
+    user_id = request.user.pk if request.user.is_authenticated else None
+    key = repr((user_id, request.META.get('QUERY_STRING', ''), renderer) + parts)
+    return '"%s"' % hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+# ⏱ Версия из VersionCounter (наносекунды) → секунды для Last-Modified
+def version_timestamp(version):
+    return version // 1_000_000_000
+
+
+def is_conditional(request):
+    return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+# ♻️ 304 Not Modified, если If-None-Match / If-Modified-Since совпали с валидаторами; иначе None.
+# Вызывается до основного запроса и сериализатора — на совпадении они не выполняются.
+def not_modified(request, etag, last_modified=None):
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        return None
+    return set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # ответ зависит от токена — общим кешам нельзя отдавать его другому пользователю
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import ArchivedBooking, ArchivedRide, Booking, ChatMessage, Ride
+from .realtime import authenticate_token, extract_token
+
+# 📦 Что выгружаем: модель и колонки (ключ идемпотентности — внутренний, в выгрузку не идёт).
+# Первая колонка — курсор since: id для живых таблиц, archive_seq для архива (id там старые,
+# а строки приходят туда позже — archive_rides переносит прошедшие поездки между выгрузками).
+# ⚠️ Курсор только по вставкам: изменения уже выгруженных строк (seats_taken, status брони)
+# повторно не выгружаются. Итоговое состояние поездки и её броней приходит в archived_*
+# после архивации; актуальный срез живых таблиц — полная выгрузка с since=0.
+RIDE_COLUMNS = [
+    'origin', 'destination', 'driver_id', 'datetime', 'phone', 'seats', 'seats_taken', 'price',
+    'has_female_passenger', 'pickup_lat', 'pickup_lng', 'dropoff_lat', 'dropoff_lng',
+]
+BOOKING_COLUMNS = ['ride_id', 'passenger_id', 'status', 'seats']
+DATASETS = {
+    'rides': (Ride, ['id', *RIDE_COLUMNS]),
+    'bookings': (Booking, ['id', *BOOKING_COLUMNS]),
+    'messages': (ChatMessage, ['id', 'chat_id', 'sender_id', 'message', 'timestamp']),
+    'archived_rides': (ArchivedRide, ['archive_seq', 'id', *RIDE_COLUMNS, 'archived_at']),
+    'archived_bookings': (ArchivedBooking, ['archive_seq', 'id', *BOOKING_COLUMNS, 'archived_at']),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+CHUNK_SIZE = 2000
+
+
+# 🔑 Одна пачка строк с курсором > after_id. Каждая пачка — отдельный короткий запрос по уникальному индексу:
+# память постоянна, и между пачками не висит открытый курсор SQLite.
+def fetch_chunk(dataset, after_id=0, limit=CHUNK_SIZE):
+    model, fields = DATASETS[dataset]
+    cursor = fields[0]
+    return list(model.objects.filter(**{f'{cursor}__gt': after_id}).order_by(cursor).values_list(*fields)[:limit])
+
+
+def iter_chunks(dataset, since=0, chunk_size=CHUNK_SIZE):
+    after_id = since
+    while True:
+        rows = fetch_chunk(dataset, after_id, chunk_size)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after_id = rows[-1][0]
+
+
+# 🧾 Пачка строк → текст в нужном формате; заголовок CSV пишется один раз перед первой пачкой
+def header(dataset, fmt):
+    return format_rows(dataset, fmt, [DATASETS[dataset][1]]) if fmt == 'csv' else ''
+
+
+def format_rows(dataset, fmt, rows):
+    if fmt == 'ndjson':
+        fields = DATASETS[dataset][1]
+        return ''.join(
+            json.dumps(dict(zip(fields, row)), cls=JSONEncoder, ensure_ascii=False) + '\n' for row in rows
+        )
+    # даты в CSV — в том же виде, что и в JSON
+    encoder = JSONEncoder()
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(
+        [encoder.default(value) if isinstance(value, datetime) else value for value in row] for row in rows
+    )
+    return buffer.getvalue()
+
+
+def parse_since(value):
+    since = int(value or 0)
+    if since < 0:
+        raise ValueError(value)
+    return since
+
+
+# 📤 GET /api/export/<dataset>/?format=ndjson|csv&since=<курсор> — только для staff.
+# Строки идут по возрастанию курсора (первая колонка): его последнее значение — это since для следующей.
+async def export_dataset(request, dataset):
+    key = extract_token(request.headers, '')
+    user = await sync_to_async(authenticate_token)(key) if key else await request.auser()
+    if user is None or not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    if not user.is_staff:
+        return JsonResponse({'detail': 'You do not have permission to perform this action.'}, status=403)
+    if dataset not in DATASETS:
+        return JsonResponse({'error': f"dataset must be one of: {', '.join(DATASETS)}"}, status=404)
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f"format must be one of: {', '.join(FORMATS)}"}, status=400)
+    try:
+        since = parse_since(request.GET.get('since'))
+    except ValueError:
+        return JsonResponse({'error': 'since must be a non-negative cursor value'}, status=400)
+
+    async def stream():
+        if fmt == 'csv':
+            yield header(dataset, fmt)
+        after_id = since
+        while True:
+            rows = await sync_to_async(fetch_chunk)(dataset, after_id, CHUNK_SIZE)
+            if rows:
+                yield format_rows(dataset, fmt, rows)
+            if len(rows) < CHUNK_SIZE:
+                return
+            after_id = rows[-1][0]
+
+    response = StreamingHttpResponse(stream(), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
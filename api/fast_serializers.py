@@ -0,0 +1,142 @@
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .metrics import measure_serialization
+from .serializers import ChatMessageSerializer, RideSerializer
+
+
+# ⚡ Быстрый путь для списков: строки из values_list() по плану, собранному один раз из полей
+# DRF-сериализатора. Порядок ключей и значения совпадают с serializer.data байт в байт
+# (см. FastSerializerParityTests) — без get_attribute/to_representation на каждое поле каждой строки.
+# SerializerMethodField повторяется методом row_<имя> над колонками из method_fields.
+class FastRowSerializer:
+    serializer_class = None
+    # имя поля-метода → колонки values_list(), которые получает row_<имя>
+    method_fields = {}
+
+    _plans = {}
+
+    def __init__(self, context=None):
+        self.context = context or {}
+
+    @classmethod
+    def plan(cls):
+        plan = cls._plans.get(cls)
+        if plan is None:
+            plan = cls._plans[cls] = cls.compile()
+        return plan
+
+    @classmethod
+    def compile(cls):
+        lookups, columns = [], []
+
+        def column(lookup):
+            if lookup not in lookups:
+                lookups.append(lookup)
+            return lookups.index(lookup)
+
+        for name, field in cls.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                indexes = [column(lookup) for lookup in cls.method_fields[name]]
+                columns.append((name, 'method', indexes, f'row_{name}'))
+            else:
+                lookup = '__'.join(field.source_attrs)
+                columns.append((name, 'value', column(lookup), field))
+        return lookups, columns
+
+    @classmethod
+    def lookups(cls):
+        return cls.plan()[0]
+
+    def converters(self):
+        _, columns = self.plan()
+        compiled = []
+        for name, kind, index, target in columns:
+            if kind == 'method':
+                compiled.append((name, kind, index, getattr(self, target)))
+            else:
+                compiled.append((name, kind, index, converter_for(target)))
+        return compiled
+
+    # queryset — уже отфильтрованный и упорядоченный; значения берутся одним values_list()
+    def serialize(self, queryset):
+        return self.serialize_rows(queryset.values_list(*self.lookups()))
+
+    def serialize_rows(self, rows):
+        with measure_serialization():
+            columns = self.converters()
+            result = []
+            for row in rows:
+                item = {}
+                for name, kind, index, convert in columns:
+                    if kind == 'method':
+                        item[name] = convert(*[row[i] for i in index])
+                    elif (value := row[index]) is None or convert is identity:
+                        item[name] = value
+                    else:
+                        item[name] = convert(value)
+                result.append(item)
+            return result
+
+
+def identity(value):
+    return value
+
+
+# 🔁 Преобразование значения колонки так же, как его отдал бы field.to_representation
+def converter_for(field):
+    if isinstance(field, (serializers.BooleanField, serializers.PrimaryKeyRelatedField)):
+        return identity
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.DateTimeField):
+        return datetime_converter(field)
+    return field.to_representation
+
+
+# ⏱ DateTimeField в ISO 8601: перевод в часовой пояс поля и «Z» вместо +00:00, как в DRF
+def datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != 'iso-8601':
+        return field.to_representation
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        text = value.astimezone(field_timezone).isoformat()
+        if text.endswith('+00:00'):
+            text = text[:-6] + 'Z'
+        return text
+    return convert
+
+
+# 🚕 Строки ленты. phone — как RideSerializer.get_phone; для кеша строк (unmasked_phone) — настоящий номер,
+# маскирование под зрителя делает mask_phone
+class RideRowSerializer(FastRowSerializer):
+    serializer_class = RideSerializer
+    method_fields = {'phone': ('phone', 'driver__id', 'driver__show_phone')}
+
+    def row_phone(self, phone, driver_id, show_phone):
+        if self.context.get('unmasked_phone'):
+            return phone
+        request = self.context.get('request')
+        viewer_id = request.user.pk if request else None
+        return phone if driver_id == viewer_id or show_phone else None
+
+
+# 💬 История чата; is_read — по read_upto, как в ChatMessageSerializer.get_is_read
+class ChatMessageRowSerializer(FastRowSerializer):
+    serializer_class = ChatMessageSerializer
+    method_fields = {'is_read': ('id', 'sender')}
+
+    def row_is_read(self, message_id, sender_id):
+        return message_id <= self.context.get('read_upto', {}).get(sender_id, 0)
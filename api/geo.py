@@ -0,0 +1,135 @@
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import Ride
+
+DEFAULTS = {
+    # Размер ячейки сетки в градусах широты (~5.5 км)
+    'CELL_DEGREES': 0.05,
+    'TTL': 300,
+}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# Точки поездки, по которым можно искать: посадка и высадка
+POINTS = {
+    'pickup': ('pickup_lat', 'pickup_lng'),
+    'dropoff': ('dropoff_lat', 'dropoff_lng'),
+}
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# 📍 Равномерная сетка: точка лежит в ячейке (floor(lat/cell), floor(lng/cell)).
+# Запрос по радиусу смотрит только ячейки, покрывающие его ограничивающий прямоугольник.
+class GridIndex:
+    def __init__(self, cell_degrees=None):
+        options = {**DEFAULTS, **getattr(settings, 'GEO_INDEX', {})}
+        self.cell = cell_degrees or options['CELL_DEGREES']
+        self._lock = threading.RLock()
+        self.built_at = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.cells = defaultdict(dict)   # ячейка -> {id: (lat, lng, timestamp)}
+            self.points = {}                 # id -> ячейка
+
+    def cell_of(self, lat, lng):
+        return math.floor(lat / self.cell), math.floor(lng / self.cell)
+
+    # rows: (id, lat, lng, datetime)
+    def build(self, rows):
+        with self._lock:
+            self.clear()
+            for row in rows:
+                self.add(*row)
+            self.built_at = time.monotonic()
+
+    def add(self, ride_id, lat, lng, dt):
+        with self._lock:
+            self.remove(ride_id)
+            if lat is None or lng is None:
+                return
+            cell = self.cell_of(lat, lng)
+            self.cells[cell][ride_id] = (lat, lng, dt.timestamp())
+            self.points[ride_id] = cell
+
+    def remove(self, ride_id):
+        with self._lock:
+            cell = self.points.pop(ride_id, None)
+            if cell is None:
+                return
+            bucket = self.cells[cell]
+            bucket.pop(ride_id, None)
+            if not bucket:
+                del self.cells[cell]
+
+    # [(расстояние км, id)] по возрастанию расстояния, с фильтром по окну времени
+    def nearby(self, lat, lng, radius_km, start=None, end=None, limit=50):
+        lat_span = radius_km / KM_PER_DEGREE
+        lng_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + lat_span, 89.9))), 1e-6))
+        low_row, low_col = self.cell_of(lat - lat_span, lng - lng_span)
+        high_row, high_col = self.cell_of(lat + lat_span, lng + lng_span)
+        start_ts = start.timestamp() if start else None
+        end_ts = end.timestamp() if end else None
+
+        found = []
+        with self._lock:
+            for row in range(low_row, high_row + 1):
+                for col in range(low_col, high_col + 1):
+                    bucket = self.cells.get((row, col))
+                    if not bucket:
+                        continue
+                    for ride_id, (point_lat, point_lng, ts) in bucket.items():
+                        if start_ts is not None and ts < start_ts:
+                            continue
+                        if end_ts is not None and ts >= end_ts:
+                            continue
+                        distance = haversine_km(lat, lng, point_lat, point_lng)
+                        if distance <= radius_km:
+                            found.append((distance, ride_id))
+        return heapq.nsmallest(limit, found)
+
+
+_indexes = {point: GridIndex() for point in POINTS}
+_indexes_lock = threading.Lock()
+
+
+# 📍 Индексы процесса по точкам посадки/высадки: ленивое построение из Ride, перестройка раз в TTL
+def get_geo_index(point='pickup'):
+    ttl = {**DEFAULTS, **getattr(settings, 'GEO_INDEX', {})}['TTL']
+    index = _indexes[point]
+    if index.built_at is None or time.monotonic() - index.built_at > ttl:
+        with _indexes_lock:
+            if index.built_at is None or time.monotonic() - index.built_at > ttl:
+                lat_field, lng_field = POINTS[point]
+                rows = (
+                    Ride.objects.filter(**{f'{lat_field}__isnull': False, f'{lng_field}__isnull': False})
+                    .values_list('id', lat_field, lng_field, 'datetime')
+                    .iterator(chunk_size=5000)
+                )
+                index.build(rows)
+    return index
+
+
+# Для сигналов: обновляем только уже построенные индексы
+def geo_indexes_if_built():
+    return {point: index for point, index in _indexes.items() if index.built_at is not None}
+
+
+def reset_geo_indexes():
+    with _indexes_lock:
+        for index in _indexes.values():
+            index.clear()
+            index.built_at = None
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+DEFAULTS = {
+    # Потоков для PBKDF2: hashlib.pbkdf2_hmac отпускает GIL, поэтому потоки считают параллельно
+    'WORKERS': min(4, os.cpu_count() or 1),
+    # Сколько хешей может ждать в очереди сверх работающих; дальше — 503 вместо растущей задержки
+    'MAX_PENDING': 32,
+    # False — хешировать прямо в обработчике (старое поведение, для сравнения в бенчмарке)
+    'ENABLED': True,
+}
+
+
+class HashingPoolBusy(Exception):
+    pass
+
+
+# 🔐 Ограниченный пул для хеширования паролей: event loop не блокируется на сотни мс,
+# а при всплеске логинов лишние запросы получают отказ сразу, не занимая память и воркеры.
+class HashingPool:
+    def __init__(self, workers=None, max_pending=None, enabled=None):
+        options = {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING', {})}
+        self.workers = workers or options['WORKERS']
+        self.max_pending = max_pending if max_pending is not None else options['MAX_PENDING']
+        self.enabled = enabled if enabled is not None else options['ENABLED']
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+        return self._executor
+
+    async def run(self, fn, *args):
+        if not self.enabled:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingPoolBusy()
+        # слот освобождается, когда хеш посчитан, даже если клиент уже отключился
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+hashing_pool = HashingPool()
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from .benchmarks import CITIES, summarize
+
+
+# 🌐 Минимальный HTTP/1.1 клиент на asyncio: одно keep-alive соединение на виртуального пользователя
+class HttpClient:
+    def __init__(self, host, port, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None, headers=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(data).encode() if data is not None else b''
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        if body:
+            lines.append('Content-Type: application/json')
+        if self.token:
+            lines.append(f'Authorization: Token {self.token}')
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        try:
+            self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+            await self.writer.drain()
+            return await self.read_response()
+        except BaseException:
+            await self.close()
+            raise
+
+    async def read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            payload = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            payload = b''
+            while size := int((await self.reader.readline()).strip(), 16):
+                payload += await self.reader.readexactly(size)
+                await self.reader.readline()
+            await self.reader.readline()
+        else:
+            payload = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection') == 'close':
+            await self.close()
+        return status, payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+
+# 📊 Замеры по шагам сценариев: латентность, коды ответов, ошибки (5xx и сбои соединения)
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    async def call(self, key, client, method, path, data=None, headers=None):
+        started = time.perf_counter()
+        try:
+            status, payload = await client.request(method, path, data, headers)
+        except (OSError, asyncio.IncompleteReadError, ConnectionError, ValueError) as error:
+            self.errors[key] += 1
+            self.statuses[key][type(error).__name__] += 1
+            return None, None
+        self.samples[key].append((time.perf_counter() - started) * 1000)
+        self.statuses[key][status] += 1
+        if status >= 500:
+            self.errors[key] += 1
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    def report(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = []
+        for key in sorted(self.statuses):
+            scenario, step = key
+            total = sum(self.statuses[key].values())
+            rows.append({
+                'scenario': scenario,
+                'step': step,
+                'requests': total,
+                'rps': round(total / elapsed, 1),
+                'errors': self.errors[key],
+                'error_rate': round(self.errors[key] / total, 4) if total else 0.0,
+                'statuses': {str(status): count for status, count in sorted(self.statuses[key].items(), key=str)},
+                **summarize(self.samples[key]),
+            })
+        return rows
+
+
+# 🚕 Сценарии: водители публикуют поездки, пассажиры листают ленту и бронируют, пары переписываются
+class LoadScenarios:
+    def __init__(self, host, port, recorder, duration, think_ms, seed=42):
+        self.host = host
+        self.port = port
+        self.recorder = recorder
+        self.deadline = time.perf_counter() + duration
+        self.think = think_ms / 1000
+        self.rng = random.Random(seed)
+
+    def running(self):
+        return time.perf_counter() < self.deadline
+
+    async def pause(self):
+        if self.think:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think))
+
+    async def driver(self, token):
+        client = HttpClient(self.host, self.port, token)
+        try:
+            while self.running():
+                origin, destination = self.rng.sample(CITIES, 2)
+                status, ride = await self.recorder.call(
+                    ('driver', 'create_ride'), client, 'POST', '/api/custom/create_ride/', {
+                        'origin': origin, 'destination': destination, 'phone': '+998900000000',
+                        'seats': self.rng.randint(1, 4), 'price': self.rng.randint(20, 300) * 1000,
+                        'datetime': '2030-01-01T10:00:00',
+                    },
+                )
+                await self.recorder.call(('driver', 'inbox'), client, 'GET', '/api/chat/inbox/')
+                await self.pause()
+                # У водителя одно объявление: снимаем его, чтобы следующий круг снова публиковал
+                if status == 201:
+                    await self.recorder.call(('driver', 'delete_ride'), client, 'DELETE', f"/api/rides/{ride['id']}/")
+        finally:
+            await client.close()
+
+    async def passenger(self, token, user_id):
+        client = HttpClient(self.host, self.port, token)
+        try:
+            while self.running():
+                status, page = await self.recorder.call(('passenger', 'browse_feed'), client, 'GET', '/api/rides/')
+                if status != 200:
+                    await self.pause()
+                    continue
+                rides = page['results']
+                if page.get('next'):
+                    parts = urlsplit(page['next'])
+                    status, more = await self.recorder.call(
+                        ('passenger', 'browse_next_page'), client, 'GET', f'{parts.path}?{parts.query}'
+                    )
+                    if status == 200:
+                        rides += more['results']
+                if rides:
+                    await self.recorder.call(
+                        ('passenger', 'book'), client, 'POST', '/api/bookings/',
+                        {'ride': self.rng.choice(rides)['id'], 'passenger': user_id},
+                        headers={'Idempotency-Key': uuid.uuid4().hex},
+                    )
+                await self.pause()
+        finally:
+            await client.close()
+
+    async def chatter(self, token, partner_id):
+        client = HttpClient(self.host, self.port, token)
+        query = 'limit=50'
+        try:
+            while self.running():
+                await self.recorder.call(('chat', 'send_message'), client, 'POST', '/api/chat/send/', {
+                    'receiver': partner_id, 'message': 'salom, qayerdasiz?',
+                })
+                status, messages = await self.recorder.call(
+                    ('chat', 'get_messages'), client, 'GET', f'/api/chat/{partner_id}/messages/?{query}'
+                )
+                if status == 200 and messages:
+                    query = f"after_id={messages[-1]['id']}"
+                await self.pause()
+        finally:
+            await client.close()
@@ -0,0 +1,47 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.archive import archive_expired_rides, archive_options
+from api.models import Booking, Ride
+
+
+# 🗄 Для запуска по расписанию (cron на хосте с БД, например каждые 15 минут): прошедшие поездки
+# и их брони уходят в архивные таблицы пачками. Лента/поиск/nearby скрывают их и без архивации.
+class Command(BaseCommand):
+    help = 'Move rides that have departed (and their bookings) into the archive tables in batches'
+
+    def add_arguments(self, parser):
+        options = archive_options()
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument('--grace-minutes', type=int, default=options['GRACE_MINUTES'],
+                            help='archive rides that departed more than this many minutes ago')
+        parser.add_argument('--pause-ms', type=float, default=50, help='pause between batches to let writers in')
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        if options['dry_run']:
+            expired = Ride.objects.filter(datetime__lt=cutoff)
+            self.stdout.write(json.dumps({
+                'cutoff': cutoff.isoformat(),
+                'rides': expired.count(),
+                'bookings': Booking.objects.filter(ride__in=expired).count(),
+            }))
+            return
+
+        started = time.perf_counter()
+        totals = archive_expired_rides(
+            cutoff=cutoff, batch_size=options['batch_size'], pause=options['pause_ms'] / 1000,
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(json.dumps({
+            'cutoff': cutoff.isoformat(),
+            **totals,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            'remaining_rides': Ride.objects.count(),
+        }))
@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from api.batching import GroupCommit
+from api.benchmarks import benchmark_database, summarize
+from api.models import Chat, ChatReadState, UnreadCounter, User
+from api.views import write_chat_messages
+
+
+# 📦 Отправка сообщений из нескольких потоков: транзакция на сообщение vs. групповой коммит.
+# --synchronous FULL показывает диск без WAL-поблажек, где fsync на каждый коммит дороже всего.
+class Command(BaseCommand):
+    help = 'Benchmark chat message write throughput with and without group commit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--messages', type=int, default=50, help='messages per thread')
+        parser.add_argument('--window-ms', type=float, default=5)
+        parser.add_argument('--synchronous', choices=['NORMAL', 'FULL'], default='NORMAL')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            init_command = connection.settings_dict['OPTIONS'].get('init_command', '')
+            connection.settings_dict['OPTIONS']['init_command'] = f"{init_command};PRAGMA synchronous={options['synchronous']}"
+            connection.close()
+            try:
+                items = self.seed(options['threads'])
+                for enabled in (False, True):
+                    committer = GroupCommit(write_chat_messages, window_ms=options['window_ms'], enabled=enabled)
+                    result = self.run(committer, items, options['messages'])
+                    self.stdout.write(json.dumps({
+                        'group_commit': enabled, 'synchronous': options['synchronous'], **result,
+                    }))
+            finally:
+                connection.settings_dict['OPTIONS']['init_command'] = init_command
+                connection.close()
+
+    def seed(self, threads):
+        users = User.objects.bulk_create([
+            User(username=f'bench_user_{i}', phone='+998900000000', gender='male') for i in range(2 * threads)
+        ])
+        UnreadCounter.objects.bulk_create([UnreadCounter(user=user) for user in users])
+        items = []
+        for sender, receiver in zip(users[::2], users[1::2]):
+            low, high = Chat.pair_key(sender, receiver)
+            chat = Chat.objects.create(user_low_id=low, user_high_id=high)
+            chat.participants.add(sender, receiver)
+            ChatReadState.objects.bulk_create([ChatReadState(chat=chat, user=sender), ChatReadState(chat=chat, user=receiver)])
+            items.append((chat, sender, receiver, 'salom'))
+        connection.close()
+        return items
+
+    def run(self, committer, items, messages):
+        samples, errors = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(items))
+
+        def worker(item):
+            local = []
+            try:
+                barrier.wait()
+                for _ in range(messages):
+                    started = time.perf_counter()
+                    committer.submit(item)
+                    local.append((time.perf_counter() - started) * 1000)
+                    close_old_connections()
+            except Exception as error:
+                with lock:
+                    errors.append(repr(error))
+            finally:
+                connection.close()
+                with lock:
+                    samples.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(item,)) for item in items]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'messages': len(samples),
+            'errors': len(errors),
+            'messages_per_s': round(len(samples) / elapsed, 1),
+            'transactions': committer.batches if committer.enabled else len(samples),
+            'latency': summarize(samples),
+        }
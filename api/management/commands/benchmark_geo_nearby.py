@@ -0,0 +1,81 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.benchmarks import summarize
+from api.geo import GridIndex, haversine_km
+
+# Ограничивающий прямоугольник Узбекистана (широта, долгота)
+BBOX = ((37.2, 45.6), (56.0, 73.1))
+# Города, вокруг которых сгущаются точки посадки
+HUBS = [(41.31, 69.28), (39.65, 66.96), (39.77, 64.42), (40.78, 72.34), (40.38, 71.78), (42.46, 59.60)]
+
+
+# 📍 Поиск ближайших поездок: сетка vs. полный перебор на синтетических точках
+class Command(BaseCommand):
+    help = 'Benchmark grid-indexed nearby ride search against a linear scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--scan-queries', type=int, default=20)
+        parser.add_argument('--radius-km', type=float, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        (low_lat, high_lat), (low_lng, high_lng) = BBOX
+
+        def point():
+            # 80% точек — около городов, остальные — по всей стране
+            if rng.random() < 0.8:
+                lat, lng = rng.choice(HUBS)
+                return lat + rng.gauss(0, 0.1), lng + rng.gauss(0, 0.1)
+            return rng.uniform(low_lat, high_lat), rng.uniform(low_lng, high_lng)
+
+        corpus = [
+            (ride_id, *point(), now + timedelta(minutes=rng.randint(0, 60 * 24 * 30)))
+            for ride_id in range(1, options['rides'] + 1)
+        ]
+        queries = [point() for _ in range(options['queries'])]
+        radius = options['radius_km']
+        window = (now, now + timedelta(days=7))
+
+        index = GridIndex()
+        started = time.perf_counter()
+        index.build(corpus)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        samples = []
+        found = 0
+        for lat, lng in queries:
+            started = time.perf_counter()
+            found += len(index.nearby(lat, lng, radius, *window, limit=50))
+            samples.append((time.perf_counter() - started) * 1000)
+
+        scan_samples = []
+        for lat, lng in queries[:options['scan_queries']]:
+            started = time.perf_counter()
+            matches = []
+            for ride_id, point_lat, point_lng, dt in corpus:
+                if window[0] <= dt < window[1]:
+                    distance = haversine_km(lat, lng, point_lat, point_lng)
+                    if distance <= radius:
+                        matches.append((distance, ride_id))
+            matches.sort()
+            scan_samples.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(json.dumps({
+            'rides': len(corpus),
+            'cells': len(index.cells),
+            'radius_km': radius,
+            'build_ms': round(build_ms, 1),
+            'avg_results': round(found / max(len(queries), 1), 1),
+            'grid_search': summarize(samples),
+            'full_scan': summarize(scan_samples),
+        }))
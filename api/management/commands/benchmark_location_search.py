@@ -0,0 +1,86 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.benchmarks import summarize
+from api.search import LocationIndex, normalize_place
+
+# Один город — несколько написаний, как их вводят пользователи
+CITY_SPELLINGS = [
+    ['Toshkent', 'Tashkent', 'Ташкент', 'Тошкент', 'Toshkent shahri'],
+    ['Samarqand', 'Samarkand', 'Самарканд', 'Самарқанд'],
+    ['Buxoro', 'Bukhara', 'Бухара', 'Бухоро'],
+    ['Andijon', 'Andijan', 'Андижан'],
+    ['Namangan', 'Наманган'],
+    ["Farg'ona", 'Fergana', 'Фергана', 'Фарғона'],
+    ['Qarshi', 'Karshi', 'Карши'],
+    ['Nukus', 'Нукус'],
+    ['Xiva', 'Khiva', 'Хива'],
+    ['Termiz', 'Termez', 'Термез'],
+    ['Urganch', 'Urgench', 'Ургенч'],
+    ['Jizzax', 'Jizzakh', 'Джизак'],
+    ['Guliston', 'Гулистан'],
+    ['Navoiy', 'Navoi', 'Навои'],
+    ["Qo'qon", 'Kokand', 'Коканд'],
+    ['Chirchiq', 'Чирчик'],
+    ['Olmaliq', 'Almalyk', 'Алмалык'],
+    ['Angren', 'Ангрен'],
+    ['Shahrisabz', 'Шахрисабз'],
+    ['Denov', 'Денау'],
+]
+QUERIES = ['Tashkent', 'Ташкент', 'Toshkennt', 'samarkand', 'Бухоро', 'Fargona', 'Kokand', 'Urgench', 'Navoi', 'Jizak']
+
+
+# 🔎 Поиск мест по синтетическому корпусу поездок: индекс vs. полный перебор
+class Command(BaseCommand):
+    help = 'Benchmark fuzzy origin/destination search over a synthetic ride corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--scan-queries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        corpus = []
+        for ride_id in range(1, options['rides'] + 1):
+            origin, destination = rng.sample(CITY_SPELLINGS, 2)
+            corpus.append((
+                ride_id, rng.choice(origin), rng.choice(destination),
+                now + timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+            ))
+
+        index = LocationIndex()
+        started = time.perf_counter()
+        index.build(corpus)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        samples = []
+        for _ in range(options['queries']):
+            origin = rng.choice(QUERIES)
+            destination = rng.choice(QUERIES + [None])
+            started = time.perf_counter()
+            index.search(origin, destination, limit=20)
+            samples.append((time.perf_counter() - started) * 1000)
+
+        scan_samples = []
+        for _ in range(options['scan_queries']):
+            origin = normalize_place(rng.choice(QUERIES))
+            started = time.perf_counter()
+            matches = [row for row in corpus if normalize_place(row[1]) == origin]
+            matches.sort(key=lambda row: (row[3], row[0]), reverse=True)
+            scan_samples.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(json.dumps({
+            'rides': len(corpus),
+            'places': len(index.place_trigrams),
+            'build_ms': round(build_ms, 1),
+            'index_search': summarize(samples),
+            'full_scan_exact_only': summarize(scan_samples),
+        }))
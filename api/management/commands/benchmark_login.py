@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from django.utils import timezone
+
+from api.benchmarks import benchmark_database, summarize
+from api.hashing import HashingPool
+from api.models import Ride, User
+
+
+# 🔐 Всплеск логинов: хеширование в обработчике (как раньше) vs. в hashing_pool.
+# Параллельно идут дешёвые запросы к ленте — их p99 показывает, блокирует ли логин остальной трафик.
+class Command(BaseCommand):
+    help = 'Benchmark login throughput and cheap-endpoint latency with and without the hashing pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=64)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            encoded = make_password('secret')
+            users = User.objects.bulk_create([
+                User(username=f'bench_user_{i}', password=encoded, phone='+998900000000', gender='male')
+                for i in range(options['logins'])
+            ])
+            Ride.objects.bulk_create([
+                Ride(origin='Toshkent', destination='Buxoro', driver=users[0], datetime=timezone.now(),
+                     phone='+998900000000', seats=4)
+                for _ in range(20)
+            ])
+            for enabled in (False, True):
+                pool = HashingPool(workers=options['workers'], enabled=enabled)
+                with mock.patch('api.views.hashing_pool', pool):
+                    result = asyncio.run(self.burst(users, options['concurrency']))
+                pool.shutdown()
+                self.stdout.write(json.dumps({'hashing_pool': enabled, 'workers': pool.workers, **result}))
+
+    async def burst(self, users, concurrency):
+        client = AsyncClient()
+        pending = list(users)
+        login_samples, cheap_samples, errors = [], [], 0
+        done = asyncio.Event()
+
+        async def login_worker():
+            nonlocal errors
+            while pending:
+                user = pending.pop()
+                started = time.perf_counter()
+                response = await client.post(
+                    '/api/login/', {'username': user.username, 'password': 'secret'}, content_type='application/json'
+                )
+                login_samples.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code != 200
+
+        async def cheap_worker():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get('/api/rides/')
+                cheap_samples.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.005)
+
+        started = time.perf_counter()
+        cheap = asyncio.create_task(cheap_worker())
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await cheap
+        return {
+            'logins': len(login_samples),
+            'errors': errors,
+            'logins_per_s': round(len(login_samples) / elapsed, 1),
+            'login': summarize(login_samples),
+            'cheap_endpoint': summarize(cheap_samples),
+        }
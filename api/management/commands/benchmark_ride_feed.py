@@ -0,0 +1,76 @@
+import json
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+
+from api.archive import live_rides_cutoff
+from api.benchmarks import CITIES, benchmark_database, measure, summarize
+from api.models import Ride, User
+from api.pagination import RideCursorPagination
+
+
+# 📈 Латентность страницы ленты при росте таблицы Ride.
+# Для keyset-пагинации p50/p95 должны оставаться ровными от 500 до 500k строк.
+# Поездки — за год назад и месяц вперёд (прошедшие ещё не в архиве), но лента читает только живые:
+# курсор deep_page — середина живого диапазона, live_rides — сколько строк лента вообще видит.
+class Command(BaseCommand):
+    help = 'Benchmark ride feed page latency as the Ride table grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[500, 5000, 50000])
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with benchmark_database():
+            drivers = User.objects.bulk_create([
+                User(username=f'bench_driver_{i}', phone='+998900000000', is_driver=True)
+                for i in range(50)
+            ])
+            client = Client()
+            now = timezone.now()
+            total = 0
+            for size in sorted(options['sizes']):
+                self.grow(rng, drivers, now, total, size)
+                total = size
+                self.stdout.write(json.dumps(self.run_size(client, size, options['repeat'])))
+
+    def grow(self, rng, drivers, now, start, end):
+        batch = []
+        for i in range(start, end):
+            batch.append(Ride(
+                origin=rng.choice(CITIES),
+                destination=rng.choice(CITIES),
+                driver=rng.choice(drivers),
+                datetime=now + timedelta(minutes=rng.randint(-60 * 24 * 365, 60 * 24 * 30)),
+                phone='+998900000000',
+                seats=rng.randint(1, 4),
+                price=rng.randint(20, 300) * 1000,
+            ))
+            if len(batch) >= 5000:
+                Ride.objects.bulk_create(batch)
+                batch = []
+        Ride.objects.bulk_create(batch)
+
+    def run_size(self, client, size, repeat):
+        live = Ride.objects.filter(datetime__gte=live_rides_cutoff()).order_by(*RideCursorPagination.ordering)
+        live_count = live.count()
+        middle = live[live_count // 2]
+        cursor = RideCursorPagination().encode_cursor(middle.datetime, middle.pk)
+        urls = {
+            'first_page': '/api/rides/',
+            'deep_page': f'/api/rides/?cursor={cursor}',
+            'origin_filter': f'/api/rides/?origin={CITIES[0]}',
+        }
+        result = {'rides': size, 'live_rides': live_count}
+        for name, url in urls.items():
+            response = client.get(url)
+            assert response.status_code == 200, url
+            # пустая страница мерила бы не ленту, а пустой ответ
+            assert response.json()['results'], url
+            result[name] = summarize(measure(lambda: client.get(url), repeat))
+        return result
@@ -0,0 +1,153 @@
+import itertools
+import json
+import statistics
+import time
+import warnings
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmarks import SEED_PASSWORD, benchmark_database, seed_dataset, summarize
+from api.models import Booking, Chat, Ride, User
+
+
+def api_routes():
+    def walk(resolver, prefix):
+        for pattern in resolver.url_patterns:
+            route = prefix + str(pattern.pattern).lstrip('^')
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern, route)
+            elif 'format' not in route:
+                yield route
+    return set(walk(get_resolver('api.urls'), 'api/'))
+
+
+# 📈 Каждый маршрут api/urls.py на синтетическом наборе данных: p50/p95/p99 и число запросов к БД.
+# Вывод — одна JSON-строка на маршрут и итоговая строка с непокрытыми маршрутами, для сравнения между коммитами.
+class Command(BaseCommand):
+    help = 'Benchmark every api/urls.py route on a seeded dataset and report latency and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--rides', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=3000)
+        parser.add_argument('--chats', type=int, default=1000)
+        parser.add_argument('--messages', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--auth-repeat', type=int, default=3, help='register/login run PBKDF2, keep them short')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            counts = seed_dataset(
+                users=options['users'], rides=options['rides'], bookings=options['bookings'],
+                chats=options['chats'], messages=options['messages'], seed=options['seed'],
+            )
+            covered = set()
+            for name, method, url, data, repeat in self.cases(options):
+                result = self.run_case(name, method, url, data, repeat)
+                covered.add(result.pop('route'))
+                self.stdout.write(json.dumps(result))
+            self.stdout.write(json.dumps({'dataset': counts, 'uncovered_routes': sorted(api_routes() - covered)}))
+
+    def cases(self, options):
+        # пассажир с самым загруженным чатом и водитель-собеседник
+        chat = max(Chat.objects.exclude(last_message=None)[:200], key=lambda c: c.last_message_id)
+        passenger, driver = (
+            User.objects.filter(pk__in=[chat.user_low_id, chat.user_high_id]).order_by('is_driver')
+        )
+        self.passenger_client = self.client_for(passenger)
+        self.driver_client = self.client_for(driver)
+        self.anonymous = APIClient()
+        self.staff_client = self.client_for(User.objects.create_user(username='bench_staff', phone='1', is_staff=True))
+
+        ride = Ride.objects.filter(driver=driver).first() or Ride.objects.first()
+        booking = Booking.objects.create(ride=ride, passenger=passenger)
+        open_ride = Ride.objects.create(
+            origin='Toshkent', destination='Buxoro', driver=driver, datetime=ride.datetime,
+            phone='+998900000000', seats=10 ** 6,
+        )
+        counter = itertools.count()
+        repeat, auth_repeat = options['repeat'], options['auth_repeat']
+
+        return [
+            ('api_root', 'get', '/api/', None, repeat),
+            ('users_list', 'get', '/api/users/', None, max(repeat // 10, 3)),
+            ('users_detail', 'get', f'/api/users/{driver.pk}/', None, repeat),
+            ('users_me', 'get', '/api/users/me/', None, repeat),
+            ('users_me_patch', 'patch', '/api/users/me/', {'has_ac': True}, repeat),
+            ('rides_list', 'get', '/api/rides/', None, repeat),
+            ('rides_list_not_modified', 'get', '/api/rides/', None, repeat),
+            ('rides_list_filtered', 'get', f'/api/rides/?origin={ride.origin}', None, repeat),
+            ('rides_detail', 'get', f'/api/rides/{ride.pk}/', None, repeat),
+            ('rides_search', 'get', f'/api/rides/search/?origin={ride.origin}', None, repeat),
+            ('rides_nearby', 'get', f'/api/rides/nearby/?lat={ride.pickup_lat}&lng={ride.pickup_lng}', None, repeat),
+            ('bookings_list', 'get', '/api/bookings/', None, max(repeat // 10, 3)),
+            ('bookings_detail', 'get', f'/api/bookings/{booking.pk}/', None, repeat),
+            ('bookings_create', 'post', '/api/bookings/', {'ride': open_ride.pk, 'passenger': passenger.pk}, repeat),
+            ('bookings_confirm', 'post', f'/api/bookings/{booking.pk}/confirm/', None, repeat),
+            ('bookings_cancel', 'post', f'/api/bookings/{booking.pk}/cancel/', None, repeat),
+            ('register', 'post', '/api/register/', lambda: {
+                'username': f'bench_new_{next(counter)}', 'password': SEED_PASSWORD, 'phone': '+998900000000',
+                'gender': 'male',
+            }, auth_repeat),
+            ('login', 'post', '/api/login/', {'username': passenger.username, 'password': SEED_PASSWORD}, auth_repeat),
+            ('create_ride', 'post', '/api/custom/create_ride/', {
+                'origin': 'Toshkent', 'destination': 'Xiva', 'phone': '+998900000000', 'seats': 2, 'price': 0,
+                'datetime': '2030-01-01T10:00:00',
+            }, repeat),
+            ('chat_threads', 'get', '/api/chat/threads/', None, repeat),
+            ('chat_threads_not_modified', 'get', '/api/chat/threads/', None, repeat),
+            ('chat_inbox', 'get', '/api/chat/inbox/', None, repeat),
+            ('chat_messages', 'get', f'/api/chat/{driver.pk}/messages/', None, repeat),
+            ('chat_messages_not_modified', 'get', f'/api/chat/{driver.pk}/messages/', None, repeat),
+            ('chat_send', 'post', '/api/chat/send/', {'receiver': driver.pk, 'message': 'kelyapman'}, repeat),
+            ('chat_events', 'get', '/api/chat/events/', None, repeat),
+            ('chat_unread', 'get', '/api/chat/unread/', None, repeat),
+            ('export_messages', 'get', '/api/export/messages/?format=csv', None, max(repeat // 10, 3)),
+        ]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client
+
+    def run_case(self, name, method, url, data, repeat):
+        if name in ('register', 'login'):
+            client = self.anonymous
+        elif name == 'bookings_confirm':
+            client = self.driver_client
+        elif name.startswith('export_'):
+            client = self.staff_client
+        else:
+            client = self.passenger_client
+        # повторный запрос с ETag из предыдущего ответа — путь 304 Not Modified
+        headers = {'HTTP_IF_NONE_MATCH': client.get(url)['ETag']} if name.endswith('_not_modified') else {}
+
+        samples, queries, statuses, route = [], [], set(), None
+        for _ in range(repeat):
+            payload = data() if callable(data) else data
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, payload, format='json', **headers)
+                if name.startswith('export_'):
+                    # выгрузка — async-генератор; синхронный клиент дочитывает его через async_to_sync
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        b''.join(response)
+                samples.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+            route = response.resolver_match.route
+        return {
+            'name': name,
+            'route': route,
+            'method': method.upper(),
+            'status': sorted(statuses),
+            'queries': {'min': min(queries), 'median': statistics.median(queries), 'max': max(queries)},
+            **summarize(samples),
+        }
@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import benchmark_database, measure, seed_dataset, summarize
+from api.fast_serializers import ChatMessageRowSerializer, RideRowSerializer
+from api.models import ChatMessage, Ride
+from api.renderers import FastJSONRenderer
+from api.serializers import ChatMessageSerializer, RideSerializer
+
+
+# ⚡ DRF-сериализаторы против быстрого пути на списках: с выборкой из БД, только сериализация и рендер JSON.
+# per_row_us — медиана на строку, speedup — во сколько раз быстрее по медиане.
+class Command(BaseCommand):
+    help = 'Benchmark RideSerializer/ChatMessageSerializer against the values_list() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='rows per list')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with benchmark_database():
+            seed_dataset(users=200, rides=rows, bookings=0, chats=20, messages=rows * 20)
+            rides = Ride.objects.select_related('driver').order_by('id')[:rows]
+            chat_id = ChatMessage.objects.values('chat').annotate(n=Count('id')).order_by('-n')[0]['chat']
+            messages = ChatMessage.objects.filter(chat_id=chat_id).select_related('sender').order_by('id')[:rows]
+            context = {'read_upto': {}}
+
+            ride_objects, message_objects = list(rides), list(messages)
+            ride_values = list(rides.values_list(*RideRowSerializer.lookups()))
+            message_values = list(messages.values_list(*ChatMessageRowSerializer.lookups()))
+            ride_rows = RideRowSerializer().serialize_rows(ride_values)
+
+            cases = [
+                ('rides', 'with_query',
+                 lambda: RideSerializer(list(rides), many=True).data,
+                 lambda: RideRowSerializer().serialize(rides), len(ride_objects)),
+                ('rides', 'serialize_only',
+                 lambda: RideSerializer(ride_objects, many=True).data,
+                 lambda: RideRowSerializer().serialize_rows(ride_values), len(ride_objects)),
+                ('chat_messages', 'with_query',
+                 lambda: ChatMessageSerializer(list(messages), many=True, context=context).data,
+                 lambda: ChatMessageRowSerializer(context=context).serialize(messages), len(message_objects)),
+                ('chat_messages', 'serialize_only',
+                 lambda: ChatMessageSerializer(message_objects, many=True, context=context).data,
+                 lambda: ChatMessageRowSerializer(context=context).serialize_rows(message_values), len(message_objects)),
+                # «drf» — JSONRenderer, «fast» — FastJSONRenderer (orjson, если установлен)
+                ('rides_json', 'render',
+                 lambda: JSONRenderer().render(ride_rows),
+                 lambda: FastJSONRenderer().render(ride_rows), len(ride_objects)),
+            ]
+            for name, mode, drf, fast, count in cases:
+                drf_stats, fast_stats = summarize(measure(drf, repeat)), summarize(measure(fast, repeat))
+                self.stdout.write(json.dumps({
+                    'name': name, 'mode': mode, 'rows': count,
+                    'drf_per_row_us': round(drf_stats['p50_ms'] * 1000 / count, 2),
+                    'fast_per_row_us': round(fast_stats['p50_ms'] * 1000 / count, 2),
+                    'speedup': round(drf_stats['p50_ms'] / fast_stats['p50_ms'], 1),
+                    'drf': drf_stats, 'fast': fast_stats,
+                }))
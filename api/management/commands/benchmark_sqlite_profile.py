@@ -0,0 +1,201 @@
+import asyncio
+import copy
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import benchmark_database, summarize
+from api.models import Ride, User
+
+PROFILES = {
+    # голый SQLite: журнал DELETE, synchronous=FULL, timeout 5 с, новое соединение на каждый запрос
+    'default': {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'production': settings.SQLITE_PRODUCTION_PROFILE,
+    # production с постоянными соединениями — выигрыш только под --server threads (см. settings)
+    'persistent': {**settings.SQLITE_PRODUCTION_PROFILE, 'CONN_MAX_AGE': 600},
+}
+
+
+# 🔌 Запрос прямо в config.asgi.application — так же, как его вызывает UvicornWorker
+async def asgi_request(application, method, path, headers=(), body=b''):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'content-length', str(len(body)).encode()), *headers], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+# 🗄 Чтение ленты и отправка сообщений: голый SQLite vs. SQLITE_PRODUCTION_PROFILE.
+# --server asgi (по умолчанию) — задачи asyncio через config.asgi, как в render.yaml;
+# --server threads — потоки с тестовым клиентом и close_old_connections после каждого запроса (WSGI).
+# connections_per_request — сколько раз открывалось соединение (и выполнялся init_command) на запрос.
+class Command(BaseCommand):
+    help = 'Benchmark concurrent read/write throughput with and without the production SQLite profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['default', 'production'])
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--server', choices=['asgi', 'threads'], default='asgi')
+
+    def handle(self, *args, **options):
+        for name in options['profiles']:
+            with benchmark_database(), self.profile(PROFILES[name]):
+                self.stdout.write(json.dumps({'profile': name, 'server': options['server'], **self.run(options)}))
+
+    @contextmanager
+    def profile(self, profile):
+        saved = {key: copy.deepcopy(connection.settings_dict.get(key)) for key in profile}
+        connection.close()
+        connection.settings_dict.update(copy.deepcopy(profile))
+        # journal_mode хранится в самом файле БД — возвращаем DELETE явно
+        if 'init_command' not in profile['OPTIONS']:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=DELETE')
+        try:
+            yield
+        finally:
+            connection.close()
+            connection.settings_dict.update(saved)
+
+    def run(self, options):
+        receiver, tokens = self.prepare(options)
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            opened.append(1)
+
+        connection_created.connect(count)
+        try:
+            if options['server'] == 'asgi':
+                samples, errors, elapsed = asyncio.run(self.run_asgi(receiver, tokens, options))
+            else:
+                samples, errors, elapsed = self.run_threads(receiver, tokens, options)
+        finally:
+            connection_created.disconnect(count)
+
+        requests = sum(len(samples[kind]) + errors[kind] for kind in samples)
+        return {
+            **{
+                kind: {
+                    'ops_per_s': round(len(samples[kind]) / elapsed, 1),
+                    'errors': errors[kind],
+                    **summarize(samples[kind]),
+                }
+                for kind in samples
+            },
+            'connections_per_request': round(len(opened) / requests, 3) if requests else 0.0,
+        }
+
+    def prepare(self, options):
+        receiver = User.objects.create(username='bench_receiver', phone='+998900000000', gender='male')
+        senders = User.objects.bulk_create([
+            User(username=f'bench_sender_{i}', phone='+998900000000', is_driver=True) for i in range(options['writers'])
+        ])
+        tokens = [Token.objects.create(user=sender).key for sender in senders]
+        Ride.objects.bulk_create([
+            Ride(origin='Toshkent', destination='Buxoro', driver=senders[i % len(senders)], datetime=timezone.now(),
+                 phone='+998900000000', seats=4)
+            for i in range(200)
+        ])
+        connection.close()
+        return receiver, tokens
+
+    async def run_asgi(self, receiver, tokens, options):
+        from config.asgi import application
+
+        samples = {'read': [], 'write': []}
+        errors = {'read': 0, 'write': 0}
+        deadline = time.perf_counter() + options['seconds']
+        body = json.dumps({'receiver': receiver.pk, 'message': 'salom'}).encode()
+
+        async def worker(kind, method, headers=(), body=b''):
+            path = '/api/rides/' if kind == 'read' else '/api/chat/send/'
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = await asgi_request(application, method, path, headers, body) < 400
+                except Exception:
+                    ok = False
+                if ok:
+                    samples[kind].append((time.perf_counter() - started) * 1000)
+                else:
+                    errors[kind] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[worker('read', 'GET') for _ in range(options['readers'])],
+            *[worker('write', 'POST', [
+                (b'authorization', f'Token {token}'.encode()), (b'content-type', b'application/json'),
+            ], body) for token in tokens],
+        )
+        return samples, errors, time.perf_counter() - started
+
+    def run_threads(self, receiver, tokens, options):
+        samples = {'read': [], 'write': []}
+        errors = {'read': 0, 'write': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def worker(kind, request):
+            local, failed = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        ok = request().status_code < 400
+                    except Exception:
+                        ok = False
+                    close_old_connections()
+                    if ok:
+                        local.append((time.perf_counter() - started) * 1000)
+                    else:
+                        failed += 1
+            finally:
+                connection.close()
+                with lock:
+                    samples[kind].extend(local)
+                    errors[kind] += failed
+
+        def reader():
+            client = Client()
+            return lambda: client.get('/api/rides/')
+
+        def writer(token):
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+            return lambda: client.post('/api/chat/send/', {'receiver': receiver.pk, 'message': 'salom'},
+                                       content_type='application/json')
+
+        threads = [threading.Thread(target=worker, args=('read', reader())) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=('write', writer(token))) for token in tokens]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, errors, time.perf_counter() - started
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from api.export import CHUNK_SIZE, DATASETS, FORMATS, format_rows, header, iter_chunks
+
+
+# 📦 Та же выгрузка, что и /api/export/, но прямо из БД: пачками по курсору, память не растёт с объёмом
+class Command(BaseCommand):
+    help = (
+        'Export rides, bookings, chat messages or archived rides/bookings as NDJSON or CSV, streamed in cursor '
+        'order (id; archive_seq for archives). Only new rows are picked up by --since, not updates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=list(FORMATS), default='ndjson')
+        parser.add_argument('--since', type=int, default=0, help='export rows with a cursor (first column) greater than this')
+        parser.add_argument('--output', help='file to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        dataset, fmt = options['dataset'], options['format']
+        if options['output']:
+            output = open(options['output'], 'w', encoding='utf-8', newline='')
+        else:
+            output = self.stdout
+            output.ending = ''
+        rows, last_cursor = 0, options['since']
+        try:
+            output.write(header(dataset, fmt))
+            for chunk in iter_chunks(dataset, options['since'], options['chunk_size']):
+                output.write(format_rows(dataset, fmt, chunk))
+                rows += len(chunk)
+                last_cursor = chunk[-1][0]
+        finally:
+            if options['output']:
+                output.close()
+        # следующий инкрементальный запуск: --since <last_cursor>
+        self.stderr.write(f'{rows} {dataset} exported, last {DATASETS[dataset][1][0]} {last_cursor}')
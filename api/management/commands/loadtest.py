@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import benchmark_database, seed_dataset
+from api.loadtest import HttpClient, LoadScenarios, Recorder
+from api.models import User
+
+START_COMMAND = re.compile(r'startCommand:\s*"?([^"\n]+)"?')
+
+
+# 🚀 Команда запуска из render.yaml — нагрузка идёт на тот же сервер, что и в проде
+def render_start_command():
+    render_yaml = Path(settings.BASE_DIR) / 'render.yaml'
+    match = START_COMMAND.search(render_yaml.read_text()) if render_yaml.exists() else None
+    if not match:
+        raise CommandError('startCommand not found in render.yaml')
+    return shlex.split(match.group(1))
+
+
+async def wait_until_ready(host, port, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        client = HttpClient(host, port)
+        try:
+            status, _ = await client.request('GET', '/api/')
+            if status < 500:
+                return
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            await client.close()
+        await asyncio.sleep(0.2)
+    raise CommandError(f'Server on {host}:{port} did not start within {timeout}s')
+
+
+# 🏋 Нагрузочный прогон: водители публикуют поездки, пассажиры листают ленту и бронируют,
+# пары пользователей переписываются. Итог — JSON-строка на каждый шаг сценария.
+class Command(BaseCommand):
+    help = 'Run an asyncio load test (drivers, passengers, chat pairs) against a gunicorn server started from render.yaml'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=10)
+        parser.add_argument('--passengers', type=int, default=40)
+        parser.add_argument('--chat-pairs', type=int, default=10)
+        parser.add_argument('--duration', type=float, default=30, help='seconds of load after the server is up')
+        parser.add_argument('--think-ms', type=float, default=0, help='mean pause between scenario rounds')
+        parser.add_argument('--workers', type=int, default=1, help='gunicorn workers')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--url', help='load an already running server instead; accounts go to this DB')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--rides', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=3000)
+        parser.add_argument('--chats', type=int, default=1000)
+        parser.add_argument('--messages', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['url']:
+            parts = urlsplit(options['url'])
+            accounts = self.create_accounts(options)
+            self.report(asyncio.run(self.run_load(parts.hostname, parts.port or 80, accounts, options)), options)
+            return
+
+        with benchmark_database() as path:
+            counts = seed_dataset(
+                users=options['users'], rides=options['rides'], bookings=options['bookings'],
+                chats=options['chats'], messages=options['messages'], seed=options['seed'],
+            )
+            accounts = self.create_accounts(options)
+            # сервер пишет в тот же файл — своё соединение закрываем, чтобы не держать блокировки
+            connection.close()
+            server = self.start_server(path, options)
+            try:
+                rows = asyncio.run(self.run_load('127.0.0.1', options['port'], accounts, options, server))
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            self.report(rows, options, dataset=counts)
+
+    # 👥 Отдельные аккаунты нагрузки: у водителей ещё нет объявлений, токены — без хеширования паролей
+    def create_accounts(self, options):
+        prefix = f'load_{int(time.time())}'
+        roles = [('driver', options['drivers']), ('passenger', options['passengers']), ('chat', options['chat_pairs'] * 2)]
+        User.objects.bulk_create([
+            User(
+                username=f'{prefix}_{role}_{n}', phone='+998900000000', is_driver=role == 'driver',
+                gender=None if role == 'driver' else 'male',
+            )
+            for role, count in roles for n in range(count)
+        ])
+        users = list(User.objects.filter(username__startswith=f'{prefix}_').order_by('id'))
+        tokens = {token.user_id: token.key for token in Token.objects.bulk_create([
+            Token(user=user, key=Token.generate_key()) for user in users
+        ])}
+        accounts = {'driver': [], 'passenger': [], 'chat': []}
+        for user in users:
+            role = user.username.split('_')[2]
+            accounts[role].append((tokens[user.pk], user.pk))
+        return accounts
+
+    def start_server(self, database_path, options):
+        command = render_start_command() + [
+            '--bind', f"127.0.0.1:{options['port']}", '--workers', str(options['workers']),
+        ]
+        env = {'SQLITE_PROFILE': 'production', **os.environ, 'SQLITE_PATH': database_path, 'REQUEST_LOG_LEVEL': 'WARNING'}
+        self.stderr.write(f"Starting: {' '.join(command)}")
+        return subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+            stderr=None if options['verbosity'] > 1 else subprocess.DEVNULL,
+        )
+
+    async def run_load(self, host, port, accounts, options, server=None):
+        await wait_until_ready(host, port, timeout=30)
+        recorder = Recorder()
+        scenarios = LoadScenarios(host, port, recorder, options['duration'], options['think_ms'], options['seed'])
+        chatters = accounts['chat']
+        tasks = (
+            [scenarios.driver(token) for token, _ in accounts['driver']]
+            + [scenarios.passenger(token, user_id) for token, user_id in accounts['passenger']]
+            + [scenarios.chatter(chatters[n][0], chatters[n ^ 1][1]) for n in range(len(chatters))]
+        )
+        await asyncio.gather(*tasks)
+        recorder.finished = time.perf_counter()
+        if server is not None and server.poll() is not None:
+            raise CommandError(f'Server exited with code {server.returncode} during the run')
+        return recorder.report()
+
+    def report(self, rows, options, dataset=None):
+        for row in rows:
+            self.stdout.write(json.dumps(row))
+        total = sum(row['requests'] for row in rows)
+        errors = sum(row['errors'] for row in rows)
+        self.stdout.write(json.dumps({
+            'total_requests': total,
+            'rps': round(sum(row['rps'] for row in rows), 1),
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'concurrency': {key: options[key] for key in ('drivers', 'passengers', 'chat_pairs', 'workers')},
+            'duration_s': options['duration'],
+            'python': sys.version.split()[0],
+            **({'dataset': dataset} if dataset else {}),
+        }))
@@ -0,0 +1,74 @@
+import io
+import pstats
+from datetime import datetime
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import HEADER, list_profiles, make_profile_token, profiling_options
+
+
+# 🔬 Профили из ProfilingMiddleware: список, сводка по функциям, токен для заголовка X-Profile
+class Command(BaseCommand):
+    help = 'List and summarize request profiles captured by ProfilingMiddleware'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        listing = subparsers.add_parser('list', help='List captured profiles, newest last')
+        listing.add_argument('--limit', type=int, default=50)
+        listing.add_argument('--path', default='', help='only profiles whose file name contains this text')
+
+        summary = subparsers.add_parser('summarize', help='Merge profiles and print the top functions')
+        summary.add_argument('files', nargs='*', help='profile file names (default: latest matching --path)')
+        summary.add_argument('--path', default='')
+        summary.add_argument('--last', type=int, default=20, help='how many latest profiles to merge')
+        summary.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'ncalls'])
+        summary.add_argument('--top', type=int, default=25)
+
+        token = subparsers.add_parser('token', help=f'Print a signed {HEADER} header value')
+        token.add_argument('--ttl', type=int, default=3600, help='seconds the token stays valid')
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def matching(self, options):
+        return [path for path in list_profiles() if options['path'] in path.name]
+
+    def handle_list(self, options):
+        profiles = self.matching(options)[-options['limit']:]
+        if not profiles:
+            self.stdout.write(f"No profiles in {profiling_options()['DIR']}")
+            return
+        for path in profiles:
+            stats = pstats.Stats(str(path))
+            captured = datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec='seconds')
+            self.stdout.write(f'{captured}  {stats.total_tt * 1000:9.1f} ms  {stats.total_calls:8d} calls  {path.name}')
+
+    def handle_summarize(self, options):
+        directory = profiling_options()['DIR']
+        if options['files']:
+            paths = [Path(name) if Path(name).is_absolute() else directory / name for name in options['files']]
+            missing = [str(path) for path in paths if not path.exists()]
+            if missing:
+                raise CommandError(f"Profiles not found: {', '.join(missing)}")
+        else:
+            paths = self.matching(options)[-options['last']:]
+        if not paths:
+            raise CommandError(f'No profiles to summarize in {directory}')
+
+        output = io.StringIO()
+        stats = pstats.Stats(str(paths[0]), stream=output)
+        for path in paths[1:]:
+            stats.add(str(path))
+        self.stdout.write(f'{len(paths)} profile(s), {stats.total_tt * 1000:.1f} ms profiled in total')
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+        self.stdout.write(output.getvalue())
+
+    def handle_token(self, options):
+        try:
+            token = make_profile_token(options['ttl'])
+        except ImproperlyConfigured as error:
+            raise CommandError(str(error))
+        self.stdout.write(f"{HEADER}: {token}")
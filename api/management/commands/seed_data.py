@@ -0,0 +1,31 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.benchmarks import SEED_PASSWORD, seed_dataset
+
+
+# 🌱 Наполнение БД синтетическими пользователями, поездками, бронями и чатами
+class Command(BaseCommand):
+    help = 'Seed the database with synthetic users, rides, bookings, chats and messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--rides', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=3000)
+        parser.add_argument('--chats', type=int, default=1000)
+        parser.add_argument('--messages', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            counts = seed_dataset(
+                users=options['users'], rides=options['rides'], bookings=options['bookings'],
+                chats=options['chats'], messages=options['messages'], seed=options['seed'],
+            )
+        self.stdout.write(json.dumps({
+            **counts, 'seconds': round(time.perf_counter() - started, 2), 'password': SEED_PASSWORD,
+        }))
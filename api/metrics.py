@@ -0,0 +1,171 @@
+import bisect
+import hmac
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse
+
+DEFAULTS = {
+    'ENABLED': True,
+    # /metrics отдаётся только с заголовком Authorization: Bearer <TOKEN>; без токена — только при DEBUG
+    'TOKEN': None,
+}
+
+# Границы корзин гистограммы латентности, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ⏱ Замеры текущего запроса. ContextVar переезжает вместе с sync_to_async,
+# поэтому запросы к БД из async-вьюх тоже попадают в свой запрос.
+class RequestTimings:
+    __slots__ = ('queries', 'db', 'serialize', 'serializing', 'render_started')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serializing = False
+        self.render_started = None
+
+
+current_timings = ContextVar('request_timings', default=None)
+
+
+# 🗄 execute_wrapper для каждого соединения (ставится в signals.py): без активного запроса — просто вызов
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db += perf_counter() - started
+
+
+def install_query_timer(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# 🧾 Время сериализации: внешний вызов считается один раз, вложенные — нет.
+# Ленивые запросы к БД внутри сериализатора входят и сюда, и в db.
+@contextmanager
+def measure_serialization():
+    timings = current_timings.get()
+    if timings is None or timings.serializing:
+        yield
+        return
+    timings.serializing = True
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.serializing = False
+        timings.serialize += perf_counter() - started
+
+
+class TimedSerializerMixin:
+    def to_representation(self, instance):
+        with measure_serialization():
+            return super().to_representation(instance)
+
+
+class RouteStats:
+    __slots__ = ('buckets', 'count', 'total', 'db', 'queries', 'serialize')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = self.db = self.serialize = 0.0
+        self.queries = 0
+
+
+# 📊 Гистограммы по маршрутам в памяти процесса. С несколькими воркерами у каждого свои —
+# Prometheus собирает их по отдельности (label instance), суммирование — на стороне запросов.
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.routes = {}     # (route, method) -> RouteStats
+            self.statuses = {}   # (route, method, status) -> count
+
+    def observe(self, route, method, status, total, timings):
+        with self._lock:
+            stats = self.routes.get((route, method))
+            if stats is None:
+                stats = self.routes[(route, method)] = RouteStats()
+            stats.buckets[bisect.bisect_left(BUCKETS, total)] += 1
+            stats.count += 1
+            stats.total += total
+            stats.db += timings.db
+            stats.queries += timings.queries
+            stats.serialize += timings.serialize
+            key = (route, method, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    # Prometheus text exposition format 0.0.4
+    def render(self):
+        with self._lock:
+            routes = sorted(self.routes.items())
+            statuses = sorted(self.statuses.items())
+
+        lines = [
+            '# HELP taksoapp_request_duration_seconds Request latency by route.',
+            '# TYPE taksoapp_request_duration_seconds histogram',
+        ]
+        for (route, method), stats in routes:
+            labels = f'route="{escape_label(route)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), stats.buckets):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'taksoapp_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'taksoapp_request_duration_seconds_sum{{{labels}}} {stats.total:.6f}')
+            lines.append(f'taksoapp_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+        for name, help_text, attr, fmt in (
+            ('taksoapp_request_db_seconds_total', 'Time spent in database queries.', 'db', '.6f'),
+            ('taksoapp_request_db_queries_total', 'Database queries executed.', 'queries', 'd'),
+            ('taksoapp_request_serialize_seconds_total', 'Time spent serializing and rendering responses.', 'serialize', '.6f'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (route, method), stats in routes:
+                lines.append(f'{name}{{route="{escape_label(route)}",method="{method}"}} {getattr(stats, attr):{fmt}}')
+
+        lines += ['# HELP taksoapp_requests_total Responses by route and status.', '# TYPE taksoapp_requests_total counter']
+        for (route, method, status), count in statuses:
+            lines.append(f'taksoapp_requests_total{{route="{escape_label(route)}",method="{method}",status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = RequestMetrics()
+
+
+def metrics_options():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+# 📈 GET /metrics для Prometheus. Задержки и запросы по маршрутам — не для всех:
+# без REQUEST_METRICS['TOKEN'] эндпоинт есть только при DEBUG, иначе 404
+def metrics_view(request):
+    token = metrics_options()['TOKEN']
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=404)
+    else:
+        keyword, _, given = request.headers.get('Authorization', '').partition(' ')
+        if keyword.lower() != 'bearer' or not hmac.compare_digest(given.strip(), token):
+            return HttpResponse(status=401)
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,11 +1,153 @@
+import json
+import logging
+from time import perf_counter
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
 from django.http import JsonResponse
 
+from .metrics import current_timings, install_query_timer, metrics_options, request_metrics, RequestTimings
+from .profiling import RequestProfile, profiling_options, should_profile
+
+logger = logging.getLogger('api.requests')
+
+# Остальные методы попадают в метрики как OTHER, чтобы не плодить метки
+KNOWN_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'}
+
+
+# 📊 Метрики запроса: число запросов к БД, время БД, сериализации и всего запроса.
+# Отдаёт заголовок Server-Timing, пишет JSON-строку в логгер api.requests и копит гистограммы для /metrics.
+# Для стриминговых ответов (SSE) total — время до отдачи заголовков.
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = metrics_options()['ENABLED']
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        install_query_timer(connection)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, perf_counter() - started)
+
+    # 🧾 Ответы DRF рендерятся после вьюхи — это время тоже относим к сериализации
+    def process_template_response(self, request, response):
+        timings = current_timings.get()
+        if timings is not None:
+            timings.render_started = perf_counter()
+            response.add_post_render_callback(lambda rendered: self.rendered(timings))
+        return response
+
+    @staticmethod
+    def rendered(timings):
+        timings.serialize += perf_counter() - timings.render_started
+
+    def finish(self, request, response, timings, total):
+        match = request.resolver_match
+        route = match.route if match else 'unmatched'
+        method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+        request_metrics.observe(route, method, response.status_code, total, timings)
+        response['Server-Timing'] = (
+            f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries", '
+            f'serialize;dur={timings.serialize * 1000:.2f}, total;dur={total * 1000:.2f}'
+        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': method,
+                'route': route,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': timings.queries,
+                'db_ms': round(timings.db * 1000, 2),
+                'serialize_ms': round(timings.serialize * 1000, 2),
+                'total_ms': round(total * 1000, 2),
+            }))
+        return response
+
+
+# 🔬 Профилирование по запросу: заголовок X-Profile с подписанным токеном
+# (manage.py profiles token) или выборка PROFILING['SAMPLE_RATE']. Профиль — файл pstats
+# в PROFILING['DIR'], его имя возвращается в заголовке X-Profile-Id.
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = profiling_options()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_profile(request, self.options):
+            return self.get_response(request)
+        with RequestProfile(request) as profile:
+            response = self.get_response(request)
+        response['X-Profile-Id'] = profile.save(self.options)
+        return response
+
+    async def __acall__(self, request):
+        if not should_profile(request, self.options):
+            return await self.get_response(request)
+        # cProfile видит только свой поток: гоняем цепочку из отдельного потока через async_to_sync,
+        # тогда sync-вьюхи и sync_to_async(thread_sensitive) внутри выполняются в нём и попадают в профиль
+        return await sync_to_async(self.profile_async_chain, thread_sensitive=False)(request)
+
+    def profile_async_chain(self, request):
+        with RequestProfile(request) as profile:
+            response = async_to_sync(self.get_response)(request)
+        response['X-Profile-Id'] = profile.save(self.options)
+        return response
+
+
+# ⚡ Поддерживает и sync, и async: иначе Django гоняет async-вьюхи (логин, long-poll, SSE)
+# через async_to_sync в общем потоке sync-кода, и они блокируют остальные запросы
 class BlockOldAppVersionsMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
         self.minimum_version = "1.2.0"  # Минимально допустимая версия
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.check_version(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.check_version(request) or await self.get_response(request)
+
+    def check_version(self, request):
         version = request.headers.get("App-Version")
 
         if version and self.is_version_outdated(version):
@@ -13,8 +155,7 @@ class BlockOldAppVersionsMiddleware:
                 "detail": "Iltimos, ilovani yangilang. Yangi versiya talab qilinadi.",
                 "force_update": True
             }, status=426)  # 426 Upgrade Required
-
-        return self.get_response(request)
+        return None
 
     def is_version_outdated(self, version):
         def to_tuple(v):
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_remove_user_is_female_ride_has_female_passenger_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['datetime', 'id'], name='ride_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['origin', 'datetime', 'id'], name='ride_origin_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['destination', 'datetime', 'id'], name='ride_destination_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_last_message(apps, schema_editor):
+    Chat = apps.get_model('api', 'Chat')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    for chat in Chat.objects.all().iterator():
+        last = ChatMessage.objects.filter(chat=chat).order_by('-timestamp', '-id').first()
+        if last:
+            chat.last_message = last
+            chat.last_message_at = last.timestamp
+            chat.save(update_fields=['last_message', 'last_message_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_ride_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.chatmessage'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Заполняем пару участников; дубликаты одной пары сливаем в самый старый чат
+def fill_participant_pair(apps, schema_editor):
+    Chat = apps.get_model('api', 'Chat')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    seen = {}
+    for chat in Chat.objects.order_by('id').prefetch_related('participants'):
+        ids = sorted(u.id for u in chat.participants.all())
+        if len(ids) not in (1, 2):
+            continue
+        key = (ids[0], ids[-1])
+        keeper = seen.get(key)
+        if keeper is None:
+            chat.user_low_id, chat.user_high_id = key
+            chat.save(update_fields=['user_low', 'user_high'])
+            seen[key] = chat
+            continue
+
+        ChatMessage.objects.filter(chat=chat).update(chat=keeper)
+        chat.delete()
+        last = ChatMessage.objects.filter(chat=keeper).order_by('-timestamp', '-id').first()
+        keeper.last_message = last
+        keeper.last_message_at = last.timestamp if last else None
+        keeper.save(update_fields=['last_message', 'last_message_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_chat_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='user_low',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_participant_pair, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='chat_pair_unique'),
+        ),
+    ]
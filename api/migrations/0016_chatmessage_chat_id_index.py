@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_chat_participant_pair'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['chat', 'id'], name='chatmessage_chat_id_idx'),
+        ),
+    ]
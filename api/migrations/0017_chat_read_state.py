@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Переносим флаги is_read в отметки: всё до первого непрочитанного входящего считается прочитанным
+def fill_read_states(apps, schema_editor):
+    Chat = apps.get_model('api', 'Chat')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    ChatReadState = apps.get_model('api', 'ChatReadState')
+    states = []
+    for chat in Chat.objects.prefetch_related('participants').iterator(chunk_size=500):
+        for user in chat.participants.all():
+            incoming = ChatMessage.objects.filter(chat=chat).exclude(sender=user)
+            first_unread = incoming.filter(is_read=False).order_by('id').values_list('id', flat=True).first()
+            if first_unread is None:
+                watermark = incoming.order_by('-id').values_list('id', flat=True).first() or 0
+            else:
+                watermark = first_unread - 1
+            states.append(ChatReadState(
+                chat=chat,
+                user=user,
+                last_read_message_id=watermark,
+                unread_count=incoming.filter(id__gt=watermark).count(),
+            ))
+    ChatReadState.objects.bulk_create(states, batch_size=500)
+
+
+# Обратно: флаг is_read восстанавливается из отметок собеседника
+def restore_is_read(apps, schema_editor):
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    ChatReadState = apps.get_model('api', 'ChatReadState')
+    for state in ChatReadState.objects.iterator():
+        ChatMessage.objects.filter(
+            chat_id=state.chat_id, id__lte=state.last_read_message_id,
+        ).exclude(sender_id=state.user_id).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_chatmessage_chat_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveBigIntegerField(default=0)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='api.chat')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('chat', 'user'), name='chat_read_state_unique')],
+            },
+        ),
+        migrations.RunPython(fill_read_states, restore_is_read),
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='is_read',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_unread_counters(apps, schema_editor):
+    ChatReadState = apps.get_model('api', 'ChatReadState')
+    UnreadCounter = apps.get_model('api', 'UnreadCounter')
+    totals = ChatReadState.objects.values('user_id').annotate(total=Sum('unread_count'))
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=row['user_id'], count=row['total'] or 0) for row in totals],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_chat_read_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_unread_counters, migrations.RunPython.noop),
+    ]
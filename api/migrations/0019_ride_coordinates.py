@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_unread_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:09
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Существующие брони уже держат места: по одному месту на бронь
+def fill_seats_taken(apps, schema_editor):
+    Ride = apps.get_model('api', 'Ride')
+    Booking = apps.get_model('api', 'Booking')
+    taken = Booking.objects.values('ride_id').annotate(total=Count('id'))
+    for row in taken.iterator():
+        Ride.objects.filter(pk=row['ride_id']).update(seats_taken=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_ride_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='seats',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидание'), ('confirmed', 'Подтверждено'), ('cancelled', 'Отменено')], default='pending', max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('passenger', 'idempotency_key'), name='booking_idempotency_unique'),
+        ),
+        migrations.RunPython(fill_seats_taken, migrations.RunPython.noop),
+    ]
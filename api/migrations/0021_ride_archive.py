@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_seat_inventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRide',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('datetime', models.DateTimeField()),
+                ('phone', models.CharField(max_length=20)),
+                ('seats', models.IntegerField()),
+                ('seats_taken', models.PositiveIntegerField(default=0)),
+                ('price', models.IntegerField(default=0)),
+                ('has_female_passenger', models.BooleanField(default=False)),
+                ('pickup_lat', models.FloatField(blank=True, null=True)),
+                ('pickup_lng', models.FloatField(blank=True, null=True)),
+                ('dropoff_lat', models.FloatField(blank=True, null=True)),
+                ('dropoff_lng', models.FloatField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(max_length=20)),
+                ('seats', models.PositiveSmallIntegerField(default=1)),
+                ('idempotency_key', models.CharField(blank=True, max_length=64, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('passenger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='api.archivedride')),
+            ],
+        ),
+    ]
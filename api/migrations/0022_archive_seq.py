@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+# Уже перенесённым строкам — номера по порядку переноса
+def number_archived_rows(apps, schema_editor):
+    for name in ('ArchivedRide', 'ArchivedBooking'):
+        model = apps.get_model('api', name)
+        rows = list(model.objects.order_by('archived_at', 'id'))
+        for seq, row in enumerate(rows, start=1):
+            row.archive_seq = seq
+        model.objects.bulk_update(rows, ['archive_seq'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_ride_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedride',
+            name='archive_seq',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='archive_seq',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.RunPython(number_archived_rows, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='archivedride',
+            name='archive_seq',
+            field=models.PositiveBigIntegerField(unique=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedbooking',
+            name='archive_seq',
+            field=models.PositiveBigIntegerField(unique=True),
+        ),
+    ]
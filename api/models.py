@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 
 # 👤 Кастомная модель пользователя
 class User(AbstractUser):
@@ -38,8 +39,23 @@ class Ride(models.Model):
     datetime = models.DateTimeField()
     phone = models.CharField(max_length=20)
     seats = models.IntegerField()
+    # 💺 Занятые места: меняется только условным UPDATE (reserve_seats / release_seats)
+    seats_taken = models.PositiveIntegerField(default=0)
     price = models.IntegerField(default=0)
     has_female_passenger = models.BooleanField(default=False)
+    # 📍 Необязательные координаты посадки и высадки (для поиска «рядом со мной»)
+    pickup_lat = models.FloatField(null=True, blank=True)
+    pickup_lng = models.FloatField(null=True, blank=True)
+    dropoff_lat = models.FloatField(null=True, blank=True)
+    dropoff_lng = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # 🔑 Лента: keyset-пагинация по (datetime, id)
+            models.Index(fields=['datetime', 'id'], name='ride_feed_idx'),
+            models.Index(fields=['origin', 'datetime', 'id'], name='ride_origin_feed_idx'),
+            models.Index(fields=['destination', 'datetime', 'id'], name='ride_destination_feed_idx'),
+        ]
 
     def __str__(self):
         return f'{self.origin} → {self.destination}'
@@ -52,29 +68,128 @@ class Booking(models.Model):
         max_length=20,
         choices=[
             ('pending', 'Ожидание'),
-            ('confirmed', 'Подтверждено')
+            ('confirmed', 'Подтверждено'),
+            ('cancelled', 'Отменено'),
         ],
         default='pending'
     )
+    seats = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    # 🔁 Ключ идемпотентности из заголовка Idempotency-Key: повтор запроса вернёт ту же бронь
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    # Статусы, которые держат места в Ride.seats_taken
+    HOLDING_STATUSES = ('pending', 'confirmed')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['passenger', 'idempotency_key'], name='booking_idempotency_unique'),
+        ]
 
     def __str__(self):
         return f'{self.passenger.username} - {self.ride}'
 
+
+# 🗄 Архив прошедших поездок (manage.py archive_rides): те же поля и id, что были в Ride.
+# archive_seq — порядковый номер переноса в архив: id здесь старые, а выгрузке (api.export)
+# нужен курсор, который растёт вместе с архивом.
+class ArchivedRide(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    archive_seq = models.PositiveBigIntegerField(unique=True)
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    datetime = models.DateTimeField()
+    phone = models.CharField(max_length=20)
+    seats = models.IntegerField()
+    seats_taken = models.PositiveIntegerField(default=0)
+    price = models.IntegerField(default=0)
+    has_female_passenger = models.BooleanField(default=False)
+    pickup_lat = models.FloatField(null=True, blank=True)
+    pickup_lng = models.FloatField(null=True, blank=True)
+    dropoff_lat = models.FloatField(null=True, blank=True)
+    dropoff_lng = models.FloatField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.origin} → {self.destination} (archived)'
+
+
+class ArchivedBooking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    archive_seq = models.PositiveBigIntegerField(unique=True)
+    ride = models.ForeignKey(ArchivedRide, on_delete=models.CASCADE, related_name='bookings')
+    passenger = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    seats = models.PositiveSmallIntegerField(default=1)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.passenger_id} - {self.ride_id} (archived)'
+
 # 💬 Чат между двумя участниками
 class Chat(models.Model):
     participants = models.ManyToManyField(User)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 📝 Сводка последнего сообщения — обновляется в send_chat_message, нужна списку чатов
+    last_message = models.ForeignKey(
+        'ChatMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # 🔑 Каноническая пара участников (меньший id, больший id) — поиск чата одним probe по индексу
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='chat_pair_unique'),
+        ]
 
     def __str__(self):
         return f"Chat ID {self.id}"
 
+    @staticmethod
+    def pair_key(user1, user2):
+        return tuple(sorted((user1.pk, user2.pk)))
+
 # 💬 Сообщения в чате
 class ChatMessage(models.Model):
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages', null=True)
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # 📜 История чата и инкрементальный опрос по after_id/before_id
+            models.Index(fields=['chat', 'id'], name='chatmessage_chat_id_idx'),
+        ]
 
     def __str__(self):
         return f"From {self.sender.username}: {self.message[:20]}"
+
+
+# 👁 Отметка прочтения: участник дочитал чат до last_read_message_id включительно.
+# unread_count — счётчик входящих после отметки, чтобы не считать сообщения заново.
+class ChatReadState(models.Model):
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chat', 'user'], name='chat_read_state_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} read chat {self.chat_id} up to {self.last_read_message_id}"
+
+
+# 🔔 Счётчик непрочитанных для бейджа: растёт при отправке, пересчитывается из отметок при чтении
+class UnreadCounter(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.count} unread"
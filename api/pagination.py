@@ -0,0 +1,80 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# 🔑 Keyset-пагинация ленты по (datetime, id).
+# Курсор хранит позицию последней строки страницы, поэтому следующая страница —
+# это диапазон по индексу, а не OFFSET: стоимость не зависит от размера таблицы.
+class RideCursorPagination(BasePagination):
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    ordering = ('-datetime', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            dt, pk = position
+            # datetime <= dt даёт диапазон по индексу, OR отсекает уже показанные строки
+            queryset = queryset.filter(datetime__lte=dt).filter(Q(datetime__lt=dt) | Q(id__lt=pk))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last.datetime, last.pk))
+
+    def encode_cursor(self, dt, pk):
+        raw = f'{dt.isoformat()}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            dt, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+            return datetime.fromisoformat(dt), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor'})
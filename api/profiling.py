@@ -0,0 +1,119 @@
+import cProfile
+import os
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signing import BadSignature, Signer
+
+DEFAULTS = {
+    # Доля запросов, которые профилируются сами по себе (0 — только по заголовку X-Profile)
+    'SAMPLE_RATE': 0.0,
+    # Для выборки: только пути с этими префиксами (пусто — все)
+    'PATHS': [],
+    'DIR': None,
+    # Сколько последних профилей хранить; старые удаляются при записи нового
+    'MAX_FILES': 200,
+    # Ключ подписи токенов X-Profile (не SECRET_KEY)
+    'SECRET': None,
+}
+
+HEADER = 'X-Profile'
+SIGNER_SALT = 'api.profiling'
+NON_SLUG = re.compile(r'[^a-zA-Z0-9]+')
+
+
+def profiling_options():
+    options = {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+    options['DIR'] = Path(options['DIR'] or Path(settings.BASE_DIR) / 'profiles')
+    return options
+
+
+# 🔏 Ключ подписи X-Profile. Без PROFILING['SECRET'] или с SECRET_KEY по умолчанию из settings
+# токен может выпустить кто угодно — профилирование по заголовку выключено.
+def profiling_secret():
+    secret = getattr(settings, 'PROFILING', {}).get('SECRET')
+    if not secret or settings.SECRET_KEY == getattr(settings, 'INSECURE_SECRET_KEY', None):
+        return None
+    return secret
+
+
+# Значение заголовка X-Profile: срок действия, подписанный PROFILING['SECRET']
+def make_profile_token(ttl=3600):
+    secret = profiling_secret()
+    if secret is None:
+        raise ImproperlyConfigured('Set PROFILING_SECRET and SECRET_KEY to enable X-Profile tokens')
+    return Signer(key=secret, salt=SIGNER_SALT).sign(str(int(time.time() + ttl)))
+
+
+def valid_profile_token(value):
+    secret = profiling_secret()
+    if secret is None:
+        return False
+    try:
+        expires_at = int(Signer(key=secret, salt=SIGNER_SALT).unsign(value))
+    except (BadSignature, ValueError):
+        return False
+    return expires_at > time.time()
+
+
+# 🎲 Профилировать ли запрос. Без заголовка и с SAMPLE_RATE=0 — одно чтение заголовка.
+def should_profile(request, options):
+    token = request.headers.get(HEADER)
+    if token:
+        return valid_profile_token(token)
+    rate = options['SAMPLE_RATE']
+    if not rate or random.random() >= rate:
+        return False
+    return not options['PATHS'] or request.path.startswith(tuple(options['PATHS']))
+
+
+# 🔬 Детерминированный профиль (cProfile) одного запроса, результат — файл pstats
+class RequestProfile:
+    def __init__(self, request):
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.disable()
+        self.elapsed_ms = (time.perf_counter() - self.started) * 1000
+        return False
+
+    def save(self, options=None):
+        options = options or profiling_options()
+        directory = options['DIR']
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = NON_SLUG.sub('_', self.request.path).strip('_')[:60] or 'root'
+        name = (
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{self.elapsed_ms:.0f}ms-"
+            f"{self.request.method}-{slug}-{uuid.uuid4().hex[:6]}.prof"
+        )
+        self.profiler.dump_stats(directory / name)
+        rotate_profiles(directory, options['MAX_FILES'])
+        return name
+
+
+def list_profiles(directory=None):
+    directory = Path(directory or profiling_options()['DIR'])
+    if not directory.exists():
+        return []
+    return sorted(directory.glob('*.prof'), key=lambda path: path.stat().st_mtime)
+
+
+def rotate_profiles(directory, max_files):
+    profiles = list_profiles(directory)
+    for path in profiles[:max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
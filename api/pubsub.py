@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# 📡 Pub/sub для доставки событий подписчикам (WebSocket / SSE).
+# Брокер подключается через settings.CHAT_PUBSUB_BACKEND; InProcessBroker работает
+# в пределах одного процесса, для нескольких воркеров нужен брокер с общей шиной.
+class BaseBroker:
+    def publish(self, channel, payload):
+        raise NotImplementedError
+
+    def subscribe(self, channel, callback):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers = defaultdict(dict)
+
+    # Колбэки вызываются в потоке издателя — они должны быть быстрыми и потокобезопасными
+    def publish(self, channel, payload):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, {}).values())
+        for callback in callbacks:
+            callback(payload)
+        return len(callbacks)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            subscription_id = next(self._ids)
+            self._subscribers[channel][subscription_id] = callback
+        return channel, subscription_id
+
+    def unsubscribe(self, subscription):
+        channel, subscription_id = subscription
+        with self._lock:
+            callbacks = self._subscribers.get(channel)
+            if callbacks is not None:
+                callbacks.pop(subscription_id, None)
+                if not callbacks:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, {}))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'CHAT_PUBSUB_BACKEND', 'api.pubsub.InProcessBroker')
+                _broker = import_string(backend)()
+    return _broker
+
+
+def user_channel(user_id):
+    return f'user.{user_id}'
+
+
+# 🎧 Асинхронный подписчик: события из любого потока попадают в asyncio.Queue своего event loop.
+# При переполнении очереди (медленный клиент) выбрасываем самое старое событие.
+class Listener:
+    def __init__(self, channels, broker=None, maxsize=100):
+        self.broker = broker or get_broker()
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.subscriptions = [self.broker.subscribe(channel, self._deliver) for channel in channels]
+
+    def _deliver(self, payload):
+        try:
+            self.loop.call_soon_threadsafe(self._put, payload)
+        except RuntimeError:
+            # loop уже закрыт — подписчик ушёл, но ещё не успел отписаться
+            pass
+
+    def _put(self, payload):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        for subscription in self.subscriptions:
+            self.broker.unsubscribe(subscription)
+        self.subscriptions = []
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from .authentication import CachedTokenAuthentication
+from .pubsub import Listener, get_broker, user_channel
+
+KEEPALIVE_SECONDS = 25
+
+
+# 🔐 Токен берём из заголовка Authorization: Token <key> или из ?token=
+# (браузерные WebSocket и EventSource не умеют ставить заголовки)
+def extract_token(headers, query_string):
+    auth = headers.get('authorization', '')
+    keyword, _, key = auth.partition(' ')
+    if keyword.lower() == 'token' and key.strip():
+        return key.strip()
+    return parse_qs(query_string).get('token', [None])[0]
+
+
+def authenticate_token(key):
+    if not key:
+        return None
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+def encode_event(payload):
+    return json.dumps(payload, cls=JSONEncoder, ensure_ascii=False)
+
+
+# 📤 Публикация события получателю; вызывается после коммита транзакции
+def publish_to_user(user_id, payload):
+    return get_broker().publish(user_channel(user_id), payload)
+
+
+# 🔌 WebSocket: /ws/chat/ — сервер только пушит события, входящие сообщения клиента игнорируются
+# (кроме "ping", на который отвечаем "pong")
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+    key = extract_token(headers, scope.get('query_string', b'').decode('latin-1'))
+    user = await sync_to_async(authenticate_token)(key)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    listener = Listener([user_channel(user.pk)])
+    incoming = asyncio.ensure_future(receive())
+    outgoing = asyncio.ensure_future(listener.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+            if outgoing in done:
+                await send({'type': 'websocket.send', 'text': encode_event(outgoing.result())})
+                outgoing = asyncio.ensure_future(listener.get())
+            if incoming in done:
+                message = incoming.result()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message.get('text') == 'ping':
+                    await send({'type': 'websocket.send', 'text': 'pong'})
+                incoming = asyncio.ensure_future(receive())
+    finally:
+        listener.close()
+        incoming.cancel()
+        outgoing.cancel()
+
+
+# 📡 Server-sent events: запасной канал для клиентов без WebSocket
+async def chat_event_stream(request):
+    key = extract_token(request.headers, request.META.get('QUERY_STRING', ''))
+    user = await sync_to_async(authenticate_token)(key)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    async def stream():
+        # подписываемся внутри генератора — в том event loop, который будет его читать
+        listener = Listener([user_channel(user.pk)])
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    payload = await listener.get(timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {payload.get('type', 'message')}\ndata: {encode_event(payload)}\n\n"
+        finally:
+            listener.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
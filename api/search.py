@@ -0,0 +1,220 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+
+from .models import Ride
+
+DEFAULTS = {
+    # Через сколько секунд индекс перестраивается из БД (изменения из других процессов)
+    'TTL': 300,
+    'MIN_SCORE': 0.35,
+    'MAX_PLACES': 10,
+}
+
+# 🔤 Кириллица → латиница в узбекской записи (ш → sh, ч → ch, қ → q, ў → o')
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'j', 'з': 'z',
+    'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh',
+    'ъ': '', 'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+}
+
+# 🔤 Сводим узбекскую латиницу и русское написание к одному ключу:
+# Toshkent / Ташкент, Buxoro / Бухара, Samarqand / Самарканд
+FOLD = str.maketrans({'o': 'a', 'q': 'k', 'x': 'h'})
+
+APOSTROPHES = re.compile(r"['`ʻʼ‘’]")
+NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_place(text):
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = ''.join(TRANSLIT.get(char, char) for char in text)
+    text = APOSTROPHES.sub('', text)
+    text = NON_WORD.sub(' ', text).strip()
+    return text.translate(FOLD)
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# 🔎 Индекс мест для поиска поездок: нормализованные названия + триграммы.
+# Словарь мест мал (сотни городов даже на 100k поездок), поэтому нечёткий поиск идёт по нему,
+# а поездки лежат заранее отсортированными списками по паре (откуда, куда) в порядке ленты.
+class LocationIndex:
+    def __init__(self, min_score=None, max_places=None):
+        options = {**DEFAULTS, **getattr(settings, 'LOCATION_INDEX', {})}
+        self.min_score = min_score if min_score is not None else options['MIN_SCORE']
+        self.max_places = max_places or options['MAX_PLACES']
+        self._lock = threading.RLock()
+        self.built_at = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.place_refs = Counter()            # ключ места -> сколько поездок на него ссылается
+            self.trigram_postings = defaultdict(set)
+            self.place_trigrams = {}
+            self.pairs = defaultdict(list)         # (откуда, куда) -> [(ключ сортировки, id)]
+            self.by_origin = defaultdict(set)
+            self.by_destination = defaultdict(set)
+            self.rides = {}
+
+    # rows: (id, origin, destination, datetime)
+    def build(self, rows):
+        with self._lock:
+            self.clear()
+            for row in rows:
+                self.add(*row, keep_sorted=False)
+            for items in self.pairs.values():
+                items.sort()
+            self.built_at = time.monotonic()
+
+    def add(self, ride_id, origin, destination, dt, keep_sorted=True):
+        with self._lock:
+            self.remove(ride_id)
+            origin_key = self._add_place(origin)
+            destination_key = self._add_place(destination)
+            # порядок ленты: новые поездки первыми, при равном времени — больший id
+            entry = (-dt.timestamp(), -ride_id)
+            pair = (origin_key, destination_key)
+            if keep_sorted:
+                bisect.insort(self.pairs[pair], entry)
+            else:
+                self.pairs[pair].append(entry)
+            self.by_origin[origin_key].add(destination_key)
+            self.by_destination[destination_key].add(origin_key)
+            self.rides[ride_id] = (origin_key, destination_key, entry)
+
+    def remove(self, ride_id):
+        with self._lock:
+            known = self.rides.pop(ride_id, None)
+            if known is None:
+                return
+            origin_key, destination_key, entry = known
+            pair = (origin_key, destination_key)
+            items = self.pairs[pair]
+            index = bisect.bisect_left(items, entry)
+            if index < len(items) and items[index] == entry:
+                del items[index]
+            else:
+                items.remove(entry)
+            if not items:
+                del self.pairs[pair]
+                self.by_origin[origin_key].discard(destination_key)
+                self.by_destination[destination_key].discard(origin_key)
+            self._drop_place(origin_key)
+            self._drop_place(destination_key)
+
+    # ранжированные места: [(ключ, оценка)], оценка 1.0 — точное совпадение после нормализации
+    def match_places(self, query, limit=None):
+        key = normalize_place(query)
+        if not key:
+            return []
+        query_trigrams = trigrams(key)
+        overlap = Counter()
+        with self._lock:
+            for gram in query_trigrams:
+                for place in self.trigram_postings.get(gram, ()):
+                    overlap[place] += 1
+            scored = []
+            for place, common in overlap.items():
+                score = 2 * common / (len(query_trigrams) + len(self.place_trigrams[place]))
+                if place == key:
+                    score = 1.0
+                elif place.startswith(key):
+                    score = max(score, 0.9)
+                if score >= self.min_score:
+                    scored.append((score, place))
+        return [(place, score) for score, place in heapq.nlargest(limit or self.max_places, scored)]
+
+    # id поездок по убыванию релевантности, при равной — в порядке ленты.
+    # since — только поездки с datetime >= since: в списке пары они идут первыми, хвост отрезаем bisect
+    def search(self, origin=None, destination=None, limit=20, since=None):
+        origins = dict(self.match_places(origin)) if origin else None
+        destinations = dict(self.match_places(destination)) if destination else None
+        bound = (-since.timestamp(), math.inf) if since else None
+        with self._lock:
+            by_score = defaultdict(list)
+            for pair, score in self._candidate_pairs(origins, destinations):
+                items = self.pairs[pair]
+                if bound is not None:
+                    items = islice(items, bisect.bisect_right(items, bound))
+                by_score[score].append(items)
+            ride_ids = []
+            for score in sorted(by_score, reverse=True):
+                merged = heapq.merge(*by_score[score])
+                ride_ids.extend(-ride_id for _, ride_id in islice(merged, limit - len(ride_ids)))
+                if len(ride_ids) >= limit:
+                    break
+        return ride_ids
+
+    def _candidate_pairs(self, origins, destinations):
+        if origins is not None:
+            for origin_key, origin_score in origins.items():
+                for destination_key in self.by_origin.get(origin_key, ()):
+                    if destinations is None:
+                        yield (origin_key, destination_key), origin_score
+                    elif destination_key in destinations:
+                        yield (origin_key, destination_key), origin_score * destinations[destination_key]
+        elif destinations is not None:
+            for destination_key, score in destinations.items():
+                for origin_key in self.by_destination.get(destination_key, ()):
+                    yield (origin_key, destination_key), score
+
+    def _add_place(self, name):
+        key = normalize_place(name)
+        if key not in self.place_trigrams:
+            grams = trigrams(key)
+            self.place_trigrams[key] = grams
+            for gram in grams:
+                self.trigram_postings[gram].add(key)
+        self.place_refs[key] += 1
+        return key
+
+    def _drop_place(self, key):
+        self.place_refs[key] -= 1
+        if self.place_refs[key] > 0:
+            return
+        del self.place_refs[key]
+        for gram in self.place_trigrams.pop(key, ()):
+            postings = self.trigram_postings[gram]
+            postings.discard(key)
+            if not postings:
+                del self.trigram_postings[gram]
+
+
+_index = LocationIndex()
+_index_lock = threading.Lock()
+
+
+# 🔎 Индекс процесса: строится лениво из Ride и перестраивается раз в TTL
+def get_location_index():
+    ttl = {**DEFAULTS, **getattr(settings, 'LOCATION_INDEX', {})}['TTL']
+    if _index.built_at is None or time.monotonic() - _index.built_at > ttl:
+        with _index_lock:
+            if _index.built_at is None or time.monotonic() - _index.built_at > ttl:
+                _index.build(Ride.objects.values_list('id', 'origin', 'destination', 'datetime').iterator(chunk_size=5000))
+    return _index
+
+
+# Для сигналов: обновляем индекс, только если он уже построен в этом процессе
+def location_index_if_built():
+    return _index if _index.built_at is not None else None
+
+
+def reset_location_index():
+    with _index_lock:
+        _index.clear()
+        _index.built_at = None
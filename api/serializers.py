@@ -1,18 +1,63 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from .metrics import TimedSerializerMixin
 from .models import User, Ride, Booking, ChatMessage, Chat
 
+
+# ✂️ ?fields=id,origin — набор полей ответа; только для чтения (GET/HEAD), неизвестные имена игнорируются
+def requested_fields(request):
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.GET.get('fields')
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+# ✂️ Лишние поля убираем до сериализации — их source и методы не вызываются вовсе
+class SparseFieldsMixin:
+    # поля-методы, которым нужна связанная модель: {'phone': 'driver'}
+    method_relations = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'))
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    # Связи, без которых запрошенные поля не посчитать — для select_related/prefetch_related во вьюхе
+    @classmethod
+    def relations_for(cls, requested):
+        relations = set()
+        for name, field in cls().fields.items():
+            if name not in requested:
+                continue
+            attrs = getattr(field, 'source_attrs', [])
+            if len(attrs) > 1 or isinstance(field, serializers.ManyRelatedField):
+                relations.add(attrs[0])
+            if name in cls.method_relations:
+                relations.add(cls.method_relations[name])
+        return relations
+
 # ✅ Сериализатор сообщений чата
-class ChatMessageSerializer(serializers.ModelSerializer):
+class ChatMessageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     sender_username = serializers.CharField(source='sender.username', read_only=True)
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatMessage
         fields = ['id', 'chat', 'sender', 'sender_username', 'message', 'timestamp', 'is_read']
         read_only_fields = ['id', 'chat', 'sender', 'sender_username', 'timestamp', 'is_read']
 
+    # 👁 read_upto: {id отправителя: до какого id дочитал его собеседник}
+    def get_is_read(self, obj):
+        read_upto = self.context.get('read_upto', {})
+        return obj.id <= read_upto.get(obj.sender_id, 0)
+
 
 # ✅ Сериализатор чата
-class ChatSerializer(serializers.ModelSerializer):
+class ChatSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     participants_usernames = serializers.SerializerMethodField()
 
     class Meta:
@@ -24,7 +69,7 @@ class ChatSerializer(serializers.ModelSerializer):
 
 
 # ✅ Сериализатор пользователя с валидацией пола
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
@@ -45,7 +90,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # ✅ Сериализатор поездки
-class RideSerializer(serializers.ModelSerializer):
+class RideSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     driver = serializers.IntegerField(source='driver.id', read_only=True)
     driverUsername = serializers.CharField(source='driver.username', read_only=True)
     is_driver = serializers.BooleanField(source='driver.is_driver', read_only=True)
@@ -56,9 +101,26 @@ class RideSerializer(serializers.ModelSerializer):
     has_female_passenger = serializers.BooleanField(required=False, allow_null=True)
     phone = serializers.SerializerMethodField()  # 👈 показываем только если разрешено
 
+    method_relations = {'phone': 'driver'}
+
     class Meta:
         model = Ride
         fields = '__all__'
+        # 💺 seats_taken меняют только reserve_seats / release_seats условным UPDATE
+        read_only_fields = ['seats_taken']
+
+    def validate_seats(self, value):
+        if self.instance is not None and value < self.instance.seats_taken:
+            raise serializers.ValidationError('Band qilingan joylardan kam bo‘lishi mumkin emas')
+        return value
+
+    # Сохраняем только изменённые поля: полный save() записал бы загруженный seats_taken
+    # поверх брони, сделанной между чтением и записью
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
     def get_phone(self, obj):
         request = self.context.get('request')
@@ -69,10 +131,20 @@ class RideSerializer(serializers.ModelSerializer):
 
 
 # ✅ Сериализатор бронирования
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     passenger_username = serializers.CharField(source='passenger.username', read_only=True)
     passenger_gender = serializers.CharField(source='passenger.gender', read_only=True)
 
     class Meta:
         model = Booking
-        fields = '__all__'
+        # 🔁 idempotency_key не отдаём: это ключ повтора, выбранный клиентом (приходит заголовком)
+        fields = ['id', 'passenger_username', 'passenger_gender', 'status', 'seats', 'ride', 'passenger']
+        # 💺 Статус меняется только через confirm/cancel, чтобы места в Ride.seats_taken сходились
+        read_only_fields = ['status']
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            for field in ('ride', 'seats', 'passenger'):
+                if field in attrs and attrs[field] != getattr(self.instance, field):
+                    raise serializers.ValidationError({field: 'Bronni bekor qiling va qaytadan band qiling'})
+        return attrs
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .cache import RIDE_DRIVER_FIELDS, resource_versions, ride_row_cache
+from .models import Ride, User
+from .geo import POINTS, geo_indexes_if_built
+from .metrics import install_query_timer
+from .search import location_index_if_built
+
+
+# 🗝 Сброс кеша токенов: выход через djoser удаляет токен, изменения пользователя — его записи
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate_key(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
+
+
+# 🔖 Имена участников видны в списке чатов — любое изменение пользователя меняет его ETag
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_users_version(sender, instance, **kwargs):
+    transaction.on_commit(lambda: resource_versions.bump('users'))
+
+
+# 🗃 Сброс строк ленты: сама поездка или поля её водителя
+@receiver(post_save, sender=Ride)
+@receiver(post_delete, sender=Ride)
+def forget_ride_row(sender, instance, **kwargs):
+    ride_row_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def forget_driver_ride_rows(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not RIDE_DRIVER_FIELDS.intersection(update_fields)):
+        return
+    ride_row_cache.invalidate(list(Ride.objects.filter(driver=instance).values_list('id', flat=True)))
+
+
+# 🔎 Индекс мест обновляем на месте, если он уже построен в этом процессе
+@receiver(post_save, sender=Ride)
+def index_ride_places(sender, instance, **kwargs):
+    index = location_index_if_built()
+    if index is not None:
+        index.add(instance.pk, instance.origin, instance.destination, instance.datetime)
+
+
+@receiver(post_delete, sender=Ride)
+def unindex_ride_places(sender, instance, **kwargs):
+    index = location_index_if_built()
+    if index is not None:
+        index.remove(instance.pk)
+
+
+# 📍 Сетка координат посадки/высадки
+@receiver(post_save, sender=Ride)
+def index_ride_points(sender, instance, **kwargs):
+    for point, index in geo_indexes_if_built().items():
+        lat_field, lng_field = POINTS[point]
+        index.add(instance.pk, getattr(instance, lat_field), getattr(instance, lng_field), instance.datetime)
+
+
+@receiver(post_delete, sender=Ride)
+def unindex_ride_points(sender, instance, **kwargs):
+    for index in geo_indexes_if_built().values():
+        index.remove(instance.pk)
+
+
+# 📊 Учёт запросов к БД для RequestMetricsMiddleware — на каждом новом соединении любого потока
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    install_query_timer(connection)
@@ -1,3 +1,1636 @@
-from django.test import TestCase
+import asyncio
+import copy
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signing import Signer
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Count, Sum
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .archive import archive_expired_rides
+from .export import CHUNK_SIZE
+from .models import (
+    User, Ride, Booking, Chat, ChatMessage, ChatReadState, UnreadCounter, ArchivedRide, ArchivedBooking,
+)
+from .geo import GridIndex, haversine_km, reset_geo_indexes
+from .search import LocationIndex, normalize_place, reset_location_index
+from .serializers import ChatMessageSerializer, RideSerializer
+from .fast_serializers import ChatMessageRowSerializer, RideRowSerializer
+from .renderers import FastJSONRenderer, orjson
+from .cache import SingleFlight, ride_row_cache
+from .authentication import CachedTokenAuthentication, TokenCache, token_cache
+from .hashing import HashingPool, HashingPoolBusy
+from .batching import GroupCommit
+from .benchmarks import SEED_PASSWORD
+from .loadtest import HttpClient, Recorder
+from .metrics import request_metrics
+from .profiling import list_profiles, make_profile_token
+from .pubsub import InProcessBroker, get_broker, user_channel
+from .realtime import websocket_application
+from .views import write_chat_messages
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RideFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998901112233', is_driver=True)
+        self.now = timezone.now().replace(microsecond=0)
+
+    def make_ride(self, minutes, **kwargs):
+        data = {
+            'origin': 'Toshkent',
+            'destination': 'Samarqand',
+            'driver': self.driver,
+            'datetime': self.now + timedelta(minutes=minutes),
+            'phone': '+998901112233',
+            'seats': 3,
+        }
+        data.update(kwargs)
+        return Ride.objects.create(**data)
+
+    def test_cursor_walks_whole_feed_without_duplicates(self):
+        # одинаковое время у нескольких поездок — курсор должен различать их по id
+        rides = [self.make_ride(i // 3) for i in range(25)]
+        seen = []
+        url = '/api/rides/?limit=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        expected = [r.id for r in sorted(rides, key=lambda r: (r.datetime, r.id), reverse=True)]
+        self.assertEqual(seen, expected)
+
+    def test_filters_by_route_and_date_window(self):
+        match = self.make_ride(60 * 24)
+        self.make_ride(60 * 24, origin='Buxoro')
+        self.make_ride(60 * 24 * 5)
+        day = (self.now + timedelta(days=1)).date().isoformat()
+
+        response = self.client.get('/api/rides/', {
+            'origin': 'Toshkent', 'destination': 'Samarqand', 'date_from': day, 'date_to': day,
+        })
+
+        self.assertEqual([row['id'] for row in response.data['results']], [match.id])
+
+    def test_invalid_cursor_and_date_are_rejected(self):
+        self.assertEqual(self.client.get('/api/rides/?cursor=@@@').status_code, 400)
+        self.assertEqual(self.client.get('/api/rides/?date_from=tomorrow').status_code, 400)
+
+
+# 🔢 Точное число запросов для каждого маршрута api/urls.py.
+# Данных несколько строк на каждый список: N+1 сразу сломает тест.
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True)
+        self.passenger = User.objects.create_user(username='passenger', password='pass', phone='+998900000002', gender='female')
+        self.token = Token.objects.create(user=self.passenger)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        drivers = [self.driver] + [
+            User.objects.create_user(username=f'driver{i}', password='pass', phone='+99890000001{i}', is_driver=True)
+            for i in range(4)
+        ]
+        now = timezone.now()
+        self.rides = [
+            Ride.objects.create(
+                origin='Toshkent', destination='Buxoro', driver=d, datetime=now + timedelta(hours=i),
+                phone=d.phone, seats=4, price=50000,
+            )
+            for i, d in enumerate(drivers)
+        ]
+        self.bookings = [Booking.objects.create(ride=r, passenger=self.passenger) for r in self.rides]
+
+        for d in drivers:
+            low, high = Chat.pair_key(self.passenger, d)
+            chat = Chat.objects.create(user_low_id=low, user_high_id=high)
+            chat.participants.add(self.passenger, d)
+            for text in ('salom', 'qachon?'):
+                message = ChatMessage.objects.create(chat=chat, sender=d, message=text)
+            Chat.objects.filter(pk=chat.pk).update(last_message=message, last_message_at=message.timestamp)
+            ChatReadState.objects.bulk_create([
+                ChatReadState(chat=chat, user=self.passenger, unread_count=2),
+                ChatReadState(chat=chat, user=d),
+            ])
+        UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user=self.passenger, count=2 * len(drivers))] + [UnreadCounter(user=d) for d in drivers]
+        )
+
+        # счётчики ниже — для прогретого кеша токенов, как в рабочем режиме
+        token_cache.clear()
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def assertQueries(self, count, method, url, data=None, status=200):
+        with self.assertNumQueries(count):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, None if response.streaming else response.content)
+        return response
+
+    def test_api_root(self):
+        self.assertQueries(0, 'get', '/api/')
+
+    def test_users(self):
+        self.assertQueries(3, 'get', '/api/users/')
+        self.assertQueries(3, 'get', f'/api/users/{self.driver.id}/')
+        self.assertQueries(0, 'get', '/api/users/me/')
+        self.assertQueries(2, 'patch', '/api/users/me/', {'has_ac': True})
+
+    def test_rides(self):
+        response = self.assertQueries(2, 'get', '/api/rides/')
+        self.assertEqual(len(response.data['results']), len(self.rides))
+        self.assertQueries(1, 'get', f'/api/rides/{self.rides[0].id}/')
+
+    # индекс мест строится одним запросом, строки — одним на все промахи кеша; прогретый поиск без БД
+    def test_search(self):
+        reset_location_index()
+        self.addCleanup(reset_location_index)
+        response = self.assertQueries(2, 'get', '/api/rides/search/?origin=Toshkent')
+        self.assertEqual(len(response.data), len(self.rides))
+        self.assertQueries(0, 'get', '/api/rides/search/?origin=Toshkent')
+
+    # индекс точек строится одним запросом, строки — одним на все промахи кеша; прогретый nearby без БД
+    def test_nearby(self):
+        Ride.objects.update(pickup_lat=41.3, pickup_lng=69.24)
+        reset_geo_indexes()
+        self.addCleanup(reset_geo_indexes)
+        response = self.assertQueries(2, 'get', '/api/rides/nearby/?lat=41.3&lng=69.24')
+        self.assertEqual(len(response.data), len(self.rides))
+        self.assertQueries(0, 'get', '/api/rides/nearby/?lat=41.3&lng=69.24')
+
+    def test_bookings(self):
+        response = self.assertQueries(1, 'get', '/api/bookings/')
+        self.assertEqual(len(response.data), len(self.bookings))
+        self.assertQueries(1, 'get', f'/api/bookings/{self.bookings[0].id}/')
+        self.assertQueries(6, 'post', '/api/bookings/', {
+            'ride': self.rides[0].id, 'passenger': self.passenger.id,
+        }, status=201)
+
+    def test_booking_transitions(self):
+        driver_token = Token.objects.create(user=self.driver).key
+        CachedTokenAuthentication().authenticate_credentials(driver_token)
+        booking = self.bookings[0]
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {driver_token}')
+        response = self.assertQueries(6, 'post', f'/api/bookings/{booking.id}/confirm/')
+        self.assertEqual(response.data['status'], 'confirmed')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.assertQueries(7, 'post', f'/api/bookings/{booking.id}/cancel/')
+        self.assertEqual(response.data['status'], 'cancelled')
+
+    def test_auth(self):
+        self.client.credentials()
+        self.assertQueries(5, 'post', '/api/register/', {
+            'username': 'newbie', 'password': 'pass', 'phone': '+998900000099', 'gender': 'male',
+        }, status=201)
+        self.assertQueries(2, 'post', '/api/login/', {'username': 'passenger', 'password': 'pass'})
+
+    def test_create_ride(self):
+        self.assertQueries(1, 'post', '/api/custom/create_ride/', {
+            'origin': 'Toshkent', 'destination': 'Xiva', 'phone': '+998900000002', 'seats': 1,
+            'price': 0, 'datetime': '2030-01-01T10:00:00',
+        }, status=201)
+
+    def test_chat(self):
+        response = self.assertQueries(2, 'get', '/api/chat/threads/')
+        self.assertEqual(len(response.data), 5)
+        response = self.assertQueries(2, 'get', '/api/chat/inbox/')
+        self.assertEqual(len(response.data), 5)
+        response = self.assertQueries(6, 'get', f'/api/chat/{self.driver.id}/messages/')
+        self.assertEqual(len(response.data), 2)
+        self.assertQueries(8, 'post', '/api/chat/send/', {'receiver': self.driver.id, 'message': 'kelyapman'}, status=201)
+
+    def test_unread_count(self):
+        response = self.assertQueries(1, 'get', '/api/chat/unread/')
+        self.assertEqual(json.loads(response.content), {'unread_count': 10})
+
+    def test_chat_event_stream(self):
+        response = self.assertQueries(0, 'get', '/api/chat/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+    # выгрузка — пачками: число запросов зависит от числа пачек, а не строк
+    def test_export(self):
+        staff = User.objects.create_user(username='staff', password='pass', phone='+998900000003', is_staff=True)
+        token = Token.objects.create(user=staff).key
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        CachedTokenAuthentication().authenticate_credentials(token)
+        for chunk_size, count in ((CHUNK_SIZE, 1), (4, 3)):
+            with mock.patch('api.export.CHUNK_SIZE', chunk_size), self.assertNumQueries(count):
+                response = self.client.get('/api/export/messages/?format=csv')
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    lines = b''.join(response).decode().splitlines()
+            self.assertEqual(len(lines), 1 + ChatMessage.objects.count())
+
+    def test_chat_poll_without_unread_skips_write(self):
+        self.client.get(f'/api/chat/{self.driver.id}/messages/')
+        last_id = ChatMessage.objects.latest('id').id
+        self.assertQueries(4, 'get', f'/api/chat/{self.driver.id}/messages/?after_id={last_id}')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ChatInboxTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass', phone='+998900000001', gender='female')
+        self.bob = User.objects.create_user(username='bob', password='pass', phone='+998900000002', is_driver=True)
+        self.carol = User.objects.create_user(username='carol', password='pass', phone='+998900000003', gender='female')
+        self.clients = {}
+        for user in (self.alice, self.bob, self.carol):
+            client = APIClient()
+            client.force_authenticate(user)
+            self.clients[user.username] = client
+
+    def send(self, sender, receiver, text):
+        response = self.clients[sender.username].post(
+            '/api/chat/send/', {'receiver': receiver.id, 'message': text}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_inbox_returns_last_message_and_unread_count(self):
+        self.send(self.bob, self.alice, 'salom')
+        self.send(self.carol, self.alice, 'qayerdasiz?')
+        self.send(self.bob, self.alice, 'yetib keldim')
+
+        inbox = self.clients['alice'].get('/api/chat/inbox/').data
+
+        self.assertEqual([row['receiver_username'] for row in inbox], ['bob', 'carol'])
+        self.assertEqual(inbox[0]['last_message'], 'yetib keldim')
+        self.assertEqual(inbox[0]['sender_username'], 'bob')
+        self.assertEqual(inbox[0]['unread_count'], 2)
+        self.assertEqual(inbox[1]['unread_count'], 1)
+
+    def test_reading_chat_clears_unread_count(self):
+        self.send(self.bob, self.alice, 'salom')
+        self.send(self.alice, self.bob, 'salom!')
+        self.clients['alice'].get(f'/api/chat/{self.bob.id}/messages/')
+
+        inbox = self.clients['alice'].get('/api/chat/inbox/').data
+
+        self.assertEqual(inbox[0]['last_message'], 'salom!')
+        self.assertEqual(inbox[0]['unread_count'], 0)
+
+    def test_is_read_follows_receiver_watermark(self):
+        first = self.send(self.alice, self.bob, 'salom')
+        self.assertFalse(first['is_read'])
+
+        bob_view = self.clients['bob'].get(f'/api/chat/{self.alice.id}/messages/').data
+        self.assertEqual([m['is_read'] for m in bob_view], [True])
+
+        self.send(self.alice, self.bob, 'qayerdasiz?')
+        self.send(self.bob, self.alice, 'yo\'ldaman')
+        alice_view = self.clients['alice'].get(f'/api/chat/{self.bob.id}/messages/').data
+
+        self.assertEqual([(m['message'], m['is_read']) for m in alice_view], [
+            ('salom', True), ('qayerdasiz?', False), ("yo'ldaman", True),
+        ])
+        self.assertEqual(list(alice_view[0]), ['id', 'chat', 'sender', 'sender_username', 'message', 'timestamp', 'is_read'])
+        self.assertEqual(ChatReadState.objects.get(chat__id=first['chat'], user=self.bob).unread_count, 1)
+
+    def test_reading_unknown_pair_writes_nothing(self):
+        response = self.clients['alice'].get(f'/api/chat/{self.bob.id}/messages/')
+
+        self.assertEqual(response.data, [])
+        self.assertFalse(Chat.objects.exists())
+
+    def test_pair_maps_to_single_chat(self):
+        self.send(self.alice, self.bob, 'salom')
+        self.send(self.bob, self.alice, 'salom!')
+
+        chat = Chat.objects.get()
+        self.assertEqual((chat.user_low_id, chat.user_high_id), (self.alice.id, self.bob.id))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Chat.objects.create(user_low=self.alice, user_high=self.bob)
+
+    def test_history_pages_by_message_id(self):
+        ids = [self.send(self.alice, self.bob, f'xabar {i}')['id'] for i in range(7)]
+        client = self.clients['bob']
+        url = f'/api/chat/{self.alice.id}/messages/'
+
+        self.assertEqual([m['id'] for m in client.get(url).data], ids)
+        self.assertEqual([m['id'] for m in client.get(url, {'limit': 3}).data], ids[-3:])
+        self.assertEqual([m['id'] for m in client.get(url, {'before_id': ids[4], 'limit': 3}).data], ids[1:4])
+        self.assertEqual([m['id'] for m in client.get(url, {'after_id': ids[4]}).data], ids[5:])
+        self.assertEqual(client.get(url, {'after_id': ids[-1]}).data, [])
+        self.assertEqual(client.get(url, {'after_id': 'x'}).status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass', phone='+998900000001', gender='female')
+        self.bob = User.objects.create_user(username='bob', password='pass', phone='+998900000002', is_driver=True)
+        self.bob_token = Token.objects.create(user=self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_in_process_broker_fans_out_and_unsubscribes(self):
+        broker = InProcessBroker()
+        first, second = [], []
+        subscription = broker.subscribe('user.1', first.append)
+        broker.subscribe('user.1', second.append)
+
+        self.assertEqual(broker.publish('user.1', {'n': 1}), 2)
+        broker.unsubscribe(subscription)
+        broker.publish('user.1', {'n': 2})
+        broker.publish('user.2', {'n': 3})
+
+        self.assertEqual(first, [{'n': 1}])
+        self.assertEqual(second, [{'n': 1}, {'n': 2}])
+
+    def test_send_publishes_to_receiver_after_commit(self):
+        received = []
+        subscription = get_broker().subscribe(user_channel(self.bob.id), received.append)
+        self.addCleanup(get_broker().unsubscribe, subscription)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/chat/send/', {'receiver': self.bob.id, 'message': 'salom'}, format='json')
+
+        self.assertEqual(received, [{'type': 'chat.message', 'message': response.data}])
+
+    async def test_websocket_pushes_events_to_authenticated_user(self):
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        scope = {'type': 'websocket', 'path': '/ws/chat/', 'headers': [], 'query_string': f'token={self.bob_token.key}'.encode()}
+        await inbox.put({'type': 'websocket.connect'})
+        task = asyncio.ensure_future(websocket_application(scope, inbox.get, outbox.put))
+
+        self.assertEqual(await asyncio.wait_for(outbox.get(), 5), {'type': 'websocket.accept'})
+        get_broker().publish(user_channel(self.bob.id), {'type': 'chat.message', 'message': {'id': 1}})
+        event = await asyncio.wait_for(outbox.get(), 5)
+        self.assertEqual(json.loads(event['text']), {'type': 'chat.message', 'message': {'id': 1}})
+
+        await inbox.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(get_broker().subscriber_count(user_channel(self.bob.id)), 0)
+
+    async def test_websocket_rejects_missing_token(self):
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        await inbox.put({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': '/ws/chat/', 'headers': [], 'query_string': b''}
+
+        await asyncio.wait_for(websocket_application(scope, inbox.get, outbox.put), 5)
+
+        self.assertEqual(await outbox.get(), {'type': 'websocket.close', 'code': 4401})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass', phone='+998900000001', gender='female')
+        self.bob = User.objects.create_user(username='bob', password='pass', phone='+998900000002', is_driver=True)
+        self.alice_token = Token.objects.create(user=self.alice)
+        self.bob_client = APIClient()
+        self.bob_client.force_authenticate(self.bob)
+        self.alice_client = APIClient()
+        self.alice_client.credentials(HTTP_AUTHORIZATION=f'Token {self.alice_token.key}')
+
+    def unread(self, **params):
+        response = self.alice_client.get('/api/chat/unread/', params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['unread_count']
+
+    def test_counter_follows_send_and_read(self):
+        self.assertEqual(self.unread(), 0)
+        for text in ('salom', 'qayerdasiz?'):
+            self.bob_client.post('/api/chat/send/', {'receiver': self.alice.id, 'message': text}, format='json')
+        self.assertEqual(self.unread(), 2)
+
+        self.alice_client.get(f'/api/chat/{self.bob.id}/messages/')
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(UnreadCounter.objects.get(user=self.alice).count, 0)
+
+    def test_long_poll_returns_at_once_when_count_differs(self):
+        self.bob_client.post('/api/chat/send/', {'receiver': self.alice.id, 'message': 'salom'}, format='json')
+        self.assertEqual(self.unread(since=0, wait=30), 1)
+
+    def test_long_poll_times_out_with_unchanged_count(self):
+        self.assertEqual(self.unread(since=0, wait=0.1), 0)
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/api/chat/unread/').status_code, 401)
+        self.assertEqual(self.alice_client.get('/api/chat/unread/', {'since': 'x'}).status_code, 400)
+
+    async def test_long_poll_wakes_on_event(self):
+        poll = asyncio.ensure_future(self.async_client.get(
+            '/api/chat/unread/', {'since': 0, 'wait': 10}, headers={'Authorization': f'Token {self.alice_token.key}'},
+        ))
+        while not get_broker().subscriber_count(user_channel(self.alice.id)):
+            await asyncio.sleep(0.01)
+
+        await UnreadCounter.objects.acreate(user=self.alice, count=3)
+        get_broker().publish(user_channel(self.alice.id), {'type': 'chat.message'})
+
+        response = await asyncio.wait_for(poll, 5)
+        self.assertEqual(json.loads(response.content), {'unread_count': 3})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username='alice', password='pass', phone='+998900000001', gender='female')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_second_request_skips_token_query(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/users/me/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/me/')
+
+        self.assertEqual(response.data['username'], 'alice')
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+    def test_logout_invalidates_token(self):
+        self.client.get('/api/users/me/')
+        self.assertEqual(self.client.post('/api/auth/token/logout/').status_code, 204)
+
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_user_change_invalidates_entry(self):
+        self.client.get('/api/users/me/')
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_lru_evicts_oldest_and_ttl_expires(self):
+        cache = TokenCache(max_size=2, ttl=60, cache_alias='')
+        other = User.objects.create_user(username='bob', password='pass', phone='+998900000002', is_driver=True)
+        cache.set('a', self.user)
+        cache.set('b', other)
+        cache.get('a')
+        cache.set('c', other)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a').username, 'alice')
+        expired = TokenCache(max_size=2, ttl=-1, cache_alias='')
+        expired.set('a', self.user)
+        self.assertIsNone(expired.get('a'))
+
+    @override_settings(CACHES={'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_shared_cache_level(self):
+        first, second = TokenCache(cache_alias='shared'), TokenCache(cache_alias='shared')
+        first.set(self.token.key, self.user)
+
+        self.assertEqual(second.get(self.token.key).username, 'alice')
+        self.assertEqual(second.stats()['shared_hits'], 1)
+        first.invalidate_user(self.user.pk)
+        self.assertIsNone(TokenCache(cache_alias='shared').get(self.token.key))
+
+    @override_settings(CACHES={'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_invalidation_on_one_worker_reaches_another(self):
+        first, second = TokenCache(cache_alias='shared'), TokenCache(cache_alias='shared')
+        first.set(self.token.key, self.user)
+        self.assertEqual(second.get(self.token.key).username, 'alice')
+
+        # выход на первом воркере: сигнал сбросил только его память и общий кеш
+        first.invalidate_key(self.token.key)
+        later = time.monotonic() + second.local_ttl + 0.01
+        with mock.patch('api.authentication.time.monotonic', return_value=later):
+            self.assertIsNone(second.get(self.token.key))
+        # без общего уровня память процесса живёт полный TTL
+        self.assertEqual(TokenCache(ttl=60, cache_alias='', local_ttl=1).memory_ttl, 60)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RideRowCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True, show_phone=False)
+        self.passenger = User.objects.create_user(username='passenger', password='pass', phone='+998900000002', gender='male')
+        self.ride = Ride.objects.create(
+            origin='Toshkent', destination='Nukus', driver=self.driver, datetime=timezone.now(),
+            phone='+998901234567', seats=2, price=150000,
+        )
+        self.client = APIClient()
+
+    def feed_as(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get('/api/rides/').data['results']
+
+    def test_rows_match_serializer_and_mask_phone_per_viewer(self):
+        for viewer in (self.passenger, self.driver, self.passenger):
+            request = APIRequestFactory().get('/api/rides/')
+            request.user = viewer
+            expected = RideSerializer(self.ride, context={'request': request}).data
+            self.assertEqual(self.feed_as(viewer), [expected])
+
+        self.assertIsNone(self.feed_as(self.passenger)[0]['phone'])
+        self.assertEqual(self.feed_as(self.driver)[0]['phone'], '+998901234567')
+
+    def test_cached_page_runs_only_the_id_query(self):
+        self.client.force_authenticate(self.passenger)
+        self.client.get('/api/rides/')
+        with self.assertNumQueries(1):
+            self.client.get('/api/rides/')
+
+    def test_ride_and_driver_changes_invalidate_rows(self):
+        self.feed_as(self.passenger)
+        self.ride.price = 90000
+        self.ride.save()
+        self.driver.car_model = 'Cobalt'
+        self.driver.show_phone = True
+        self.driver.save()
+
+        row = self.feed_as(self.passenger)[0]
+        self.assertEqual((row['price'], row['car_model'], row['phone']), (90000, 'Cobalt', '+998901234567'))
+
+    def test_row_recached_before_commit_is_dropped_on_commit(self):
+        key = ride_row_cache.key(self.ride.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ride.price = 90000
+            self.ride.save()
+            # параллельный читатель успел положить строку из состояния до коммита
+            ride_row_cache.cache.set(key, {'id': self.ride.pk, 'price': 150000})
+        self.assertIsNone(ride_row_cache.cache.get(key))
+        self.assertEqual(self.feed_as(self.passenger)[0]['price'], 90000)
+
+    def test_single_flight_runs_one_rebuild_for_a_burst(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls, results = [], []
+
+        def rebuild():
+            calls.append(1)
+            release.wait(5)
+            return 'rows'
+
+        barrier = threading.Barrier(9)
+
+        def worker():
+            barrier.wait()
+            results.append(flight.do(('k',), rebuild))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['rows'] * 8)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LocationSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_location_index()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True)
+        self.now = timezone.now()
+
+    def make_ride(self, origin, destination, hours=1):
+        return Ride.objects.create(
+            origin=origin, destination=destination, driver=self.driver,
+            datetime=self.now + timedelta(hours=hours), phone='+998900000001', seats=3,
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/rides/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data]
+
+    def test_latin_and_cyrillic_spellings_share_a_key(self):
+        for spellings in (['Toshkent', 'Tashkent', 'Ташкент'], ['Samarqand', 'Самарканд'], ['Buxoro', 'Бухара'], ["Farg'ona", 'Fargʻona']):
+            self.assertEqual(len({normalize_place(name) for name in spellings}), 1, spellings)
+
+    def test_search_ranks_exact_then_fuzzy_matches(self):
+        exact = self.make_ride('Ташкент', 'Самарканд', hours=2)
+        other_spelling = self.make_ride('Toshkent shahri', 'Samarqand', hours=3)
+        buxoro = self.make_ride('Buxoro', 'Samarqand', hours=1)
+
+        # при равной оценке порядок как в ленте (позже — выше), но точное совпадение важнее
+        self.assertEqual(self.search(origin='Tashkent', destination='samarkand'), [exact.id, other_spelling.id])
+        self.assertEqual(self.search(origin='Toshkennt'), [exact.id, other_spelling.id])
+        self.assertEqual(self.search(destination='Самарқанд'), [other_spelling.id, exact.id, buxoro.id])
+
+    def test_index_follows_ride_saves_and_deletes(self):
+        ride = self.make_ride('Nukus', 'Xiva')
+        self.assertEqual(self.search(origin='Нукус'), [ride.id])
+
+        ride.origin = 'Urganch'
+        ride.save()
+        added = self.make_ride('Nukus', 'Xiva')
+        self.assertEqual(self.search(origin='Нукус'), [added.id])
+        added.delete()
+        self.assertEqual(self.search(origin='Nukus'), [])
+        self.assertEqual(self.search(origin='Urgench'), [ride.id])
+
+    def test_search_requires_a_place(self):
+        self.assertEqual(self.client.get('/api/rides/search/').status_code, 400)
+
+    def test_limit_keeps_feed_order_within_equal_scores(self):
+        index = LocationIndex()
+        start = timezone.now()
+        index.build([(i, 'Andijon', 'Namangan', start + timedelta(minutes=i % 5)) for i in range(1, 40)])
+
+        ids = index.search('Андижан', 'Наманган', limit=10)
+
+        expected = sorted(range(1, 40), key=lambda i: (start + timedelta(minutes=i % 5), i), reverse=True)[:10]
+        self.assertEqual(ids, expected)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class NearbyRideTests(TestCase):
+    # Чорсу и Амир Темур в Ташкенте (~3.5 км), Самарканд (~270 км)
+    CHORSU = (41.3262, 69.2285)
+    AMIR_TEMUR = (41.3111, 69.2797)
+    SAMARKAND = (39.6542, 66.9597)
+
+    def setUp(self):
+        cache.clear()
+        reset_geo_indexes()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True)
+        self.now = timezone.now()
+
+    def make_ride(self, pickup, hours=1):
+        return Ride.objects.create(
+            origin='Toshkent', destination='Samarqand', driver=self.driver, datetime=self.now + timedelta(hours=hours),
+            phone='+998900000001', seats=3, pickup_lat=pickup[0], pickup_lng=pickup[1],
+        )
+
+    def nearby(self, **params):
+        response = self.client.get('/api/rides/nearby/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_returns_rides_in_radius_sorted_by_distance(self):
+        far = self.make_ride(self.AMIR_TEMUR)
+        near = self.make_ride((41.3270, 69.2290))
+        self.make_ride(self.SAMARKAND)
+
+        rows = self.nearby(lat=self.CHORSU[0], lng=self.CHORSU[1], radius_km=10)
+
+        self.assertEqual([row['id'] for row in rows], [near.id, far.id])
+        self.assertLess(rows[0]['distance_km'], rows[1]['distance_km'])
+        self.assertAlmostEqual(rows[1]['distance_km'], haversine_km(*self.CHORSU, *self.AMIR_TEMUR), places=3)
+        self.assertEqual(self.nearby(lat=self.CHORSU[0], lng=self.CHORSU[1], radius_km=1)[0]['id'], near.id)
+
+    def test_time_window_and_index_updates(self):
+        ride = self.make_ride(self.CHORSU, hours=48)
+        tomorrow = (self.now + timedelta(days=1)).date().isoformat()
+        self.assertEqual(self.nearby(lat=self.CHORSU[0], lng=self.CHORSU[1], date_to=tomorrow), [])
+
+        ride.pickup_lat, ride.pickup_lng = self.SAMARKAND
+        ride.save()
+        self.assertEqual(self.nearby(lat=self.CHORSU[0], lng=self.CHORSU[1]), [])
+        self.assertEqual(len(self.nearby(lat=self.SAMARKAND[0], lng=self.SAMARKAND[1])), 1)
+        ride.delete()
+        self.assertEqual(self.nearby(lat=self.SAMARKAND[0], lng=self.SAMARKAND[1]), [])
+
+    def test_rejects_bad_coordinates(self):
+        self.assertEqual(self.client.get('/api/rides/nearby/', {'lat': 91, 'lng': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/rides/nearby/', {'lat': 41}).status_code, 400)
+        self.assertEqual(self.client.get('/api/rides/nearby/', {'lat': 41, 'lng': 69, 'radius_km': 0}).status_code, 400)
+
+    def test_grid_matches_full_scan(self):
+        index = GridIndex(cell_degrees=0.05)
+        points = [(i, 41 + (i % 37) * 0.013, 69 + (i % 53) * 0.011, self.now) for i in range(1, 2000)]
+        index.build(points)
+
+        found = index.nearby(41.2, 69.3, 7, limit=10000)
+
+        expected = sorted(
+            (haversine_km(41.2, 69.3, lat, lng), i) for i, lat, lng, _ in points if haversine_km(41.2, 69.3, lat, lng) <= 7
+        )
+        self.assertEqual(found, expected)
+
+    def test_create_ride_accepts_coordinates(self):
+        passenger = User.objects.create_user(username='p', password='pass', phone='+998900000002', gender='male')
+        client = APIClient()
+        client.force_authenticate(passenger)
+        data = {
+            'origin': 'Toshkent', 'destination': 'Xiva', 'phone': '1', 'seats': 1, 'price': 0,
+            'datetime': '2030-01-01T10:00:00', 'pickup_lat': self.CHORSU[0], 'pickup_lng': self.CHORSU[1],
+        }
+        response = client.post('/api/custom/create_ride/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['pickup_lat'], response.data['dropoff_lat']), (self.CHORSU[0], None))
+        self.assertEqual(client.post('/api/custom/create_ride/', {**data, 'pickup_lng': ''}, format='json').status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class BookingSeatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True)
+        self.passenger = User.objects.create_user(username='passenger', password='pass', phone='+998900000002', gender='male')
+        self.ride = Ride.objects.create(
+            origin='Toshkent', destination='Buxoro', driver=self.driver, datetime=timezone.now() + timedelta(days=1),
+            phone='+998900000001', seats=2,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.passenger)
+
+    def book(self, seats=1, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/bookings/', {
+            'ride': self.ride.id, 'passenger': self.passenger.id, 'seats': seats,
+        }, format='json', **headers)
+
+    def seats_taken(self):
+        self.ride.refresh_from_db()
+        return self.ride.seats_taken
+
+    def test_booking_reserves_seats_until_full(self):
+        self.assertEqual(self.book(seats=2).status_code, 201)
+        self.assertEqual(self.book().status_code, 409)
+        self.assertEqual(self.seats_taken(), 2)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_ride_edits_keep_seat_count(self):
+        self.assertEqual(self.book().status_code, 201)
+        driver = APIClient()
+        driver.force_authenticate(self.driver)
+        response = driver.patch(f'/api/rides/{self.ride.id}/', {'seats_taken': 0, 'price': 1000}, format='json')
+        self.assertEqual((response.status_code, response.data['seats_taken']), (200, 1))
+        self.assertEqual(self.seats_taken(), 1)
+
+        # правка с устаревшим seats_taken в памяти не затирает бронь, сделанную после чтения
+        stale = Ride.objects.get(pk=self.ride.pk)
+        self.assertEqual(self.book().status_code, 201)
+        serializer = RideSerializer(stale, data={'price': 2000}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(self.seats_taken(), 2)
+        self.assertEqual(self.book().status_code, 409)
+
+        response = driver.patch(f'/api/rides/{self.ride.id}/', {'seats': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(driver.patch(f'/api/rides/{self.ride.id}/', {'seats': 3}, format='json').status_code, 200)
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(self.seats_taken(), 3)
+
+    def test_idempotency_key_replays_booking(self):
+        first = self.book(key='retry-1')
+        second = self.book(key='retry-1')
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertNotIn('idempotency_key', first.data)
+        self.assertNotIn('idempotency_key', self.client.get('/api/bookings/').data[0])
+        self.assertEqual(self.seats_taken(), 1)
+        self.assertEqual(self.book(seats=2, key='retry-1').status_code, 422)
+
+    def test_confirm_and_cancel_transitions(self):
+        booking_id = self.book().data['id']
+        driver = APIClient()
+        driver.force_authenticate(self.driver)
+
+        self.assertEqual(self.client.post(f'/api/bookings/{booking_id}/confirm/').status_code, 403)
+        response = driver.post(f'/api/bookings/{booking_id}/confirm/')
+        self.assertEqual(response.data['status'], 'confirmed')
+        self.assertEqual(driver.post(f'/api/bookings/{booking_id}/confirm/').status_code, 200)
+
+        response = self.client.post(f'/api/bookings/{booking_id}/cancel/')
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertEqual(self.seats_taken(), 0)
+        # повторная отмена не возвращает места второй раз
+        self.client.post(f'/api/bookings/{booking_id}/cancel/')
+        self.assertEqual(self.seats_taken(), 0)
+        self.assertEqual(driver.post(f'/api/bookings/{booking_id}/confirm/').status_code, 409)
+
+    def test_delete_and_status_writes(self):
+        booking_id = self.book(seats=2).data['id']
+        response = self.client.patch(f'/api/bookings/{booking_id}/', {'status': 'cancelled', 'seats': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.get(pk=booking_id).status, 'pending')
+        self.client.delete(f'/api/bookings/{booking_id}/')
+        self.assertEqual(self.seats_taken(), 0)
+
+    def test_feed_shows_seats_taken(self):
+        self.assertEqual(self.client.get('/api/rides/').data['results'][0]['seats_taken'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book()
+        self.assertEqual(self.client.get('/api/rides/').data['results'][0]['seats_taken'], 1)
+
+
+# 🔥 Сотни одновременных броней на одну поездку: подтверждённых мест не больше вместимости
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class BookingContentionTests(TransactionTestCase):
+    THREADS = 200
+    CAPACITY = 7
+
+    def test_concurrent_bookings_never_overbook(self):
+        driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True)
+        passengers = User.objects.bulk_create([
+            User(username=f'p{i}', phone=f'+9989{i:08d}', gender='male') for i in range(self.THREADS)
+        ])
+        ride = Ride.objects.create(
+            origin='Toshkent', destination='Buxoro', driver=driver, datetime=timezone.now() + timedelta(days=1),
+            phone='+998900000001', seats=self.CAPACITY,
+        )
+        barrier = threading.Barrier(self.THREADS)
+        codes = []
+
+        def attempt(passenger):
+            client = APIClient()
+            client.force_authenticate(passenger)
+            try:
+                barrier.wait()
+                # каждый второй запрос повторяется с тем же ключом, как клиент после таймаута
+                for _ in range(1 + passenger.pk % 2):
+                    response = client.post('/api/bookings/', {'ride': ride.id, 'passenger': passenger.id},
+                                           format='json', HTTP_IDEMPOTENCY_KEY=f'k-{passenger.pk}')
+                    codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(p,)) for p in passengers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ride.refresh_from_db()
+        booked = Booking.objects.filter(ride=ride, status__in=Booking.HOLDING_STATUSES)
+        self.assertEqual(codes.count(201), self.CAPACITY)
+        self.assertEqual(booked.count(), self.CAPACITY)
+        self.assertEqual(ride.seats_taken, self.CAPACITY)
+        self.assertLessEqual(set(codes), {200, 201, 409})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AsyncAuthTests(TestCase):
+    def register(self, **extra):
+        return self.client.post('/api/register/', {
+            'username': 'alice', 'password': 'secret', 'phone': '+998900000001', 'gender': 'female', **extra,
+        }, content_type='application/json')
+
+    def login(self, password='secret', username='alice'):
+        return self.client.post('/api/login/', {'username': username, 'password': password}, content_type='application/json')
+
+    def test_register_then_login(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201)
+        token = response.json()['token']
+        self.assertTrue(User.objects.get(username='alice').check_password('secret'))
+
+        self.assertEqual(self.login().json()['token'], token)
+        self.assertEqual(self.login(password='wrong').status_code, 401)
+        self.assertEqual(self.login(username='bob').status_code, 401)
+        self.assertEqual(self.register().status_code, 400)
+
+    def test_form_payload_and_inactive_user(self):
+        response = self.client.post('/api/register/', {'username': 'bob', 'password': 'x', 'phone': '1', 'is_driver': 'true'})
+        self.assertEqual(response.status_code, 201)
+        User.objects.filter(username='bob').update(is_active=False)
+        self.assertEqual(self.login(username='bob', password='x').status_code, 401)
+
+    def test_login_rehashes_outdated_hash(self):
+        self.register()
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.ScryptPasswordHasher'] + FAST_HASHERS):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(User.objects.get(username='alice').password.startswith('scrypt$'))
+
+    def test_old_app_version_blocked_on_async_path(self):
+        response = asyncio.run(AsyncClient().post('/api/login/', {}, content_type='application/json', headers={'App-Version': '1.0.0'}))
+        self.assertEqual(response.status_code, 426)
+
+    def test_full_pool_rejects_with_503(self):
+        pool = HashingPool(workers=1, max_pending=0, enabled=True)
+        release = threading.Event()
+        blocker = pool.executor.submit(release.wait)
+        pool._slots.acquire()
+        blocker.add_done_callback(lambda _: pool._slots.release())
+        try:
+            with mock.patch('api.views.hashing_pool', pool):
+                response = self.register()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            with self.assertRaises(HashingPoolBusy):
+                asyncio.run(pool.run(str, 'x'))
+        finally:
+            release.set()
+            pool.shutdown()
+        self.assertEqual(pool.rejected, 2)
+        self.assertEqual(asyncio.run(pool.run(str.upper, 'ok')), 'OK')
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_production_pragmas_applied_on_connect(self):
+        # отдельное соединение к тестовой БД с профилем из render.yaml (SQLITE_PROFILE=production)
+        profile = copy.deepcopy(settings.SQLITE_PRODUCTION_PROFILE)
+        default = connections['default']
+        wrapper = default.__class__({**default.settings_dict, **profile}, alias='production_profile')
+        try:
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+            self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 20000)
+            self.assertEqual(self.pragma(wrapper, 'cache_size'), -20000)
+            self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+        finally:
+            wrapper.close()
+        self.assertTrue(profile['CONN_HEALTH_CHECKS'])
+        # под ASGI соединения не переживают запрос — постоянные соединения выключены
+        self.assertEqual(profile['CONN_MAX_AGE'], 0)
+
+
+class GroupCommitTests(SimpleTestCase):
+    def run_threads(self, committer, items):
+        barrier = threading.Barrier(len(items))
+        results, errors = {}, {}
+
+        def submit(item):
+            barrier.wait()
+            try:
+                results[item] = committer.submit(item)
+            except Exception as error:
+                errors[item] = error
+
+        threads = [threading.Thread(target=submit, args=(item,)) for item in items]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_items_share_a_batch(self):
+        writes = []
+
+        def write(items):
+            writes.append(list(items))
+            return [item * 10 for item in items]
+
+        committer = GroupCommit(write, window_ms=100, enabled=True)
+        results, errors = self.run_threads(committer, list(range(1, 21)))
+
+        self.assertEqual(errors, {})
+        self.assertEqual(results, {item: item * 10 for item in range(1, 21)})
+        self.assertLess(len(writes), 20)
+        self.assertEqual((committer.batches, committer.items), (len(writes), 20))
+
+    def test_failed_item_does_not_fail_neighbours(self):
+        def write(items):
+            if 'bad' in items:
+                raise ValueError('bad item')
+            return [item.upper() for item in items]
+
+        committer = GroupCommit(write, window_ms=100, enabled=True)
+        results, errors = self.run_threads(committer, ['a', 'b', 'bad', 'c'])
+
+        self.assertEqual(results, {'a': 'A', 'b': 'B', 'c': 'C'})
+        self.assertIsInstance(errors['bad'], ValueError)
+
+    def test_full_batch_flushes_before_window(self):
+        committer = GroupCommit(lambda items: list(items), window_ms=10000, max_batch=4, enabled=True)
+        started = time.monotonic()
+        results, _ = self.run_threads(committer, [1, 2, 3, 4])
+        self.assertEqual(len(results), 4)
+        self.assertLess(time.monotonic() - started, 5)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class BatchedChatSendTests(TransactionTestCase):
+    SENDERS = 12
+
+    def test_batched_sends_keep_counters_and_summaries(self):
+        receiver = User.objects.create_user(username='receiver', password='pass', phone='+998900000001', is_driver=True)
+        senders = [
+            User.objects.create_user(username=f's{i}', password='pass', phone=f'+9989000001{i:02d}', gender='male')
+            for i in range(self.SENDERS)
+        ]
+        batcher = GroupCommit(write_chat_messages, window_ms=50, enabled=True)
+        barrier = threading.Barrier(self.SENDERS)
+        responses = []
+
+        def send(sender):
+            client = APIClient()
+            client.force_authenticate(sender)
+            try:
+                barrier.wait()
+                for text in ('salom', 'qalaysiz'):
+                    responses.append(client.post('/api/chat/send/', {'receiver': receiver.id, 'message': text}, format='json'))
+            finally:
+                connection.close()
+
+        with mock.patch('api.views.chat_write_batcher', batcher):
+            threads = [threading.Thread(target=send, args=(sender,)) for sender in senders]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual([r.status_code for r in responses], [201] * 2 * self.SENDERS)
+        self.assertEqual(len({r.data['id'] for r in responses}), 2 * self.SENDERS)
+        self.assertLess(batcher.batches, 2 * self.SENDERS)
+        self.assertEqual(UnreadCounter.objects.get(user=receiver).count, 2 * self.SENDERS)
+        for chat in Chat.objects.all():
+            self.assertEqual(chat.last_message_id, chat.messages.order_by('id').last().id)
+            self.assertEqual(chat.read_states.get(user=receiver).unread_count, 2)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        request_metrics.clear()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True)
+        Ride.objects.create(
+            origin='Toshkent', destination='Buxoro', driver=self.driver, datetime=timezone.now(), phone='1', seats=3,
+        )
+
+    def server_timing(self, response):
+        return dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+
+    def test_server_timing_and_histogram(self):
+        with self.assertLogs('api.requests', 'INFO') as logs:
+            response = self.client.get('/api/rides/')
+        timing = self.server_timing(response)
+        self.assertIn('desc="2 queries"', timing['db'])
+        self.assertGreater(float(timing['serialize'].split('=')[1]), 0)
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['route'], line['status'], line['queries']), ('api/rides/$', 200, 2))
+
+        with self.settings(DEBUG=True):
+            text = self.client.get('/metrics').content.decode()
+        self.assertIn('taksoapp_request_duration_seconds_count{route="api/rides/$",method="GET"} 1', text)
+        self.assertIn('taksoapp_request_db_queries_total{route="api/rides/$",method="GET"} 2', text)
+        self.assertIn('taksoapp_request_duration_seconds_bucket{route="api/rides/$",method="GET",le="+Inf"} 1', text)
+        self.assertIn('taksoapp_requests_total{route="api/rides/$",method="GET",status="200"} 1', text)
+
+    def test_async_view_and_unmatched_route(self):
+        token = Token.objects.create(user=self.driver)
+        response = self.client.get('/api/chat/unread/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertIn('desc="2 queries"', self.server_timing(response)['db'])
+        self.client.get('/nowhere/')
+        self.client.generic('BREW', '/api/')
+
+        text = request_metrics.render()
+        self.assertIn('route="api/chat/unread/",method="GET"', text)
+        self.assertIn('route="unmatched",method="GET"', text)
+        self.assertIn('method="OTHER"', text)
+
+    @override_settings(REQUEST_METRICS={'TOKEN': 's3cret'})
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    def test_metrics_hidden_without_token_unless_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.user = User.objects.create_user(username='alice', password='pass', phone='+998900000001', gender='female')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def profiling(self, secret_key='test-secret-key', **options):
+        return self.settings(
+            SECRET_KEY=secret_key, PROFILING={'DIR': self.directory, 'SECRET': 'profiling-secret', **options},
+        )
+
+    def test_signed_header_profiles_request(self):
+        with self.profiling():
+            plain = self.client.get('/api/chat/threads/')
+            response = self.client.get('/api/chat/threads/', HTTP_X_PROFILE=make_profile_token())
+
+        self.assertNotIn('X-Profile-Id', plain)
+        stats = pstats.Stats(os.path.join(self.directory, response['X-Profile-Id']))
+        self.assertIn('get_user_threads', {function for _, _, function in stats.stats})
+
+    def test_bad_or_expired_token_is_ignored(self):
+        with self.profiling():
+            for token in ('1:forged', make_profile_token(ttl=-1)):
+                self.assertNotIn('X-Profile-Id', self.client.get('/api/', HTTP_X_PROFILE=token))
+        self.assertEqual(list_profiles(self.directory), [])
+
+    def test_header_profiling_needs_own_secret_and_real_secret_key(self):
+        with self.profiling():
+            token = make_profile_token()
+            # подпись SECRET_KEY (как раньше) не подходит — только PROFILING['SECRET']
+            forged = Signer(salt='api.profiling').sign(str(int(time.time() + 60)))
+            self.assertNotIn('X-Profile-Id', self.client.get('/api/', HTTP_X_PROFILE=forged))
+        with self.profiling(secret_key=settings.INSECURE_SECRET_KEY):
+            self.assertNotIn('X-Profile-Id', self.client.get('/api/', HTTP_X_PROFILE=token))
+            with self.assertRaises(CommandError):
+                call_command('profiles', 'token', stdout=io.StringIO())
+        with self.settings(SECRET_KEY='test-secret-key', PROFILING={'DIR': self.directory}):
+            self.assertNotIn('X-Profile-Id', self.client.get('/api/', HTTP_X_PROFILE=token))
+        self.assertEqual(list_profiles(self.directory), [])
+
+    def test_sampling_by_path_and_rotation(self):
+        with self.profiling(SAMPLE_RATE=1.0, PATHS=['/api/chat/'], MAX_FILES=2):
+            self.assertNotIn('X-Profile-Id', self.client.get('/api/'))
+            for _ in range(3):
+                self.assertIn('X-Profile-Id', self.client.get('/api/chat/threads/'))
+        self.assertEqual(len(list_profiles(self.directory)), 2)
+
+        with self.profiling():
+            out = io.StringIO()
+            call_command('profiles', 'list', stdout=out)
+            self.assertEqual(len(out.getvalue().splitlines()), 2)
+            out = io.StringIO()
+            call_command('profiles', 'summarize', '--path', 'threads', stdout=out)
+            self.assertIn('2 profile(s)', out.getvalue())
+            self.assertIn('get_user_threads', out.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SeedDataTests(TestCase):
+    def test_seeded_dataset_is_consistent(self):
+        out = io.StringIO()
+        call_command('seed_data', users=40, rides=60, bookings=80, chats=30, messages=300, stdout=out)
+        counts = json.loads(out.getvalue())
+        self.assertEqual((counts['users'], counts['rides'], counts['messages']), (40, 60, 300))
+
+        for ride in Ride.objects.annotate(booked=Count('booking')):
+            self.assertEqual(ride.booked, ride.seats_taken)
+            self.assertLessEqual(ride.seats_taken, ride.seats)
+        for chat in Chat.objects.exclude(last_message=None):
+            self.assertEqual(chat.last_message_id, chat.messages.order_by('id').last().id)
+            self.assertEqual(chat.participants.count(), 2)
+        self.assertEqual(
+            UnreadCounter.objects.aggregate(total=Sum('count'))['total'],
+            ChatReadState.objects.aggregate(total=Sum('unread_count'))['total'],
+        )
+        self.assertEqual(self.client.post('/api/login/', {'username': 'seed_0', 'password': SEED_PASSWORD},
+                                          content_type='application/json').status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RideArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='+998900000001', is_driver=True)
+        self.passenger = User.objects.create_user(username='passenger', password='pass', phone='+998900000002', gender='male')
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+        now = timezone.now()
+        self.past = [self.make_ride(now - timedelta(days=1, hours=i)) for i in range(3)]
+        self.recent = self.make_ride(now - timedelta(minutes=10))
+        self.upcoming = self.make_ride(now + timedelta(days=1))
+        for ride in self.past + [self.upcoming]:
+            Booking.objects.create(ride=ride, passenger=self.passenger, status='confirmed', idempotency_key=f'k{ride.pk}')
+
+    def make_ride(self, when):
+        return Ride.objects.create(
+            origin='Toshkent', destination='Buxoro', driver=self.driver, datetime=when, phone='+998900000001',
+            seats=3, seats_taken=1,
+        )
+
+    def feed_ids(self):
+        return [row['id'] for row in self.client.get('/api/rides/').data['results']]
+
+    def test_feed_shows_only_live_rides(self):
+        # только что отправившаяся поездка ещё в ленте (GRACE_MINUTES), вчерашние — нет
+        self.assertEqual(self.feed_ids(), [self.upcoming.id, self.recent.id])
+
+    def test_search_and_nearby_skip_departed_rides_before_archiving(self):
+        Ride.objects.update(pickup_lat=41.3, pickup_lng=69.24)
+        reset_location_index()
+        reset_geo_indexes()
+        self.addCleanup(reset_location_index)
+        self.addCleanup(reset_geo_indexes)
+        found = self.client.get('/api/rides/search/?origin=Toshkent').data
+        self.assertEqual([row['id'] for row in found], [self.upcoming.id, self.recent.id])
+        found = self.client.get('/api/rides/nearby/?lat=41.3&lng=69.24').data
+        self.assertEqual({row['id'] for row in found}, {self.upcoming.id, self.recent.id})
+        # явный date_from в прошлом не возвращает прошедшие поездки
+        yesterday = (timezone.now() - timedelta(days=3)).date().isoformat()
+        found = self.client.get(f'/api/rides/nearby/?lat=41.3&lng=69.24&date_from={yesterday}').data
+        self.assertEqual({row['id'] for row in found}, {self.upcoming.id, self.recent.id})
+
+    def test_archive_moves_expired_rides_with_bookings_in_batches(self):
+        out = io.StringIO()
+        call_command('archive_rides', batch_size=2, pause_ms=0, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual((result['rides'], result['bookings'], result['batches']), (3, 3, 2))
+
+        self.assertEqual(set(Ride.objects.values_list('id', flat=True)), {self.recent.id, self.upcoming.id})
+        self.assertEqual(Booking.objects.get().ride_id, self.upcoming.id)
+        archived = ArchivedRide.objects.get(pk=self.past[0].pk)
+        self.assertEqual((archived.driver_id, archived.seats_taken, archived.datetime), (
+            self.driver.id, 1, self.past[0].datetime,
+        ))
+        booking = ArchivedBooking.objects.get(ride=archived)
+        self.assertEqual((booking.passenger_id, booking.status, booking.idempotency_key), (
+            self.passenger.id, 'confirmed', f'k{archived.pk}',
+        ))
+
+        out = io.StringIO()
+        call_command('archive_rides', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['rides'], 0)
+
+    def test_dry_run_only_counts(self):
+        out = io.StringIO()
+        call_command('archive_rides', dry_run=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual((result['rides'], result['bookings']), (3, 3))
+        self.assertEqual(Ride.objects.count(), 5)
+
+    def test_departed_ride_does_not_block_a_new_one(self):
+        self.upcoming.delete()
+        payload = {
+            'origin': 'Toshkent', 'destination': 'Xiva', 'phone': '+998900000001', 'seats': 2, 'price': 1000,
+            'datetime': (timezone.localtime() + timedelta(days=2)).replace(tzinfo=None).isoformat(),
+        }
+        self.assertEqual(self.client.post('/api/custom/create_ride/', payload, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/custom/create_ride/', payload, format='json').status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', phone='1', is_staff=True)
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='2', is_driver=True)
+        self.rides = [
+            Ride.objects.create(
+                origin='Toshkent', destination=city, driver=self.driver, datetime=timezone.now(), phone='2', seats=3,
+            )
+            for city in ('Buxoro', 'Xiva, "markaz"', 'Nukus')
+        ]
+        self.admin_token = Token.objects.create(user=self.admin).key
+        self.driver_token = Token.objects.create(user=self.driver).key
+
+    async def export(self, url, token):
+        response = await self.async_client.get(url, headers={'Authorization': f'Token {token}'})
+        if not response.streaming:
+            return response, None
+        return response, b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_ndjson_streams_rows_after_since(self):
+        with mock.patch('api.export.CHUNK_SIZE', 2):
+            response, body = await self.export(f'/api/export/rides/?since={self.rides[0].id}', self.admin_token)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.rides[1].id, self.rides[2].id])
+        self.assertEqual((rows[0]['destination'], rows[0]['driver_id']), ('Xiva, "markaz"', self.driver.id))
+
+    async def test_csv_has_header_and_quotes_values(self):
+        response, body = await self.export('/api/export/rides/?format=csv', self.admin_token)
+        lines = body.splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'origin', 'destination', 'driver_id'])
+        self.assertEqual(len(lines), 4)
+        self.assertIn('"Xiva, ""markaz"""', lines[2])
+
+    async def test_staff_only(self):
+        response, _ = await self.export('/api/export/messages/', self.driver_token)
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get('/api/export/messages/')
+        self.assertEqual(response.status_code, 401)
+        response, _ = await self.export('/api/export/users/', self.admin_token)
+        self.assertEqual(response.status_code, 404)
+        response, _ = await self.export('/api/export/rides/?since=-1', self.admin_token)
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_writes_file_and_reports_last_id(self):
+        Booking.objects.create(ride=self.rides[0], passenger=self.admin)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bookings.csv')
+            err = io.StringIO()
+            call_command('export_data', 'bookings', format='csv', output=path, chunk_size=1, stderr=err)
+            with open(path, encoding='utf-8') as exported:
+                self.assertEqual(exported.read().splitlines()[0], 'id,ride_id,passenger_id,status,seats')
+        self.assertIn('1 bookings exported', err.getvalue())
+
+        out = io.StringIO()
+        call_command('export_data', 'rides', since=self.rides[1].id, stdout=out, stderr=io.StringIO())
+        self.assertEqual([json.loads(line)['id'] for line in out.getvalue().splitlines()], [self.rides[2].id])
+
+    def test_archived_rows_exported_after_later_archive_runs(self):
+        Booking.objects.create(ride=self.rides[2], passenger=self.admin)
+        Ride.objects.filter(pk=self.rides[2].pk).update(datetime=timezone.now() - timedelta(days=2))
+        archive_expired_rides()
+
+        def export(dataset, since):
+            out, err = io.StringIO(), io.StringIO()
+            call_command('export_data', dataset, since=since, stdout=out, stderr=err)
+            return [json.loads(line) for line in out.getvalue().splitlines()], err.getvalue()
+
+        rows, err = export('archived_rides', 0)
+        self.assertEqual([(row['archive_seq'], row['id']) for row in rows], [(1, self.rides[2].id)])
+        self.assertIn('last archive_seq 1', err)
+        self.assertEqual(export('archived_bookings', 0)[0][0]['ride_id'], self.rides[2].id)
+
+        # более старая поездка уходит в архив позже — id меньше, но курсор archive_seq её не пропустит
+        Ride.objects.filter(pk=self.rides[0].pk).update(datetime=timezone.now() - timedelta(days=1))
+        archive_expired_rides()
+        rows, _ = export('archived_rides', 1)
+        self.assertEqual([(row['archive_seq'], row['id']) for row in rows], [(2, self.rides[0].id)])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class FastSerializerParityTests(TestCase):
+    def setUp(self):
+        self.drivers = [
+            User.objects.create_user(username='ali', password='p', phone='1', is_driver=True, has_ac=True, car_model='Cobalt'),
+            User.objects.create_user(username='vali', password='p', phone='2', is_driver=True, show_phone=False, gender='male'),
+        ]
+        self.passenger = User.objects.create_user(username='zuhra', password='p', phone='3', gender='female')
+        start = timezone.now().replace(microsecond=0)
+        for i in range(6):
+            Ride.objects.create(
+                origin='Toshkent', destination="Farg'ona — «markaz»", driver=self.drivers[i % 2],
+                datetime=start + timedelta(hours=i, microseconds=i * 1234), phone=f'+99890000000{i}', seats=3,
+                seats_taken=i % 3, price=i * 1000, has_female_passenger=bool(i % 2),
+                pickup_lat=41.3 + i / 7 if i % 3 else None, pickup_lng=69 if i % 3 else None,
+            )
+        low, high = Chat.pair_key(self.passenger, self.drivers[0])
+        self.chat = Chat.objects.create(user_low_id=low, user_high_id=high)
+        for i in range(5):
+            ChatMessage.objects.create(chat=self.chat, sender=[self.passenger, self.drivers[0]][i % 2], message=f'salom 😊 {i}')
+
+    def assertSameBytes(self, expected, actual):
+        self.assertEqual(JSONRenderer().render(expected), JSONRenderer().render(actual))
+
+    def test_ride_rows_match_serializer_for_every_viewer(self):
+        rides = Ride.objects.select_related('driver').order_by('id')
+        for viewer in (None, self.drivers[1], self.passenger):
+            request = APIRequestFactory().get('/api/rides/')
+            request.user = viewer or mock.Mock(pk=None)
+            context = {'request': request}
+            self.assertSameBytes(
+                RideSerializer(rides, many=True, context=context).data,
+                RideRowSerializer(context=context).serialize(rides),
+            )
+
+    def test_ride_rows_follow_the_active_timezone(self):
+        rides = Ride.objects.select_related('driver').order_by('id')
+        with timezone.override('Asia/Tashkent'):
+            expected = RideSerializer(rides, many=True).data
+            actual = RideRowSerializer().serialize(rides)
+        self.assertIn('+05:00', actual[0]['datetime'])
+        self.assertSameBytes(expected, actual)
+
+    def test_message_rows_match_serializer(self):
+        messages = ChatMessage.objects.filter(chat=self.chat).select_related('sender').order_by('id')
+        read_upto = {self.passenger.id: messages[2].id, self.drivers[0].id: 0}
+        self.assertSameBytes(
+            ChatMessageSerializer(messages, many=True, context={'read_upto': read_upto}).data,
+            ChatMessageRowSerializer(context={'read_upto': read_upto}).serialize(messages),
+        )
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_same_bytes_as_drf_renderer(self):
+        data = ReturnList([
+            {'id': 1, 'when': timezone.now(), 'price': Decimal('12.50'), 'text': 'salom\u2028dunyo «😊»', 'lat': 41.31},
+            {'nested': {7: [True, None, 0.5]}, 'lazy': gettext_lazy('Salom')},
+        ], serializer=None)
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_documented_float_differences(self):
+        data = {'big': 1e16, 'small': 1e-7, 'huge': 1.5e300}
+        fast, drf = FastJSONRenderer().render(data), JSONRenderer().render(data)
+        self.assertEqual(fast, b'{"big":1e16,"small":1e-7,"huge":1.5e300}')
+        self.assertEqual(drf, b'{"big":1e+16,"small":1e-07,"huge":1.5e+300}')
+        self.assertEqual(json.loads(fast), json.loads(drf))
+
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({'x': float('nan')})
+        self.assertEqual(FastJSONRenderer().render({'x': float('nan'), 'y': float('inf')}), b'{"x":null,"y":null}')
+
+    def test_indent_and_huge_ints_fall_back_to_drf(self):
+        data = {'n': 2 ** 70, 'items': [1, 2]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='1', is_driver=True, show_phone=False)
+        self.passenger = User.objects.create_user(username='passenger', password='pass', phone='2', gender='male')
+        self.ride = Ride.objects.create(
+            origin='Toshkent', destination='Buxoro', driver=self.driver, datetime=timezone.now() + timedelta(days=1),
+            phone='+998901234567', seats=3,
+        )
+        self.booking = Booking.objects.create(ride=self.ride, passenger=self.passenger)
+        self.client = APIClient()
+        self.client.force_authenticate(self.passenger)
+
+    def test_ride_feed_and_detail_return_only_requested_fields(self):
+        rows = self.client.get('/api/rides/?fields=id,origin,phone').data['results']
+        self.assertEqual(rows, [{'id': self.ride.id, 'origin': 'Toshkent', 'phone': None}])
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/api/rides/{self.ride.id}/?fields=id,datetime')
+        self.assertEqual(set(response.data), {'id', 'datetime'})
+        self.assertNotIn('api_user', captured[-1]['sql'])
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/api/rides/{self.ride.id}/?fields=id,driverUsername')
+        self.assertEqual(response.data, {'id': self.ride.id, 'driverUsername': 'driver'})
+        self.assertIn('api_user', captured[-1]['sql'])
+
+    def test_users_skip_permission_prefetches(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/?fields=id,username')
+        self.assertEqual(response.data[0], {'id': self.driver.id, 'username': 'driver'})
+        with self.assertNumQueries(3):
+            self.client.get('/api/users/')
+
+    def test_booking_fields_and_writes_ignore_the_parameter(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/api/bookings/{self.booking.id}/?fields=id,status')
+        self.assertEqual(response.data, {'id': self.booking.id, 'status': 'pending'})
+        self.assertNotIn('api_user', captured[-1]['sql'])
+        self.assertIn('passenger_username', self.client.get(f'/api/bookings/{self.booking.id}/').data)
+
+        response = self.client.post('/api/bookings/?fields=id', {'ride': self.ride.id, 'passenger': self.passenger.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('passenger_username', response.data)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = User.objects.create_user(username='driver', password='pass', phone='1', is_driver=True)
+        self.alice = User.objects.create_user(username='alice', password='pass', phone='2', gender='female')
+        self.bob = User.objects.create_user(username='bob', password='pass', phone='3', gender='male')
+        Ride.objects.create(
+            origin='Toshkent', destination='Buxoro', driver=self.driver, datetime=timezone.now() + timedelta(days=1),
+            phone='+998901234567', seats=3,
+        )
+        self.clients = {}
+        for user in (self.driver, self.alice, self.bob):
+            client = APIClient()
+            client.force_authenticate(user)
+            self.clients[user.username] = client
+
+    def send(self, sender, receiver, text):
+        response = self.clients[sender.username].post(
+            '/api/chat/send/', {'receiver': receiver.id, 'message': text}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_feed_revalidates_without_queries_until_a_ride_changes(self):
+        client = self.clients['alice']
+        response = client.get('/api/rides/')
+        etag = response['ETag']
+        self.assertIn('Authorization', response['Vary'])
+
+        with self.assertNumQueries(0):
+            response = client.get('/api/rides/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        last_modified = client.get('/api/rides/')['Last-Modified']
+        self.assertEqual(client.get('/api/rides/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # другой зритель и другая страница — другие ETag
+        self.assertNotEqual(self.clients['driver'].get('/api/rides/')['ETag'], etag)
+        self.assertNotEqual(client.get('/api/rides/?limit=1')['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ride.objects.create(
+                origin='Toshkent', destination='Samarqand', driver=self.driver,
+                datetime=timezone.now() + timedelta(days=2), phone='+998901234567', seats=2,
+            )
+        response = client.get('/api/rides/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_chat_messages_skip_the_history_query_and_change_on_read_and_send(self):
+        self.send(self.alice, self.bob, 'salom')
+        client = self.clients['alice']
+        with CaptureQueriesContext(connection) as full:
+            etag = client.get(f'/api/chat/{self.bob.id}/messages/')['ETag']
+        with CaptureQueriesContext(connection) as revalidated:
+            response = client.get(f'/api/chat/{self.bob.id}/messages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(revalidated), len(full) - 1)
+        self.assertFalse(any('"api_chatmessage"."message"' in query['sql'] for query in revalidated))
+
+        # bob прочитал — у alice меняется is_read
+        self.clients['bob'].get(f'/api/chat/{self.alice.id}/messages/')
+        response = client.get(f'/api/chat/{self.bob.id}/messages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data[0]['is_read'])
+
+        etag = response['ETag']
+        self.send(self.bob, self.alice, 'qayerdasiz?')
+        response = client.get(f'/api/chat/{self.bob.id}/messages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.data), 2)
+
+        # переименование отправителя меняет sender_username в ответе
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.username = 'alisa'
+            self.alice.save()
+        response = client.get(f'/api/chat/{self.bob.id}/messages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['sender_username'], 'alisa')
+
+    def test_feed_validates_params_before_revalidation(self):
+        client = self.clients['alice']
+        etag = client.get('/api/rides/')['ETag']
+        # «*» совпадает с любым ETag — без проверки параметров это был бы 304
+        for query in ('cursor=bad', 'date_from=yesterday'):
+            response = client.get(f'/api/rides/?{query}', HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, 400, query)
+        self.assertEqual(client.get('/api/rides/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_threads_change_on_new_chat_and_rename(self):
+        self.send(self.alice, self.bob, 'salom')
+        client = self.clients['alice']
+        etag = client.get('/api/chat/threads/')['ETag']
+        with self.assertNumQueries(1):
+            response = client.get('/api/chat/threads/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.send(self.driver, self.alice, 'keldim')
+        response = client.get('/api/chat/threads/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.data), 2)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.username = 'bobur'
+            self.bob.save()
+        response = client.get('/api/chat/threads/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(['alice', 'bobur'], [sorted(row['participants_usernames']) for row in response.data])
+
+
+
+class LoadTestClientTests(SimpleTestCase):
+    def test_keep_alive_client_reads_sized_and_chunked_bodies(self):
+        responses = [
+            b'HTTP/1.1 200 OK\r\nContent-Length: 12\r\n\r\n{"ok": true}',
+            b'HTTP/1.1 503 Service Unavailable\r\nTransfer-Encoding: chunked\r\n\r\n4\r\n{"a"\r\n3\r\n: 1\r\n1\r\n}\r\n0\r\n\r\n',
+        ]
+        requests = []
+
+        async def handle(reader, writer):
+            for response in responses:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+                requests.append(head + await reader.readexactly(length))
+                writer.write(response)
+                await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            recorder = Recorder()
+            client = HttpClient('127.0.0.1', port, token='abc')
+            first = await recorder.call(('chat', 'send'), client, 'POST', '/api/chat/send/', {'receiver': 1})
+            second = await recorder.call(('chat', 'get'), client, 'GET', '/api/chat/1/messages/')
+            await client.close()
+            server.close()
+            await server.wait_closed()
+            return first, second, recorder.report()
+
+        first, second, report = asyncio.run(run())
+        self.assertEqual(first, (200, {'ok': True}))
+        self.assertEqual(second, (503, {'a': 1}))
+        # оба запроса прошли по одному соединению, с токеном и телом
+        self.assertEqual(len(requests), 2)
+        self.assertIn(b'Authorization: Token abc', requests[0])
+        self.assertTrue(requests[0].endswith(b'{"receiver": 1}'))
+        rows = {row['step']: row for row in report}
+        self.assertEqual((rows['send']['errors'], rows['get']['errors']), (0, 1))
+        self.assertEqual(rows['get']['statuses'], {'503': 1})
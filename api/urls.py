@@ -7,10 +7,14 @@ from .views import (
     register_user,
     login_user,
     create_ride,
+    get_user_chats,
     get_user_threads,
     get_chat_messages,
     send_chat_message,
+    get_unread_message_count,
 )
+from .export import export_dataset
+from .realtime import chat_event_stream
 
 router = DefaultRouter()
 router.register('users', UserViewSet)
@@ -29,6 +33,12 @@ urlpatterns = [
 
     # 💬 Chat (новая система)
     path('chat/threads/', get_user_threads),
+    path('chat/inbox/', get_user_chats),
     path('chat/<int:receiver_id>/messages/', get_chat_messages),
     path('chat/send/', send_chat_message),
+    path('chat/events/', chat_event_stream),
+    path('chat/unread/', get_unread_message_count),
+
+    # 📦 Выгрузка для аналитики (только staff)
+    path('export/<str:dataset>/', export_dataset),
 ]
@@ -1,24 +1,74 @@
+import asyncio
+import json
+from collections import Counter
+
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status, viewsets
 from rest_framework.response import Response
-from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password, verify_password
 from rest_framework.authtoken.models import Token
-from django.utils.timezone import make_aware
-from datetime import datetime
-
-from .models import User, Ride, Booking, ChatMessage, Chat
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.db.models import Count, F, Max, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.timezone import make_aware, now
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from datetime import datetime, time, timedelta
+
+from .archive import live_rides_cutoff
+from .batching import GroupCommit
+from .cache import mask_phone, resource_versions, ride_row_cache
+from .conditional import is_conditional, make_etag, not_modified, set_validators, version_timestamp
+from .fast_serializers import ChatMessageRowSerializer, RideRowSerializer
+from .models import User, Ride, Booking, ChatMessage, Chat, ChatReadState, UnreadCounter
+from .pagination import RideCursorPagination
+from .pubsub import Listener, user_channel
+from .geo import POINTS, get_geo_index
+from .hashing import HashingPoolBusy, hashing_pool
+from .search import get_location_index
+from .realtime import authenticate_token, extract_token, publish_to_user
 from .serializers import (
     UserSerializer,
     RideSerializer,
     BookingSerializer,
     ChatMessageSerializer,
+    requested_fields,
 )
 
 
+# ✂️ ?fields= без связанных полей — и без JOIN/prefetch связанных моделей
+class SparseFieldsViewMixin:
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = requested_fields(self.request)
+        if requested is None:
+            return queryset
+        relations = self.get_serializer_class().relations_for(requested)
+        many = {name for name in relations if queryset.model._meta.get_field(name).many_to_many}
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if relations - many:
+            queryset = queryset.select_related(*(relations - many))
+        if many:
+            queryset = queryset.prefetch_related(*many)
+        return queryset
+
+
+# ✂️ Строки ленты из кеша: лишние ключи отбрасываем после маскирования телефона
+def project_rows(rows, request):
+    requested = requested_fields(request)
+    if requested is None:
+        return rows
+    return [{name: value for name, value in row.items() if name in requested} for row in rows]
+
+
 # === ViewSets ===
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+class UserViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = User.objects.prefetch_related('groups', 'user_permissions')
     serializer_class = UserSerializer
 
     @action(detail=False, methods=['get', 'patch'], permission_classes=[IsAuthenticated])
@@ -43,79 +93,351 @@ class UserViewSet(viewsets.ModelViewSet):
             })
 
 
-class RideViewSet(viewsets.ModelViewSet):
-    queryset = Ride.objects.all().order_by('-datetime')
+class RideViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Ride.objects.select_related('driver').order_by('-datetime', '-id')
     serializer_class = RideSerializer
+    pagination_class = RideCursorPagination
 
     # ✅ Это нужно для get_phone в RideSerializer
     def get_serializer_context(self):
         return {'request': self.request}
 
+    # 💺 Меньше мест, чем уже занято, нельзя: проверка и запись в одной транзакции (BEGIN IMMEDIATE),
+    # чтобы бронь не проскочила между ними
+    def perform_update(self, serializer):
+        seats = serializer.validated_data.get('seats')
+        with transaction.atomic():
+            if seats is not None and not Ride.objects.filter(pk=serializer.instance.pk, seats_taken__lte=seats).exists():
+                raise ValidationError({'seats': 'Band qilingan joylardan kam bo‘lishi mumkin emas'})
+            serializer.save()
+
+    # 🗃 Лента из кеша строк: запрос к БД только за id страницы, телефон маскируется под зрителя.
+    # ♻️ Версия 'rides' меняется при любом сбросе строк ленты — с If-None-Match ответ 304 без запросов к БД
+    def list(self, request, *args, **kwargs):
+        # сначала проверка параметров (фильтры, курсор) — на неверный запрос 400, а не 304
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).only('id', 'datetime')
+        self.paginator.decode_cursor(request)
+
+        version = resource_versions.get('rides')
+        etag = make_etag(request, 'rides', version)
+        last_modified = version_timestamp(version)
+        if (response := not_modified(request, etag, last_modified)) is not None:
+            return response
+
+        page = self.paginate_queryset(queryset)
+        rows = ride_row_cache.get_rows([ride.pk for ride in page], build_ride_rows)
+        viewer_id = request.user.pk if request.user.is_authenticated else None
+        response = self.get_paginated_response(project_rows([mask_phone(row, viewer_id) for row in rows], request))
+        return set_validators(response, etag, last_modified)
+
+    # 🔎 Нечёткий поиск по городам: ?origin=Ташкент&destination=Samarqand — латиница/кириллица, опечатки
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        origin = request.query_params.get('origin', '').strip()
+        destination = request.query_params.get('destination', '').strip()
+        if not origin and not destination:
+            return Response({'error': 'origin or destination is required'}, status=400)
+        limit = self.paginator.get_page_size(request)
+
+        # ⏳ Как и лента — только живые поездки, не дожидаясь archive_rides
+        ride_ids = get_location_index().search(origin, destination, limit, since=live_rides_cutoff())
+        rows = ride_row_cache.get_rows(ride_ids, build_ride_rows)
+        viewer_id = request.user.pk if request.user.is_authenticated else None
+        return Response(project_rows([mask_phone(row, viewer_id) for row in rows], request))
+
+    # 📍 Поездки рядом: ?lat=&lng=&radius_km=&date_from=&date_to=&point=pickup|dropoff
+    # Ответ отсортирован по расстоянию, в каждой строке есть distance_km
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        params = request.query_params
+        point = params.get('point', 'pickup')
+        if point not in POINTS:
+            return Response({'error': 'point must be pickup or dropoff'}, status=400)
+        try:
+            lat, lng = parse_point(params.get('lat'), params.get('lng'))
+            radius_km = float(params.get('radius_km') or NEARBY_DEFAULT_RADIUS_KM)
+        except (TypeError, ValueError):
+            return Response({'error': 'lat, lng and radius_km must be valid numbers'}, status=400)
+        if lat is None or not 0 < radius_km <= NEARBY_MAX_RADIUS_KM:
+            return Response({'error': f'lat and lng are required, radius_km must be in (0, {NEARBY_MAX_RADIUS_KM}]'}, status=400)
+        date_from = parse_window_bound(params.get('date_from'), 'date_from')
+        date_to = parse_window_bound(params.get('date_to'), 'date_to', end_of_day=True)
+        # ⏳ Прошедшие поездки отсекаем сами, не дожидаясь archive_rides
+        cutoff = live_rides_cutoff()
+        date_from = max(date_from, cutoff) if date_from else cutoff
+
+        found = get_geo_index(point).nearby(lat, lng, radius_km, date_from, date_to, self.paginator.get_page_size(request))
+        distances = {ride_id: distance for distance, ride_id in found}
+        rows = ride_row_cache.get_rows([ride_id for _, ride_id in found], build_ride_rows)
+        viewer_id = request.user.pk if request.user.is_authenticated else None
+        rows = [{**mask_phone(row, viewer_id), 'distance_km': round(distances[row['id']], 3)} for row in rows]
+        return Response(project_rows(rows, request))
+
+    # 🔎 Фильтры ленты: ?origin=&destination=&date_from=&date_to=
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action != 'list':
+            return queryset
+
+        # ⏳ Только живые поездки: прошедшие ждут archive_rides и в ленту не попадают
+        queryset = queryset.filter(datetime__gte=live_rides_cutoff())
+        params = self.request.query_params
+        origin = params.get('origin', '').strip()
+        destination = params.get('destination', '').strip()
+        if origin:
+            queryset = queryset.filter(origin=origin)
+        if destination:
+            queryset = queryset.filter(destination=destination)
+
+        date_from = parse_window_bound(params.get('date_from'), 'date_from')
+        date_to = parse_window_bound(params.get('date_to'), 'date_to', end_of_day=True)
+        if date_from:
+            queryset = queryset.filter(datetime__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(datetime__lt=date_to)
+        return queryset
+
+
+# 🗃 Строки для кеша ленты: быстрый путь без зрителя, с настоящим телефоном
+def build_ride_rows(ids):
+    rows = RideRowSerializer(context={'unmasked_phone': True}).serialize(Ride.objects.filter(pk__in=ids))
+    return {row['id']: row for row in rows}
+
+
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 100
+
+
+# 📍 Пара координат: обе заданы или обе пустые
+def parse_point(lat, lng):
+    if lat in (None, '') and lng in (None, ''):
+        return None, None
+    lat, lng = float(lat), float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordinates out of range')
+    return lat, lng
+
+
+# 📅 Граница окна дат: принимает дату (YYYY-MM-DD) или ISO datetime
+def parse_window_bound(value, name, end_of_day=False):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        if day is not None:
+            if end_of_day:
+                day += timedelta(days=1)
+            dt = datetime.combine(day, time.min)
+        else:
+            dt = parse_datetime(value)
+            if dt is None:
+                raise ValueError(value)
+    except ValueError:
+        raise ValidationError({name: 'Invalid date'})
+    return dt if dt.tzinfo else make_aware(dt)
+
+
+# 💺 Условный UPDATE: места занимаются, только если их хватает — без блокировок и гонок
+def reserve_seats(ride_id, count):
+    reserved = Ride.objects.filter(pk=ride_id, seats_taken__lte=F('seats') - count).update(
+        seats_taken=F('seats_taken') + count
+    )
+    if reserved:
+        transaction.on_commit(lambda: ride_row_cache.invalidate([ride_id]))
+    return bool(reserved)
+
+
+def release_seats(ride_id, count):
+    Ride.objects.filter(pk=ride_id, seats_taken__gte=count).update(seats_taken=F('seats_taken') - count)
+    transaction.on_commit(lambda: ride_row_cache.invalidate([ride_id]))
+
+
+# 🔁 Переход статуса брони одним UPDATE с условием на текущий статус: при гонке выигрывает один запрос
+def transition_booking(booking, from_statuses, to_status):
+    with transaction.atomic():
+        moved = Booking.objects.filter(pk=booking.pk, status__in=from_statuses).update(status=to_status)
+        if moved and to_status not in Booking.HOLDING_STATUSES:
+            release_seats(booking.ride_id, booking.seats)
+    booking.refresh_from_db(fields=['status'])
+    return bool(moved)
 
-class BookingViewSet(viewsets.ModelViewSet):
-    queryset = Booking.objects.all()
+
+class BookingViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Booking.objects.select_related('passenger')
     serializer_class = BookingSerializer
 
+    # 📦 Бронь держит места сразу; повтор с тем же Idempotency-Key возвращает уже созданную бронь
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        passenger = serializer.validated_data['passenger']
+        ride = serializer.validated_data['ride']
+        seats = serializer.validated_data.get('seats', 1)
+        key = request.headers.get('Idempotency-Key') or None
+        if key and len(key) > 64:
+            return Response({'error': 'Idempotency-Key is too long'}, status=400)
+
+        if key:
+            existing = Booking.objects.select_related('passenger').filter(passenger=passenger, idempotency_key=key).first()
+            if existing:
+                return self.replay(existing, ride, seats)
+
+        try:
+            with transaction.atomic():
+                if not reserve_seats(ride.pk, seats):
+                    return Response({'error': 'Bo‘sh joy qolmadi'}, status=status.HTTP_409_CONFLICT)
+                serializer.save(idempotency_key=key)
+        except IntegrityError:
+            # тот же ключ пришёл параллельно: место соседнего запроса уже учтено, наше откатилось
+            existing = Booking.objects.select_related('passenger').get(passenger=passenger, idempotency_key=key)
+            return self.replay(existing, ride, seats)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def replay(self, booking, ride, seats):
+        if booking.ride_id != ride.pk or booking.seats != seats:
+            return Response({'error': 'Idempotency-Key was used for a different booking'}, status=422)
+        return Response(self.get_serializer(booking).data, status=status.HTTP_200_OK)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if instance.status in Booking.HOLDING_STATUSES:
+                release_seats(instance.ride_id, instance.seats)
+            instance.delete()
+
+    # ✅ Водитель подтверждает бронь; повторное подтверждение ничего не меняет
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def confirm(self, request, pk=None):
+        booking = self.get_object()
+        if request.user.pk != Ride.objects.values_list('driver_id', flat=True).get(pk=booking.ride_id):
+            return Response({'error': 'Only the driver can confirm a booking'}, status=403)
+        if not transition_booking(booking, ['pending'], 'confirmed') and booking.status != 'confirmed':
+            return Response({'error': f'Booking is {booking.status}'}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(booking).data)
+
+    # ❌ Отмену делает пассажир или водитель; места возвращаются в поездку
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def cancel(self, request, pk=None):
+        booking = self.get_object()
+        driver_id = Ride.objects.values_list('driver_id', flat=True).get(pk=booking.ride_id)
+        if request.user.pk not in (booking.passenger_id, driver_id):
+            return Response({'error': 'Only the passenger or the driver can cancel a booking'}, status=403)
+        transition_booking(booking, Booking.HOLDING_STATUSES, 'cancelled')
+        return Response(self.get_serializer(booking).data)
+
+
+# 📨 Тело запроса: JSON или форма, как принимал DRF
+def read_payload(request):
+    if request.content_type == 'application/json':
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('JSON object expected')
+        return payload
+    return request.POST
+
+
+def hashing_busy_response():
+    response = JsonResponse({'error': 'Server busy, try again'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
 
 # === Регистрация ===
-@api_view(['POST'])
-def register_user(request):
-    data = request.data
+# ⚡ Асинхронно: PBKDF2 считается в hashing_pool, а не в потоке, который обслуживает остальные запросы
+@csrf_exempt
+@require_POST
+async def register_user(request):
+    try:
+        data = read_payload(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
     required_fields = ['username', 'password', 'phone']
     for field in required_fields:
         if not data.get(field):
-            return Response({'error': f'Missing field: {field}'}, status=400)
+            return JsonResponse({'error': f'Missing field: {field}'}, status=400)
 
     is_driver = bool(data.get('is_driver', False))
     if not is_driver and not data.get('gender'):
-        return Response({'error': 'Jins majburiy (faqat yo‘lovchilar uchun)'}, status=400)
+        return JsonResponse({'error': 'Jins majburiy (faqat yo‘lovchilar uchun)'}, status=400)
 
-    if User.objects.filter(username=data['username']).exists():
-        return Response({'error': 'Username already taken'}, status=400)
+    if await User.objects.filter(username=data['username']).aexists():
+        return JsonResponse({'error': 'Username already taken'}, status=400)
 
     try:
-        user = User.objects.create_user(
-            username=data['username'],
-            password=data['password']
-        )
-        user.phone = data['phone']
-        user.is_driver = is_driver
-        user.car_model = data.get('car_model') or ''
-        user.has_ac = bool(data.get('has_ac', False))
-        user.show_phone = bool(data.get('show_phone', True))
-        user.gender = data.get('gender') if not is_driver else None
-        user.save()
-
-        token, _ = Token.objects.get_or_create(user=user)
+        encoded = await hashing_pool.run(make_password, data['password'])
+    except HashingPoolBusy:
+        return hashing_busy_response()
 
-        return Response({
-            'status': 'created',
-            'token': token.key,
-            'is_driver': user.is_driver,
-            'has_ac': user.has_ac,
-            'show_phone': user.show_phone,
-        }, status=201)
+    try:
+        user, token = await sync_to_async(create_registered_user)(data, encoded, is_driver)
+    except IntegrityError:
+        return JsonResponse({'error': 'Username already taken'}, status=400)
     except Exception as e:
-        return Response({'error': 'Server error', 'detail': str(e)}, status=500)
+        return JsonResponse({'error': 'Server error', 'detail': str(e)}, status=500)
+
+    return JsonResponse({
+        'status': 'created',
+        'token': token.key,
+        'is_driver': user.is_driver,
+        'has_ac': user.has_ac,
+        'show_phone': user.show_phone,
+    }, status=201)
+
+
+def create_registered_user(data, encoded, is_driver):
+    with transaction.atomic():
+        user = User(
+            username=User.normalize_username(data['username']),
+            password=encoded,
+            phone=data['phone'],
+            is_driver=is_driver,
+            car_model=data.get('car_model') or '',
+            has_ac=bool(data.get('has_ac', False)),
+            show_phone=bool(data.get('show_phone', True)),
+            gender=data.get('gender') if not is_driver else None,
+        )
+        user.save()
+        token = Token.objects.create(user=user)
+    return user, token
 
 
 # === Логин ===
-@api_view(['POST'])
-def login_user(request):
-    username = request.data.get('username')
-    password = request.data.get('password')
-
-    user = authenticate(username=username, password=password)
-    if user:
-        token, _ = Token.objects.get_or_create(user=user)
-        return Response({
-            'token': token.key,
-            'is_driver': user.is_driver,
-            'has_ac': user.has_ac,
-            'show_phone': user.show_phone,
-        })
-
-    return Response({'error': 'Invalid credentials'}, status=401)
+# ⚡ Та же проверка, что ModelBackend: активный пользователь, хеш в пуле, для неизвестного
+# логина всё равно считаем хеш (время ответа не выдаёт, существует ли пользователь)
+@csrf_exempt
+@require_POST
+async def login_user(request):
+    try:
+        data = read_payload(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    username = data.get('username')
+    password = data.get('password')
+    if not username or password is None:
+        return JsonResponse({'error': 'Invalid credentials'}, status=401)
+
+    user = await User.objects.filter(username=username).afirst()
+    try:
+        if user is None or not user.is_active:
+            await hashing_pool.run(make_password, password)
+            return JsonResponse({'error': 'Invalid credentials'}, status=401)
+        is_correct, must_update = await hashing_pool.run(verify_password, password, user.password)
+        if is_correct and must_update:
+            # хешер сменился или выросло число итераций — перехешируем, как check_password
+            user.password = await hashing_pool.run(make_password, password)
+            await user.asave(update_fields=['password'])
+    except HashingPoolBusy:
+        return hashing_busy_response()
+
+    if not is_correct:
+        return JsonResponse({'error': 'Invalid credentials'}, status=401)
+
+    token, _ = await Token.objects.aget_or_create(user=user)
+    return JsonResponse({
+        'token': token.key,
+        'is_driver': user.is_driver,
+        'has_ac': user.has_ac,
+        'show_phone': user.show_phone,
+    })
 
 
 # === Создание поездки ===
@@ -125,11 +447,14 @@ def create_ride(request):
     user = request.user
     data = request.data
 
-    if user.is_driver and Ride.objects.filter(driver=user).exists():
+    # Мешает только предстоящее объявление — прошедшие поездки не блокируют новую
+    if user.is_driver and Ride.objects.filter(driver=user, datetime__gte=now()).exists():
         return Response({'error': 'Sizda allaqachon eʼlon mavjud'}, status=400)
 
     try:
         aware_datetime = make_aware(datetime.fromisoformat(data['datetime']))
+        pickup_lat, pickup_lng = parse_point(data.get('pickup_lat'), data.get('pickup_lng'))
+        dropoff_lat, dropoff_lng = parse_point(data.get('dropoff_lat'), data.get('dropoff_lng'))
 
         ride = Ride.objects.create(
             origin=data['origin'],
@@ -139,7 +464,11 @@ def create_ride(request):
             price=int(data['price']) if user.is_driver else 0,
             datetime=aware_datetime,
             driver=user,
-            has_female_passenger=data.get('has_female_passenger', False)
+            has_female_passenger=data.get('has_female_passenger', False),
+            pickup_lat=pickup_lat,
+            pickup_lng=pickup_lng,
+            dropoff_lat=dropoff_lat,
+            dropoff_lng=dropoff_lng,
         )
 
         return Response(RideSerializer(ride, context={'request': request}).data, status=201)
@@ -147,34 +476,173 @@ def create_ride(request):
         return Response({'error': f"Eʼlon yaratishda xatolik: {e}"}, status=400)
 
 
+# === Найти чат между двумя пользователями (без записи) ===
+def find_chat(user1, user2):
+    low, high = Chat.pair_key(user1, user2)
+    return Chat.objects.filter(user_low_id=low, user_high_id=high).first()
+
+
 # === Получить чат между двумя пользователями ===
+# Уникальный индекс по паре: при гонке двух первых сообщений второй INSERT падает,
+# и мы просто читаем чат, созданный соседним запросом.
 def get_or_create_chat(user1, user2):
-    chats = Chat.objects.filter(participants=user1).filter(participants=user2)
-    if chats.exists():
-        return chats.first()
-    else:
-        chat = Chat.objects.create()
-        chat.participants.add(user1, user2)
+    chat = find_chat(user1, user2)
+    if chat:
         return chat
 
+    low, high = Chat.pair_key(user1, user2)
+    try:
+        with transaction.atomic():
+            chat = Chat.objects.create(user_low_id=low, user_high_id=high)
+            chat.participants.add(user1, user2)
+            ChatReadState.objects.bulk_create([ChatReadState(chat=chat, user_id=uid) for uid in {low, high}])
+    except IntegrityError:
+        chat = Chat.objects.get(user_low_id=low, user_high_id=high)
+    return chat
+
+
+CHAT_PAGE_SIZE = 50
+CHAT_MAX_PAGE_SIZE = 200
+
 
-# === Получить сообщения чата и отметить как прочитанные ===
+# === Получить сообщения чата и отметить как прочитанные (GET ничего не создаёт) ===
+# ?after_id=  — только новые сообщения (опрос), по возрастанию id
+# ?before_id= — страница более старых сообщений (прокрутка вверх)
+# ?limit=     — размер страницы; без параметров отдаётся вся история, как раньше
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_chat_messages(request, receiver_id):
     user = request.user
+    try:
+        after_id = parse_message_id(request.query_params.get('after_id'))
+        before_id = parse_message_id(request.query_params.get('before_id'))
+        limit = parse_message_id(request.query_params.get('limit'))
+    except ValueError:
+        return Response({'error': 'after_id, before_id and limit must be positive integers'}, status=400)
+
     try:
         receiver = User.objects.get(id=receiver_id)
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=404)
 
-    chat = get_or_create_chat(user, receiver)
+    chat = find_chat(user, receiver)
+    if chat is None:
+        return Response([])
+
+    states = {state.user_id: state for state in chat.read_states.all()}
+    my_state = states.get(user.id)
+    if my_state and my_state.unread_count:
+        mark_chat_read(chat, my_state)
+        transaction.on_commit(lambda: publish_to_user(user.pk, {'type': 'chat.read', 'chat': chat.pk}))
+    other_state = states.get(receiver.id)
+    read_upto = {
+        receiver.id: my_state.last_read_message_id if my_state else 0,
+        user.id: other_state.last_read_message_id if other_state else 0,
+    }
+    # ♻️ Чат и отметки уже загружены: ETag от последнего сообщения и отметок прочтения — без лишних запросов;
+    # версия 'users' — в ответе sender_username
+    etag = make_etag(
+        request, 'chat', chat.pk, chat.last_message_id, sorted(read_upto.items()), resource_versions.get('users'),
+    )
+    if (response := not_modified(request, etag)) is not None:
+        return response
+
+    messages = ChatMessage.objects.filter(chat=chat).values_list(*ChatMessageRowSerializer.lookups())
+    if after_id is not None or before_id is not None:
+        limit = limit or CHAT_PAGE_SIZE
+    if limit is not None:
+        limit = min(limit, CHAT_MAX_PAGE_SIZE)
+
+    if after_id is not None:
+        messages = messages.filter(id__gt=after_id)
+        if before_id is not None:
+            messages = messages.filter(id__lt=before_id)
+        messages = list(messages.order_by('id')[:limit])
+    elif before_id is not None or limit is not None:
+        if before_id is not None:
+            messages = messages.filter(id__lt=before_id)
+        messages = list(messages.order_by('-id')[:limit])[::-1]
+    else:
+        messages = messages.order_by('id')
+
+    response = Response(ChatMessageRowSerializer(context={'read_upto': read_upto}).serialize_rows(messages))
+    return set_validators(response, etag)
+
+
+# 👁 Одна запись: отметка сдвигается на последнее сообщение чата, а счётчик пересчитывается
+# только по сообщениям, пришедшим после неё (если кто-то успел написать во время чтения)
+def mark_chat_read(chat, state):
+    watermark = chat.last_message_id or 0
+    arrived_after = (
+        ChatMessage.objects.filter(chat=chat, id__gt=watermark)
+        .exclude(sender_id=state.user_id)
+        .values('chat')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    ChatReadState.objects.filter(pk=state.pk).update(
+        last_read_message_id=Greatest(F('last_read_message_id'), Value(watermark)),
+        unread_count=Coalesce(Subquery(arrived_after), 0),
+    )
+    state.last_read_message_id = max(state.last_read_message_id, watermark)
+    state.unread_count = 0
+    refresh_unread_counter(state.user_id)
+
 
-    ChatMessage.objects.filter(chat=chat, sender=receiver, is_read=False).update(is_read=True)
+# 🔔 Счётчик бейджа: +1 на входящее; если строки ещё нет — собираем её из отметок
+def bump_unread_counter(user_id, count=1):
+    if not UnreadCounter.objects.filter(user_id=user_id).update(count=F('count') + count):
+        refresh_unread_counter(user_id)
 
-    messages = ChatMessage.objects.filter(chat=chat).order_by('timestamp')
-    serializer = ChatMessageSerializer(messages, many=True)
-    return Response(serializer.data)
+
+# 🔔 Точный пересчёт из отметок прочтения (по одной строке на чат пользователя)
+def refresh_unread_counter(user_id):
+    total = (
+        ChatReadState.objects.filter(user_id=OuterRef('user_id'))
+        .values('user_id')
+        .annotate(total=Sum('unread_count'))
+        .values('total')
+    )
+    if UnreadCounter.objects.filter(user_id=user_id).update(count=Coalesce(Subquery(total), 0)):
+        return
+    count = ChatReadState.objects.filter(user_id=user_id).aggregate(total=Sum('unread_count'))['total'] or 0
+    try:
+        with transaction.atomic():
+            UnreadCounter.objects.create(user_id=user_id, count=count)
+    except IntegrityError:
+        pass
+
+
+def parse_message_id(value):
+    if value in (None, ''):
+        return None
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return number
+
+
+# 💬 Запись сообщений одной транзакцией: items — [(чат, отправитель, получатель, текст)].
+# Одиночная отправка — пачка из одного; с CHAT_WRITE_BATCH['ENABLED'] соседние запросы пишутся вместе.
+def write_chat_messages(items):
+    with transaction.atomic():
+        messages = ChatMessage.objects.bulk_create([
+            ChatMessage(chat=chat, sender=sender, message=text) for chat, sender, _, text in items
+        ])
+        latest = {message.chat_id: message for message in messages}
+        for chat_id, message in latest.items():
+            Chat.objects.filter(pk=chat_id).update(last_message=message, last_message_at=message.timestamp)
+        for (chat_id, sender_id), count in Counter((m.chat_id, m.sender_id) for m in messages).items():
+            ChatReadState.objects.filter(chat_id=chat_id).exclude(user_id=sender_id).update(
+                unread_count=F('unread_count') + count
+            )
+        received = Counter(receiver.pk for _, sender, receiver, _ in items if receiver.pk != sender.pk)
+        for user_id, count in received.items():
+            bump_unread_counter(user_id, count)
+    return messages
+
+
+chat_write_batcher = GroupCommit(write_chat_messages)
 
 
 # === Отправить сообщение ===
@@ -193,28 +661,35 @@ def send_chat_message(request):
         return Response({'error': 'Receiver not found'}, status=404)
 
     chat = get_or_create_chat(user, receiver)
+    message = chat_write_batcher.submit((chat, user, receiver, request.data.get('message')))
 
-    message = ChatMessage.objects.create(
-        chat=chat,
-        sender=user,
-        message=request.data.get('message'),
-        is_read=False
-    )
+    data = ChatMessageSerializer(message).data
+    # 📡 Пушим получателю только после коммита — подписчик не увидит «фантомное» сообщение
+    transaction.on_commit(lambda: publish_to_user(receiver.pk, {'type': 'chat.message', 'message': data}))
+    return Response(data, status=201)
 
-    return Response(ChatMessageSerializer(message).data, status=201)
 
-
-# === Получить список чатов пользователя ===
+# === Получить список чатов пользователя (inbox) ===
+# Постоянное число запросов: чаты + последнее сообщение + счётчик непрочитанных одним SELECT,
+# участники — одним prefetch.
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_chats(request):
     user = request.user
-    chats = Chat.objects.filter(participants=user)
+    chats = (
+        Chat.objects.filter(participants=user)
+        .select_related('last_message__sender')
+        .prefetch_related(Prefetch('participants', queryset=User.objects.only('id', 'username')))
+        .annotate(unread_count=Coalesce(Subquery(
+            ChatReadState.objects.filter(chat=OuterRef('pk'), user=user).values('unread_count')[:1]
+        ), 0))
+        .order_by(F('last_message_at').desc(nulls_last=True), '-id')
+    )
     result = []
 
     for chat in chats:
-        last_message = chat.messages.order_by('-timestamp').first()
-        other = chat.participants.exclude(id=user.id).first()
+        last_message = chat.last_message
+        other = next((u for u in chat.participants.all() if u.id != user.id), None)
         result.append({
             'chat_id': chat.id,
             'last_message': last_message.message if last_message else '',
@@ -222,6 +697,7 @@ def get_user_chats(request):
             'sender_username': last_message.sender.username if last_message else '',
             'receiver_username': other.username if other else '',
             'receiver': other.id if other else '',
+            'unread_count': chat.unread_count,
         })
 
     return Response(result)
@@ -232,23 +708,86 @@ def get_user_chats(request):
 @permission_classes([IsAuthenticated])
 def get_user_threads(request):
     user = request.user
-    threads = Chat.objects.filter(participants=user).distinct()
+    threads = Chat.objects.filter(participants=user)
+    # ♻️ Новый чат меняет число/максимальный id, переименование участника — версию 'users'.
+    # Сводку отдельным запросом считаем только для условного запроса, иначе — по загруженным строкам.
+    users_version = resource_versions.get('users')
+    if is_conditional(request):
+        summary = threads.aggregate(count=Count('id'), last_id=Max('id'), created_at=Max('created_at'))
+        etag, last_modified = thread_validators(request, users_version, **summary)
+        if (response := not_modified(request, etag, last_modified)) is not None:
+            return response
+
+    threads = list(threads.distinct().prefetch_related('participants'))
     data = []
     for chat in threads:
-        other = chat.participants.exclude(id=user.id).first()
+        participants = list(chat.participants.all())
+        other = next((u for u in participants if u.id != user.id), None)
         data.append({
             'id': chat.id,
-            'participants_usernames': [u.username for u in chat.participants.all()],
+            'participants_usernames': [u.username for u in participants],
             'created_at': chat.created_at,
             'receiver': other.id if other else None
         })
-    return Response(data)
+    etag, last_modified = thread_validators(
+        request, users_version, count=len(threads),
+        last_id=max((chat.id for chat in threads), default=None),
+        created_at=max((chat.created_at for chat in threads), default=None),
+    )
+    return set_validators(Response(data), etag, last_modified)
+
+
+def thread_validators(request, users_version, count, last_id, created_at):
+    etag = make_etag(request, 'threads', count, last_id, users_version)
+    last_modified = version_timestamp(users_version)
+    if created_at is not None:
+        last_modified = max(last_modified, int(created_at.timestamp()))
+    return etag, last_modified
+
+
+UNREAD_MAX_WAIT_SECONDS = 30
+UNREAD_RECHECK_SECONDS = 2
 
 
 # === Получить количество непрочитанных сообщений ===
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_unread_message_count(request):
-    user = request.user
-    count = ChatMessage.objects.filter(chat__participants=user, is_read=False).exclude(sender=user).count()
-    return Response({'unread_count': count})
+# ?since=<n>&wait=<сек> — long-poll: держим запрос, пока счётчик равен n, но не дольше wait.
+# Вью асинхронная: ожидание не занимает поток, в котором Django выполняет sync-вью.
+@require_GET
+async def get_unread_message_count(request):
+    key = extract_token(request.headers, request.META.get('QUERY_STRING', ''))
+    user = await sync_to_async(authenticate_token)(key)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        since = int(request.GET['since']) if request.GET.get('since') else None
+        wait = min(max(float(request.GET.get('wait') or 0), 0), UNREAD_MAX_WAIT_SECONDS)
+    except ValueError:
+        return JsonResponse({'error': 'since and wait must be numbers'}, status=400)
+
+    if since is None or not wait:
+        return JsonResponse({'unread_count': await sync_to_async(read_unread_count)(user.pk)})
+
+    # подписываемся до чтения счётчика, чтобы не пропустить событие между ними
+    listener = Listener([user_channel(user.pk)])
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        count = await sync_to_async(read_unread_count)(user.pk)
+        while count == since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await listener.get(timeout=min(remaining, UNREAD_RECHECK_SECONDS))
+            except asyncio.TimeoutError:
+                # событие могло прийти в другой процесс — периодически перечитываем счётчик
+                pass
+            count = await sync_to_async(read_unread_count)(user.pk)
+    finally:
+        listener.close()
+    return JsonResponse({'unread_count': count})
+
+
+def read_unread_count(user_id):
+    return UnreadCounter.objects.filter(user_id=user_id).values_list('count', flat=True).first() or 0
@@ -1,9 +1,13 @@
+import importlib.util
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "set-a-fallback-for-local")
+# 🔑 render.yaml генерирует SECRET_KEY; DJANGO_SECRET_KEY — прежнее имя переменной
+INSECURE_SECRET_KEY = "set-a-fallback-for-local"
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY") or os.getenv("SECRET_KEY") or INSECURE_SECRET_KEY
 
 DEBUG = os.getenv("DEBUG", "False") == "True"
 
@@ -23,6 +27,8 @@ INSTALLED_APPS = [
 ]
 AUTH_USER_MODEL = 'api.User'
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,11 +57,46 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# 📡 Доставка событий чата (WebSocket/SSE). InProcessBroker — в пределах одного процесса
+CHAT_PUBSUB_BACKEND = os.getenv("CHAT_PUBSUB_BACKEND", "api.pubsub.InProcessBroker")
+
+# 🗄 Профиль SQLite для нескольких воркеров: включается SQLITE_PROFILE=production (render.yaml, loadtest).
+# Локально по умолчанию голый SQLite — journal_mode=WAL записывается в заголовок файла и менял бы db.sqlite3 из git.
+SQLITE_PRODUCTION_PROFILE = {
+    'OPTIONS': {
+        # ⏳ busy_timeout: писатели ждут блокировку до 20 с вместо мгновенного "database is locked"
+        'timeout': 20,
+        # BEGIN IMMEDIATE: транзакция сразу берёт блокировку записи и не падает при апгрейде чтения в запись
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            # WAL: читатели не ждут писателя, писатель не ждёт читателей
+            'PRAGMA journal_mode=WAL',
+            # в WAL fsync только на чекпоинте; при сбое ОС теряются последние коммиты, но не целостность
+            'PRAGMA synchronous=NORMAL',
+            'PRAGMA mmap_size=268435456',   # 256 МБ
+            'PRAGMA cache_size=-20000',     # ~20 МБ страниц на соединение
+            'PRAGMA temp_store=MEMORY',
+        ]),
+    },
+    # 🔌 Под ASGI (render.yaml: UvicornWorker) каждая sync-вью выполняется в новом потоке, а соединения
+    # Django привязаны к потоку — постоянное соединение не переиспользуется, только висит до сборки мусора.
+    # Поэтому по умолчанию 0, как советует документация Django для ASGI: соединение (и init_command)
+    # на запрос. DB_CONN_MAX_AGE > 0 имеет смысл только под WSGI (manage.py benchmark_sqlite_profile --server threads).
+    'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "0")),
+    'CONN_HEALTH_CHECKS': True,
+}
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLITE_PATH — другой файл БД (например, засеянная копия для manage.py loadtest)
+        'NAME': os.getenv("SQLITE_PATH") or BASE_DIR / 'db.sqlite3',
+        **(SQLITE_PRODUCTION_PROFILE if os.getenv("SQLITE_PROFILE", "default") == "production" else {}),
+        # Тестовая БД в файле: в общей памяти SQLite параллельные записи из потоков
+        # падают с "table is locked" без ожидания (см. BookingContentionTests)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -87,6 +128,91 @@ AUTH_USER_MODEL = 'api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
+    # ⚡ JSON через orjson (если установлен), MessagePack по Accept: application/msgpack — если есть msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['api.renderers.MessagePackRenderer'] if importlib.util.find_spec('msgpack') else []),
+}
+
+# 🗝 Кеш аутентификации по токену (api.authentication.TokenCache)
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.getenv("TOKEN_AUTH_CACHE_SIZE", "10000")),
+    'TTL': int(os.getenv("TOKEN_AUTH_CACHE_TTL", "60")),
+    'CACHE_ALIAS': os.getenv("TOKEN_AUTH_CACHE_ALIAS") or None,
+    'LOCAL_TTL': float(os.getenv("TOKEN_AUTH_CACHE_LOCAL_TTL", "1")),
+}
+
+# 🗃 Кеш строк ленты поездок (api.cache.RideRowCache)
+RIDE_CACHE = {
+    'ALIAS': os.getenv("RIDE_CACHE_ALIAS", "default"),
+    'TIMEOUT': int(os.getenv("RIDE_CACHE_TIMEOUT", "60")),
+}
+
+# 🔎 Индекс мест для поиска поездок (api.search.LocationIndex)
+LOCATION_INDEX = {
+    'TTL': int(os.getenv("LOCATION_INDEX_TTL", "300")),
+    'MIN_SCORE': 0.35,
+    'MAX_PLACES': 10,
+}
+
+# 📍 Сетка для поиска поездок рядом (api.geo.GridIndex)
+GEO_INDEX = {
+    'CELL_DEGREES': 0.05,
+    'TTL': int(os.getenv("GEO_INDEX_TTL", "300")),
+}
+
+# 🔐 Пул хеширования паролей для register/login (api.hashing.HashingPool)
+PASSWORD_HASHING = {
+    'WORKERS': int(os.getenv("PASSWORD_HASHING_WORKERS", "4")),
+    'MAX_PENDING': int(os.getenv("PASSWORD_HASHING_MAX_PENDING", "32")),
+}
+
+# 📦 Групповой коммит отправки сообщений (api.batching.GroupCommit)
+CHAT_WRITE_BATCH = {
+    'ENABLED': os.getenv("CHAT_WRITE_BATCHING", "False") == "True",
+    'WINDOW_MS': float(os.getenv("CHAT_WRITE_BATCH_WINDOW_MS", "5")),
+    'MAX_BATCH': 64,
+}
+
+# 📊 Метрики запросов (api.middleware.RequestMetricsMiddleware, /metrics)
+REQUEST_METRICS = {
+    'ENABLED': os.getenv("REQUEST_METRICS", "True") == "True",
+    'TOKEN': os.getenv("METRICS_TOKEN") or None,
+}
+
+# 🧾 Строка JSON на каждый запрос в логгер api.requests (в тестах — только предупреждения)
+TESTING = sys.argv[1:2] == ['test']
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.requests': {
+            'handlers': ['console'],
+            'level': os.getenv("REQUEST_LOG_LEVEL", "WARNING" if TESTING else "INFO"),
+            'propagate': False,
+        },
+    },
+}
+
+# 🔬 Профилирование запросов (api.middleware.ProfilingMiddleware, manage.py profiles)
+PROFILING = {
+    'SAMPLE_RATE': float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+    'PATHS': [path for path in os.getenv("PROFILING_PATHS", "").split(",") if path],
+    'DIR': os.getenv("PROFILING_DIR") or BASE_DIR / 'profiles',
+    'MAX_FILES': int(os.getenv("PROFILING_MAX_FILES", "200")),
+    # Отдельный ключ подписи токенов X-Profile; без него профилирование по заголовку выключено
+    'SECRET': os.getenv("PROFILING_SECRET") or None,
+}
+
+# 🗄 Архив прошедших поездок (api.archive, manage.py archive_rides)
+RIDE_ARCHIVE = {
+    # Сколько поездка остаётся в ленте после отправления, прежде чем уйти в архив
+    'GRACE_MINUTES': int(os.getenv("RIDE_ARCHIVE_GRACE_MINUTES", "30")),
+    'BATCH_SIZE': int(os.getenv("RIDE_ARCHIVE_BATCH_SIZE", "500")),
 }
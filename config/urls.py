@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from api.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
@@ -10,4 +12,7 @@ urlpatterns = [
     # Авторизация через djoser
     path('api/auth/', include('djoser.urls')),
     path('api/auth/', include('djoser.urls.authtoken')),
+
+    # 📈 Prometheus
+    path('metrics', metrics_view),
 ]